@@ -0,0 +1,155 @@
+# Runs the engine over a large number of positions: every position of a PGN file, or every line of an EPD/FEN
+# file, is evaluated, perft-counted or searched, spread over a pool of processes.
+#
+# Positions are read lazily (ChessPGN), sent to the workers as chunks of FEN strings and the results are written
+# out in input order as soon as their chunk is done. Only a few chunks per worker are in flight at any time, so
+# memory use doesn't grow with the size of the input. Throughput is reported in positions per second.
+#
+#   python ChessBatch.py games.pgn --task eval --workers 4 --output evals.tsv
+#   python ChessBatch.py positions.epd --task perft --depth 3
+#   python ChessBatch.py positions.epd --task search --depth 4
+import collections
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine, ChessEval, ChessPerft, ChessPGN, ChessSearch
+except ImportError: #run from the source folder
+    import ChessEngine
+    import ChessEval
+    import ChessPerft
+    import ChessPGN
+    import ChessSearch
+
+TASKS = ('eval', 'perft', 'search')
+DEFAULT_CHUNK_SIZE = 256
+CHUNKS_IN_FLIGHT = 2 #chunks queued per worker, enough to keep every worker busy while results are written
+REPORT_EVERY = 5.0 #seconds between progress reports
+
+
+# each worker process reuses one GameState and, for the search task, one Searcher
+workerState = None
+workerSearcher = None
+
+
+'''
+Runs task on one position and returns the result as text: the static evaluation in centipawns from the side to
+move (eval), the perft node count (perft), or the best move and its score (search)
+'''
+def analyzePosition(gs, task, depth):
+    global workerSearcher
+    if task == 'eval':
+        return str(ChessEval.evaluate(gs))
+    if task == 'perft':
+        return str(ChessPerft.perft(gs, depth))
+    if workerSearcher is None:
+        workerSearcher = ChessSearch.Searcher()
+    move = workerSearcher.search(gs, maxDepth=depth)
+    return f'{move.getChessNotation() if move is not None else "(none)"} {workerSearcher.bestScore}'
+
+
+'''
+Analyzes a chunk of positions given as FEN and returns their output lines (fen, a tab, the result)
+'''
+def processChunk(task, depth, fens):
+    global workerState
+    if workerState is None:
+        workerState = ChessEngine.GameState()
+    gs = workerState
+    lines = []
+    for fen in fens:
+        try:
+            gs.loadFEN(fen)
+            result = analyzePosition(gs, task, depth)
+        except (ValueError, KeyError, IndexError) as error: #a broken position shouldn't stop the whole batch
+            result = f'error {error}'
+        lines.append(f'{fen}\t{result}\n')
+    return lines
+
+
+'''
+Groups an iterable into lists of size items without reading ahead of the current chunk
+'''
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+'''
+Runs task over the FEN strings from positions on workers processes (in this process if workers is 1) and writes
+one line per position to out in input order. Progress goes to progress every REPORT_EVERY seconds. Returns
+(positions, seconds).
+'''
+def runBatch(positions, task='eval', depth=1, workers=None, chunkSize=DEFAULT_CHUNK_SIZE,
+             out=sys.stdout, progress=sys.stderr):
+    if task not in TASKS:
+        raise ValueError(f'unknown task {task!r}, expected one of {TASKS}')
+    workers = workers if workers else os.cpu_count() or 1
+    startTime = lastReport = time.perf_counter()
+    count = 0
+
+    def write(lines):
+        nonlocal count, lastReport
+        out.writelines(lines)
+        count += len(lines)
+        now = time.perf_counter()
+        if progress is not None and now - lastReport >= REPORT_EVERY:
+            lastReport = now
+            print(f'{count} positions  {positionsPerSecond(count, now - startTime):.0f} positions/s', file=progress)
+
+    chunks = chunked(positions, chunkSize)
+    if workers == 1:
+        for chunk in chunks:
+            write(processChunk(task, depth, chunk))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append(pool.submit(processChunk, task, depth, chunk))
+                if len(pending) >= workers * CHUNKS_IN_FLIGHT: #wait for the oldest chunk before reading more
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    out.flush()
+    elapsed = time.perf_counter() - startTime
+    if progress is not None:
+        print(f'{count} positions in {elapsed:.2f}s  {positionsPerSecond(count, elapsed):.0f} positions/s',
+              file=progress)
+    return count, elapsed
+
+
+def positionsPerSecond(count, elapsed):
+    return count / elapsed if elapsed > 0 else 0.0
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Evaluate, perft or search every position of a PGN or EPD file')
+    parser.add_argument('input', help='.pgn file (every position of every game) or EPD/FEN file (one per line)')
+    parser.add_argument('--task', choices=TASKS, default='eval')
+    parser.add_argument('--depth', type=int, default=None, help='perft or search depth (default: 2 for perft, 4 for search)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='positions sent to a worker at a time')
+    parser.add_argument('--output', default=None, help='file to write the results to (default: standard output)')
+    args = parser.parse_args(argv)
+    depth = args.depth if args.depth is not None else {'perft': 2, 'search': 4}.get(args.task, 1)
+
+    positions = ChessPGN.readPositions(args.input)
+    if args.output is None:
+        runBatch(positions, args.task, depth, args.workers, args.chunk_size)
+    else:
+        with open(args.output, 'w') as out:
+            runBatch(positions, args.task, depth, args.workers, args.chunk_size, out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
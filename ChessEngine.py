@@ -1,13 +1,195 @@
-# This class is responsible for storing all the information about the current state of a chess game. IT will also be responsible for 
-# determining the valid moves at the current state. It will also keep a move log. 
+import random
+
+# This class is responsible for storing all the information about the current state of a chess game. IT will also be responsible for
+# determining the valid moves at the current state. It will also keep a move log.
+
+# Internally the pieces live in a 0x88 mailbox: a bytearray of 128 squares where square = row * 16 + col. The
+# right half of every row is off the board, so (square & 0x88) != 0 tells us we walked off the board without
+# any row/column bounds checks. Each square holds a piece code: the piece type in the low 3 bits and 8 for black.
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+WHITE, BLACK = 0, 8
+
+PIECE_CODES = {'--': EMPTY,
+               'wp': WHITE | PAWN, 'wN': WHITE | KNIGHT, 'wB': WHITE | BISHOP,
+               'wR': WHITE | ROOK, 'wQ': WHITE | QUEEN, 'wK': WHITE | KING,
+               'bp': BLACK | PAWN, 'bN': BLACK | KNIGHT, 'bB': BLACK | BISHOP,
+               'bR': BLACK | ROOK, 'bQ': BLACK | QUEEN, 'bK': BLACK | KING}
+PIECE_NAMES = ['--'] * 16
+for name, code in PIECE_CODES.items():
+    PIECE_NAMES[code] = name
+
+SQUARES = tuple(r * 16 + c for r in range(8) for c in range(8)) #the 64 on board squares in board order
+ROOK_DIRECTIONS = (-16, -1, 16, 1)
+BISHOP_DIRECTIONS = (-17, -15, 15, 17)
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KING_OFFSETS = QUEEN_DIRECTIONS
+KNIGHT_OFFSETS = (-33, -31, -18, -14, 14, 18, 31, 33)
+# kinds of moves for the generators: all moves, captures and promotions only, or the other moves only
+GEN_ALL, GEN_CAPTURES, GEN_QUIETS = 0, 1, 2
+PAWN_ATTACK_SOURCES = {WHITE: (15, 17), BLACK: (-17, -15)} #where a pawn of each color attacks a square from
+
+# castling rights are kept as bits of one int
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+CASTLE_CHARS = {'K': WHITE_KINGSIDE, 'Q': WHITE_QUEENSIDE, 'k': BLACK_KINGSIDE, 'q': BLACK_QUEENSIDE} #in FEN order
+CASTLE_MASK = [15] * 128 #rights that survive a move touching the square
+CASTLE_MASK[0x74] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE) #e1
+CASTLE_MASK[0x77] = 15 & ~WHITE_KINGSIDE #h1
+CASTLE_MASK[0x70] = 15 & ~WHITE_QUEENSIDE #a1
+CASTLE_MASK[0x04] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE) #e8
+CASTLE_MASK[0x07] = 15 & ~BLACK_KINGSIDE #h8
+CASTLE_MASK[0x00] = 15 & ~BLACK_QUEENSIDE #a8
+
+#king end square of a castle -> (rook start square, rook end square)
+CASTLE_ROOK_SQUARES = {0x76: (0x77, 0x75), 0x72: (0x70, 0x73), 0x06: (0x07, 0x05), 0x02: (0x00, 0x03)}
+
+# Zobrist keys: the position key is the XOR of a random 64 bit number for every (piece, square), the castling
+# rights, the en passant file and the side to move, so makeMove/undoMove can update it with a few XORs.
+# The seed is fixed so keys are the same in every process.
+zobristRandom = random.Random(0x5EED)
+ZOBRIST_PIECES = [[zobristRandom.getrandbits(64) for sq in range(128)] for code in range(16)]
+ZOBRIST_CASTLE = [zobristRandom.getrandbits(64) for rights in range(16)]
+ZOBRIST_ENPASSANT = [zobristRandom.getrandbits(64) for col in range(8)]
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+del zobristRandom
+
+# Evaluation terms kept up to date by makeMove/undoMove (used by ChessEval): material plus piece-square tables
+# for the middlegame and the endgame, and the game phase used to blend the two. Scores are in centipawns.
+PIECE_VALUES = {PAWN: 100, KNIGHT: 320, BISHOP: 330, ROOK: 500, QUEEN: 900, KING: 0}
+EXCHANGE_VALUES = {**PIECE_VALUES, KING: 20000} #for staticExchange: the king may only take last
+
+# game phase: 24 with all the minor and major pieces on the board, 0 with only kings and pawns
+PHASE_WEIGHTS = {PAWN: 0, KNIGHT: 1, BISHOP: 1, ROOK: 2, QUEEN: 4, KING: 0}
+MAX_PHASE = 24
+
+# Piece-square tables from white's point of view, written the way the board is drawn: the first row is rank 8.
+# Black uses the same tables flipped vertically.
+PAWN_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+PAWN_ENDGAME_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     20,  20,  20,  20,  20,  20,  20,  20,
+     10,  10,  10,  10,  10,  10,  10,  10,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+ROOK_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+)
+QUEEN_TABLE = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+)
+KING_ENDGAME_TABLE = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+
+MIDDLEGAME_TABLES = {PAWN: PAWN_TABLE, KNIGHT: KNIGHT_TABLE, BISHOP: BISHOP_TABLE,
+                     ROOK: ROOK_TABLE, QUEEN: QUEEN_TABLE, KING: KING_TABLE}
+ENDGAME_TABLES = {PAWN: PAWN_ENDGAME_TABLE, KNIGHT: KNIGHT_TABLE, BISHOP: BISHOP_TABLE,
+                  ROOK: ROOK_TABLE, QUEEN: QUEEN_TABLE, KING: KING_ENDGAME_TABLE}
+
+
+'''
+Builds a 0x88 lookup of material + table value for every piece code, positive for white and negative for black
+'''
+def buildSquareTables(tables):
+    squareTables = [[0] * 128 for code in range(16)]
+    for pieceType, table in tables.items():
+        for sq in SQUARES:
+            r, c = sq >> 4, sq & 7
+            squareTables[pieceType][sq] = PIECE_VALUES[pieceType] + table[r * 8 + c]
+            squareTables[BLACK | pieceType][sq] = -(PIECE_VALUES[pieceType] + table[(7 - r) * 8 + c])
+    return squareTables
+
+MIDDLEGAME_SQUARE_TABLES = buildSquareTables(MIDDLEGAME_TABLES)
+ENDGAME_SQUARE_TABLES = buildSquareTables(ENDGAME_TABLES)
+MATERIAL_VALUES = [0] * 16 #signed material of every piece code
+for pieceType, value in PIECE_VALUES.items():
+    MATERIAL_VALUES[pieceType] = value
+    MATERIAL_VALUES[BLACK | pieceType] = -value
+
+
+# when True, makeMove/undoMove recompute the Zobrist key and the evaluation totals from scratch after every move
+# and assert that the incremental values agree (slow, for testing changes to makeMove/undoMove)
+DEBUG_INCREMENTAL = False
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+MOVE_CACHE = {} #interned Move objects, see Move.fromSquares
+#the sliders look moves up in MOVE_CACHE themselves; ChessProfile turns this off so every lookup goes through
+#Move.fromSquares and gets counted
+INLINE_MOVE_LOOKUPS = True
+
 
 class GameState():
     # Constructor:
     def __init__(self):
         #Board is 8x8 2D list. each element of the list has 2 characters; the first is the color of the piece and the second is the type of the piece
         #'--' resresents an empty space
-        
-        ######## ACTUAL BOARD (DO NOT MODIFY) 
+
+        ######## ACTUAL BOARD (DO NOT MODIFY)
         self.board = [
             ['bR', 'bN', 'bB', 'bQ', 'bK', 'bB', 'bN', 'bR'],
             ['bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp'],
@@ -30,30 +212,336 @@ class GameState():
         #     ['--', '--', '--', '--', '--', '--', 'bp', '--'],
         #     ['wR', '--', '--', '--', '--', '--', '--', 'wR'],
         # ]
-        
 
-        self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves, 
-                              'B': self.getBishopMoves, 'K': self.getKingMoves, 'Q': self.getQueenMoves}
+
+        self.moveFunctions = {PAWN: self.getPawnMoves, ROOK: self.getRookMoves, KNIGHT: self.getKnightMoves,
+                              BISHOP: self.getBishopMoves, KING: self.getKingMoves, QUEEN: self.getQueenMoves}
         self.whiteToMove = True
         self.moveLog = []
         self.whiteKingLocation = (7, 4)
         self.blackKingLocation = (0, 4)
+        self.pins = {} #pinned square -> direction of the pin, filled in by getValidMoves
+        self.checks = []
+        self.castleRights = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        self.enpassantSquare = None #0x88 square a pawn can capture onto en passant
+        self.halfmoveClock = 0 #plies since the last capture or pawn move, for the fifty move rule
+        self.fullmoveNumber = 1 #starts at 1 and goes up after every black move
+        #(castleRights, enpassantSquare, zobristKey, middlegameScore, endgameScore, phase, material, halfmoveClock)
+        #before each move in the move log, for undoMove
+        self.stateLog = []
+        self.moveCache = None #optional LegalMoveCache that getValidMoves looks positions up in
+        self.loadBoard()
+
+    '''
+    Builds the 0x88 mailbox from the 8x8 board view. The board view is kept in sync by makeMove/undoMove so the
+    GUI can keep drawing from it, only the mailbox is used to generate moves.
+    '''
+    def loadBoard(self):
+        self.squares = bytearray(128)
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                self.squares[r * 16 + c] = PIECE_CODES[piece]
+                if piece == 'wK':
+                    self.whiteKingLocation = (r, c)
+                elif piece == 'bK':
+                    self.blackKingLocation = (r, c)
+        self.zobristKey = self.computeZobristKey()
+        self.middlegameScore, self.endgameScore, self.phase, self.material, self.pieceCounts = self.computeEvalTotals()
+
+    '''
+    Computes the Zobrist key of the position from scratch. makeMove/undoMove keep self.zobristKey up to date
+    incrementally, this is for setting up a position and for checking the incremental key.
+    '''
+    def computeZobristKey(self):
+        key = ZOBRIST_CASTLE[self.castleRights]
+        for sq in SQUARES:
+            piece = self.squares[sq]
+            if piece:
+                key ^= ZOBRIST_PIECES[piece][sq]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        if self.enpassantSquare is not None:
+            key ^= self.getEnpassantZobrist(self.enpassantSquare)
+        return key
+
+    '''
+    Computes the evaluation totals from scratch: (middlegameScore, endgameScore, phase, material, pieceCounts).
+    The scores and material are from white's point of view (white minus black), phase adds up PHASE_WEIGHTS and
+    pieceCounts is the number of pieces of every piece code. makeMove/undoMove keep them up to date incrementally.
+    '''
+    def computeEvalTotals(self):
+        middlegame = endgame = phase = material = 0
+        pieceCounts = [0] * 16
+        for sq in SQUARES:
+            piece = self.squares[sq]
+            if piece:
+                middlegame += MIDDLEGAME_SQUARE_TABLES[piece][sq]
+                endgame += ENDGAME_SQUARE_TABLES[piece][sq]
+                phase += PHASE_WEIGHTS[piece & 7]
+                material += MATERIAL_VALUES[piece]
+                pieceCounts[piece] += 1
+        return middlegame, endgame, phase, material, pieceCounts
+
+    '''
+    Asserts that the incrementally updated Zobrist key and evaluation totals match a full recompute
+    '''
+    def verifyIncrementalState(self):
+        assert self.zobristKey == self.computeZobristKey(), 'zobrist key out of date'
+        totals = (self.middlegameScore, self.endgameScore, self.phase, self.material, self.pieceCounts)
+        assert totals == self.computeEvalTotals(), 'evaluation totals out of date'
+
+    '''
+    The en passant file is only part of the key when the player to move has a pawn next to the pawn that just
+    advanced 2 squares, so positions that only differ by an en passant capture nobody can make hash the same.
+    '''
+    def getEnpassantZobrist(self, enpassantSq):
+        if enpassantSq >> 4 == 2: #black pawn skipped row 2, white pawns capture from row 3
+            pawnSq, capturingPawn = 0x30 | (enpassantSq & 7), WHITE | PAWN
+        else:
+            pawnSq, capturingPawn = 0x40 | (enpassantSq & 7), BLACK | PAWN
+        for sq in (pawnSq - 1, pawnSq + 1):
+            if not sq & 0x88 and self.squares[sq] == capturingPawn:
+                return ZOBRIST_ENPASSANT[enpassantSq & 7]
+        return 0
+
+    '''
+    Sets up the position from a FEN string. Missing fields default to white to move, no castling, no en passant
+    square and the counters of a new game, so 4 field EPD positions load too. Raises ValueError for a FEN that
+    can't be set up: every field is checked before anything is changed, so the GameState is left as it was.
+    '''
+    def loadFEN(self, fen):
+        fields = fen.split()
+        rows = fields[0].split('/') if fields else []
+        if len(rows) != 8:
+            raise ValueError(f'invalid FEN: {fen!r}')
+        board = []
+        for row in rows:
+            boardRow = []
+            for char in row:
+                if char in '12345678':
+                    boardRow.extend(['--'] * int(char))
+                elif char in 'pnbrqkPNBRQK':
+                    boardRow.append(('w' if char.isupper() else 'b') + (char.upper() if char.lower() != 'p' else 'p'))
+                else:
+                    raise ValueError(f'invalid FEN: {fen!r}')
+            if len(boardRow) != 8:
+                raise ValueError(f'invalid FEN: {fen!r}')
+            board.append(boardRow)
+        for king in ('wK', 'bK'):
+            if sum(boardRow.count(king) for boardRow in board) != 1:
+                raise ValueError(f'invalid FEN, each side needs exactly one king: {fen!r}')
+        if any(piece[1] == 'p' for piece in board[0] + board[7]):
+            raise ValueError(f'invalid FEN, pawns can\'t stand on the first or last rank: {fen!r}')
+
+        side = fields[1] if len(fields) > 1 else 'w'
+        if side not in ('w', 'b'):
+            raise ValueError(f'invalid FEN, side to move must be w or b: {fen!r}')
+        castling = fields[2] if len(fields) > 2 else '-'
+        castleRights = 0
+        if castling != '-':
+            for char in castling:
+                right = CASTLE_CHARS.get(char)
+                if right is None:
+                    raise ValueError(f'invalid FEN, castling rights must be - or letters of KQkq: {fen!r}')
+                castleRights |= right
+        enpassant = fields[3] if len(fields) > 3 else '-'
+        if enpassant == '-':
+            enpassantSquare = None
+        elif len(enpassant) == 2 and enpassant[0] in Move.filesToCol and enpassant[1] in '36':
+            enpassantSquare = Move.ranksToRows[enpassant[1]] * 16 + Move.filesToCol[enpassant[0]]
+        else:
+            raise ValueError(f'invalid FEN, en passant square must be - or on rank 3 or 6: {fen!r}')
+        counters = []
+        for i, default in ((4, 0), (5, 1)):
+            text = fields[i] if len(fields) > i else str(default)
+            if not text.isdigit():
+                raise ValueError(f'invalid FEN, move counters must be whole numbers: {fen!r}')
+            counters.append(int(text))
+
+        self.board = board
+        self.whiteToMove = side == 'w'
+        self.castleRights = castleRights
+        self.enpassantSquare = enpassantSquare
+        self.halfmoveClock, self.fullmoveNumber = counters
+        self.moveLog = []
+        self.stateLog = []
+        self.loadBoard()
 
     '''
-    Takes a move as a parameter and executes it. This will not work for castling, Enpassant, pawn promotion.
+    Returns the FEN string of the position
+    '''
+    def getFEN(self):
+        rows = []
+        for r in range(8):
+            row = ''
+            empty = 0
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece == '--':
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += piece[1].upper() if piece[0] == 'w' else piece[1].lower()
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        castling = ''.join(char for char, right in CASTLE_CHARS.items() if self.castleRights & right) or '-'
+        if self.enpassantSquare is None:
+            enpassant = '-'
+        else:
+            enpassant = Move.colToFiles[self.enpassantSquare & 7] + Move.rowsToRanks[self.enpassantSquare >> 4]
+        return (f"{'/'.join(rows)} {'w' if self.whiteToMove else 'b'} {castling} {enpassant} "
+                f"{self.halfmoveClock} {self.fullmoveNumber}")
+
+    '''
+    Returns the legal move written in standard algebraic notation (e4, Nbd7, exd5, R1e2, e8=Q, O-O, Qxf7#), or
+    raises ValueError if there is no such move or it is ambiguous. Check marks and annotations are ignored.
+    '''
+    def parseSAN(self, san):
+        text = san.rstrip('+#!?')
+        moves = self.getValidMoves()
+        if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+            kingside = len(text) == 3
+            matches = [move for move in moves if move.isCastleMove and (move.endCol == 6) == kingside]
+        else:
+            promotion = EMPTY
+            if '=' in text:
+                text, promotionLetter = text.split('=', 1)
+                promotion = PIECE_CODES['w' + promotionLetter[:1]] & 7 if promotionLetter[:1] in 'QRBN' else -1
+            elif text[-1:] in ('Q', 'R', 'B', 'N') and text[:1].islower(): #e8Q
+                promotion = PIECE_CODES['w' + text[-1]] & 7
+                text = text[:-1]
+            pieceType = PIECE_CODES['w' + text[0]] & 7 if text[:1] in ('K', 'Q', 'R', 'B', 'N') else PAWN
+            if pieceType != PAWN:
+                text = text[1:]
+            text = text.replace('x', '').replace('-', '')
+            if len(text) < 2 or text[-2] not in Move.filesToCol or text[-1] not in Move.ranksToRows:
+                raise ValueError(f'invalid SAN move: {san!r}')
+            endRow, endCol = Move.ranksToRows[text[-1]], Move.filesToCol[text[-2]]
+            fromFile = fromRank = None #disambiguation
+            for char in text[:-2]:
+                if char in Move.filesToCol:
+                    fromFile = Move.filesToCol[char]
+                elif char in Move.ranksToRows:
+                    fromRank = Move.ranksToRows[char]
+                else:
+                    raise ValueError(f'invalid SAN move: {san!r}')
+            matches = [move for move in moves if move.pieceMovedCode & 7 == pieceType
+                       and move.endRow == endRow and move.endCol == endCol
+                       and (move.promotionCode & 7) == promotion
+                       and (fromFile is None or move.startCol == fromFile)
+                       and (fromRank is None or move.startRow == fromRank)]
+        if len(matches) != 1:
+            raise ValueError(f"{'ambiguous' if matches else 'illegal'} SAN move: {san!r}")
+        return matches[0]
+
+    '''
+    Packs the position into 67 bytes (64 piece codes, the side to move, the castling rights and the en passant
+    square). This is much cheaper to copy and to send between processes than a pickled GameState. The move log
+    is not included.
+    '''
+    def toBytes(self):
+        enpassant = 0xFF if self.enpassantSquare is None else self.enpassantSquare
+        return bytes(self.squares[sq] for sq in SQUARES) + bytes((self.whiteToMove, self.castleRights, enpassant))
+
+    '''
+    Creates a new GameState from the output of toBytes
+    '''
+    @classmethod
+    def fromBytes(cls, data):
+        gs = cls()
+        gs.board = [[PIECE_NAMES[data[r * 8 + c]] for c in range(8)] for r in range(8)]
+        gs.whiteToMove = bool(data[64])
+        gs.castleRights = data[65]
+        gs.enpassantSquare = None if data[66] == 0xFF else data[66]
+        gs.loadBoard()
+        return gs
+
+    '''
+    Takes a move as a parameter and executes it, including castling, en passant and pawn promotion.
     '''
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        board = self.board
+        squares = self.squares
+        self.stateLog.append((self.castleRights, self.enpassantSquare, self.zobristKey,
+                              self.middlegameScore, self.endgameScore, self.phase, self.material, self.halfmoveClock))
+        key = self.zobristKey ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_CASTLE[self.castleRights]
+        moved = move.pieceMovedCode
+        middlegame = self.middlegameScore - MIDDLEGAME_SQUARE_TABLES[moved][move.startSq]
+        endgame = self.endgameScore - ENDGAME_SQUARE_TABLES[moved][move.startSq]
+        if self.enpassantSquare is not None:
+            key ^= self.getEnpassantZobrist(self.enpassantSquare)
+        board[move.startRow][move.startCol] = "--"
+        squares[move.startSq] = EMPTY
+        key ^= ZOBRIST_PIECES[move.pieceMovedCode][move.startSq]
+        captured = move.pieceCapturedCode
+        if captured:
+            key ^= ZOBRIST_PIECES[captured][move.captureSq]
+            middlegame -= MIDDLEGAME_SQUARE_TABLES[captured][move.captureSq]
+            endgame -= ENDGAME_SQUARE_TABLES[captured][move.captureSq]
+            self.phase -= PHASE_WEIGHTS[captured & 7]
+            self.material -= MATERIAL_VALUES[captured]
+            self.pieceCounts[captured] -= 1
+        promotion = move.promotionCode
+        if promotion: #pawn promotion
+            board[move.endRow][move.endCol] = move.promotionPiece
+            squares[move.endSq] = promotion
+            key ^= ZOBRIST_PIECES[promotion][move.endSq]
+            middlegame += MIDDLEGAME_SQUARE_TABLES[promotion][move.endSq]
+            endgame += ENDGAME_SQUARE_TABLES[promotion][move.endSq]
+            self.phase += PHASE_WEIGHTS[promotion & 7]
+            self.material += MATERIAL_VALUES[promotion] - MATERIAL_VALUES[moved]
+            self.pieceCounts[moved] -= 1
+            self.pieceCounts[promotion] += 1
+        else:
+            board[move.endRow][move.endCol] = move.pieceMoved
+            squares[move.endSq] = moved
+            key ^= ZOBRIST_PIECES[moved][move.endSq]
+            middlegame += MIDDLEGAME_SQUARE_TABLES[moved][move.endSq]
+            endgame += ENDGAME_SQUARE_TABLES[moved][move.endSq]
+        if move.isEnpassantMove: #the captured pawn is beside the start square, not on the end square
+            board[move.startRow][move.endCol] = "--"
+            squares[move.captureSq] = EMPTY
+        elif move.isCastleMove: #move the rook to the other side of the king
+            rookStart, rookEnd = CASTLE_ROOK_SQUARES[move.endSq]
+            rook = squares[rookStart]
+            squares[rookEnd] = rook
+            squares[rookStart] = EMPTY
+            board[rookEnd >> 4][rookEnd & 7] = board[rookStart >> 4][rookStart & 7]
+            board[rookStart >> 4][rookStart & 7] = "--"
+            key ^= ZOBRIST_PIECES[rook][rookStart] ^ ZOBRIST_PIECES[rook][rookEnd]
+            middlegame += MIDDLEGAME_SQUARE_TABLES[rook][rookEnd] - MIDDLEGAME_SQUARE_TABLES[rook][rookStart]
+            endgame += ENDGAME_SQUARE_TABLES[rook][rookEnd] - ENDGAME_SQUARE_TABLES[rook][rookStart]
+        self.middlegameScore = middlegame
+        self.endgameScore = endgame
         self.moveLog.append(move)
+        if moved & 7 == PAWN or captured:
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if not self.whiteToMove:
+            self.fullmoveNumber += 1
         self.whiteToMove = not self.whiteToMove #changes player to move
         #update the kings location if moved
         if move.pieceMoved == 'wK':
             self.whiteKingLocation = (move.endRow, move.endCol)
         elif move.pieceMoved == 'bK':
             self.blackKingLocation = (move.endRow, move.endCol)
-            
-        
+        #a pawn advancing 2 squares can be captured en passant on the square it skipped
+        if move.pieceMovedCode & 7 == PAWN and abs(move.startRow - move.endRow) == 2:
+            self.enpassantSquare = (move.startSq + move.endSq) // 2
+            key ^= self.getEnpassantZobrist(self.enpassantSquare)
+        else:
+            self.enpassantSquare = None
+        #moving the king or a rook, or capturing a rook, loses those castling rights
+        self.castleRights &= CASTLE_MASK[move.startSq] & CASTLE_MASK[move.endSq]
+        self.zobristKey = key ^ ZOBRIST_CASTLE[self.castleRights]
+        if DEBUG_INCREMENTAL:
+            self.verifyIncrementalState()
+
 
 
     '''
@@ -62,352 +550,539 @@ class GameState():
     def undoMove(self):
         if len(self.moveLog) != 0:
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            board = self.board
+            squares = self.squares
+            board[move.startRow][move.startCol] = move.pieceMoved
+            squares[move.startSq] = move.pieceMovedCode
+            if move.isEnpassantMove: #put the captured pawn back beside the start square
+                board[move.endRow][move.endCol] = "--"
+                squares[move.endSq] = EMPTY
+                board[move.startRow][move.endCol] = move.pieceCaptured
+                squares[move.captureSq] = move.pieceCapturedCode
+            else:
+                board[move.endRow][move.endCol] = move.pieceCaptured
+                squares[move.endSq] = move.pieceCapturedCode
+                if move.isCastleMove: #put the rook back in the corner
+                    rookStart, rookEnd = CASTLE_ROOK_SQUARES[move.endSq]
+                    squares[rookStart] = squares[rookEnd]
+                    squares[rookEnd] = EMPTY
+                    board[rookStart >> 4][rookStart & 7] = board[rookEnd >> 4][rookEnd & 7]
+                    board[rookEnd >> 4][rookEnd & 7] = "--"
+            (self.castleRights, self.enpassantSquare, self.zobristKey, self.middlegameScore, self.endgameScore,
+             self.phase, self.material, self.halfmoveClock) = self.stateLog.pop()
+            if move.pieceCapturedCode:
+                self.pieceCounts[move.pieceCapturedCode] += 1
+            if move.promotionCode:
+                self.pieceCounts[move.pieceMovedCode] += 1
+                self.pieceCounts[move.promotionCode] -= 1
             self.whiteToMove = not self.whiteToMove
+            if not self.whiteToMove:
+                self.fullmoveNumber -= 1
             #update the kings position
             if move.pieceMoved == 'wK':
                 self.whiteKingLocation = (move.startRow, move.startCol)
             elif move.pieceMoved == 'bK':
                 self.blackKingLocation = (move.startRow, move.startCol)
+            if DEBUG_INCREMENTAL:
+                self.verifyIncrementalState()
 
 
     '''
-    All moves considering checks
+    All moves considering checks. The pins and checks on our king are found once up front so the piece
+    generators only produce moves that respect them, instead of making every move and regenerating all of
+    the opponents moves to see if the king can be taken. kind is GEN_ALL, GEN_CAPTURES (captures and
+    promotions) or GEN_QUIETS (everything else). With pieceSq only the moves of the piece on that 0x88 square
+    are generated. With a moveCache the full move list of a position is only generated the first time.
     '''
-    def getValidMoves(self):
-        #1. generat eall the possible moves
-        moves = self.getAllPossibleMoves()
-        #2. for each move make the move
-        for i in range(len(moves)-1, -1, -1): #when removing from a list, iterate backwards through the list
-            self.makeMove(moves[i])
-            #3. generate all the opponents moves
-            #4. for of your opponents moves see if they attack your king
-            self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                moves.remove(moves[i])  #5. if they do attack your king, not a valid move
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+    def getValidMoves(self, kind=GEN_ALL, pieceSq=None):
+        cacheable = self.moveCache is not None and kind == GEN_ALL and pieceSq is None
+        if cacheable:
+            cached = self.moveCache.get(self.zobristKey)
+            if cached is not None:
+                return list(cached)
+        moves = []
+        inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.whiteToMove:
+            kingRow, kingCol = self.whiteKingLocation
+        else:
+            kingRow, kingCol = self.blackKingLocation
+        kingSq = kingRow * 16 + kingCol
+        if inCheck and len(self.checks) > 1: #double check, the king has to move
+            if pieceSq is None or pieceSq == kingSq:
+                self.getKingMoves(kingSq, moves, kind)
+        else:
+            if pieceSq is None:
+                moves = self.getAllPossibleMoves(kind)
+            else:
+                self.moveFunctions[self.squares[pieceSq] & 7](pieceSq, moves, kind)
+            if inCheck: #only 1 check: block the check, capture the checker or move the king
+                checkSq, d = self.checks[0]
+                validSquares = set() #squares that pieces other than the king can move to
+                if self.squares[checkSq] & 7 == KNIGHT: #a knight check can't be blocked, the knight has to be captured
+                    validSquares.add(checkSq)
+                else:
+                    sq = kingSq + d
+                    while sq != checkSq:
+                        validSquares.add(sq)
+                        sq += d
+                    validSquares.add(checkSq) #once you get to the checking piece, stop
+                #en passant captures were already checked against our king when they were generated
+                moves = [move for move in moves if move.pieceMovedCode & 7 == KING or move.endSq in validSquares
+                         or move.isEnpassantMove]
+            elif kind != GEN_CAPTURES and (pieceSq is None or pieceSq == kingSq):
+                self.getCastleMoves(kingSq, moves)
+        self.pins = {}
+        self.checks = []
+        if cacheable:
+            self.moveCache.put(self.zobristKey, moves)
         return moves
-    
+
+    '''
+    Returns the legal move with the given moveID in this position, or None. Only the moves of the piece on the
+    start square are generated, so this is a cheap way to check a move remembered from another position (a hash
+    move or a killer move) before playing it.
+    '''
+    def getMoveByID(self, moveID):
+        start = moveID & 63
+        startSq = (start >> 3) * 16 + (start & 7)
+        piece = self.squares[startSq]
+        if not piece or piece & BLACK != (WHITE if self.whiteToMove else BLACK):
+            return None
+        for move in self.getValidMoves(pieceSq=startSq):
+            if move.moveID == moveID:
+                return move
+        return None
+
+    '''
+    Yields the legal moves one stage at a time, generating each stage only when the one before it is used up, so
+    a search that gets a cutoff early never generates the rest:
+        1. the hash move (the legal move with moveID hashMoveID, if there is one)
+        2. captures and promotions, most valuable victim first (see captureOrder)
+        3. the killer moves (move IDs), if they are legal quiet moves here
+        4. the remaining quiet moves, best first by quietOrder(move) if it is given
+    With capturesOnly=True only the first two stages are run, for quiescence search. Every move is yielded once.
+    The position must be the same each time the iterator is resumed, so undo a move before asking for the next.
+    '''
+    def generateMoves(self, hashMoveID=None, killers=(), capturesOnly=False, quietOrder=None):
+        hashMove = self.getMoveByID(hashMoveID) if hashMoveID is not None else None
+        if hashMove is not None and capturesOnly and not (hashMove.pieceCapturedCode or hashMove.promotionCode):
+            hashMove = None
+        if hashMove is not None:
+            yield hashMove
+
+        captures = self.getValidMoves(GEN_CAPTURES)
+        captures.sort(key=captureOrder, reverse=True)
+        for move in captures:
+            if move is not hashMove:
+                yield move
+        if capturesOnly:
+            return
+
+        played = {hashMove.moveID} if hashMove is not None else set()
+        for killerID in killers:
+            if killerID is not None and killerID not in played:
+                move = self.getMoveByID(killerID)
+                if move is not None and not (move.pieceCapturedCode or move.promotionCode):
+                    played.add(killerID)
+                    yield move
+
+        quiets = self.getValidMoves(GEN_QUIETS)
+        if quietOrder is not None:
+            quiets.sort(key=quietOrder, reverse=True)
+        for move in quiets:
+            if move.moveID not in played:
+                yield move
+
     '''
-    Get all possible pins and checks
+    Get all possible pins and checks on the king of the player to move. Returns (inCheck, pins, checks) where
+    pins maps the square of each pinned piece to the direction of the pin and each check is (square, direction),
+    directions pointing away from the king.
     '''
     def checkForPinsAndChecks(self):
-        pins = [] #squares where friendly pinned pieces are and direction of the pin
+        pins = {} #squares where friendly pinned pieces are and direction of the pin
         checks = [] #squares where enemy is applying the check
         inCheck = False
+        squares = self.squares
         if self.whiteToMove:
-            enemyColor = 'b'
-            allyColor = 'w'
-            startRow = self.whiteKingLocation[0]
-            startCol = self.whiteKingLocation[1]
+            allyColor = WHITE
+            kingRow, kingCol = self.whiteKingLocation
+            pawnDirections = (-17, -15) #black pawns check from the row above the king
         else:
-            enemyColor = 'w'
-            allyColor = 'b'
-            startRow = self.blackKingLocation[0]
-            startCol = self.blackKingLocation[1]
-            
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            piecesBlocking = 0
-            aroundKing = []
-            d = directions[j]
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                    piece = self.board[endRow][endCol]
-                    if piece[0] == enemyColor:
-                        if (piece[1] == 'B' and 0 <= j <= 3) or \
-                            (piece[1] == 'R' and 4 <= j <= 7) or \
-                                (piece[1] == 'Q') or (piece[1] == 'K' and i == 1) or \
-                                    (piece[1] == 'p' and (j == 7 or j == 5) and i == 1):
-                                        if piecesBlocking == 0: ## check, now piece in between king and attacking piece
-                                            checks.append((endRow, endCol, d[0], d[1]))
-                                        elif piecesBlocking == 1: ## Pin if 1 piece is blocking attacking piece
-                                            pins.append(possiblePin)
-                        else:
-                            piecesBlocking += 1
-                    elif piece[0] == allyColor:
-                        piecesBlocking += 1
-                        possiblePin = (endRow, endCol, d[0], d[1])
-                else: ## off board
-                    break
-            return checks, pins
-            
+            allyColor = BLACK
+            kingRow, kingCol = self.blackKingLocation
+            pawnDirections = (15, 17)
+        kingSq = kingRow * 16 + kingCol
 
+        for d in QUEEN_DIRECTIONS:
+            diagonal = d in BISHOP_DIRECTIONS
+            possiblePin = None #reset possible pins for every direction
+            sq = kingSq + d
+            distance = 1
+            while not sq & 0x88:
+                piece = squares[sq]
+                if piece:
+                    if piece & BLACK == allyColor:
+                        if possiblePin is None: #first allied piece could be pinned
+                            possiblePin = sq
+                        else: #second allied piece, so no pin or check possible in this direction
+                            break
+                    else:
+                        pieceType = piece & 7
+                        if pieceType == QUEEN or \
+                                (pieceType == ROOK and not diagonal) or \
+                                (pieceType == BISHOP and diagonal) or \
+                                (distance == 1 and (pieceType == KING or (pieceType == PAWN and d in pawnDirections))):
+                            if possiblePin is None: ## check, no piece in between king and attacking piece
+                                inCheck = True
+                                checks.append((sq, d))
+                            else: ## Pin if 1 piece is blocking attacking piece
+                                pins[possiblePin] = d
+                        break #enemy piece blocks everything behind it
+                sq += d
+                distance += 1
+
+        #knights can't be blocked and don't pin, so only look for checks
+        enemyKnight = (allyColor ^ BLACK) | KNIGHT
+        for offset in KNIGHT_OFFSETS:
+            sq = kingSq + offset
+            if not sq & 0x88 and squares[sq] == enemyKnight:
+                inCheck = True
+                checks.append((sq, offset))
+        return inCheck, pins, checks
 
     '''
     will determine if the current player is in check
     '''
     def inCheck(self):
         if self.whiteToMove:
-            return self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
+            kingRow, kingCol = self.whiteKingLocation
+            return self.isSquareAttacked(kingRow * 16 + kingCol, BLACK)
         else:
-            return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
-    
-    
+            kingRow, kingCol = self.blackKingLocation
+            return self.isSquareAttacked(kingRow * 16 + kingCol, WHITE)
+
+
     '''
     determine if the enemy can attack the square r, c
     '''
     def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:
+        return self.isSquareAttacked(r * 16 + c, BLACK if self.whiteToMove else WHITE)
+
+    '''
+    Returns True if a piece of attackerColor attacks the 0x88 square sq. Instead of generating the attacker's
+    moves this looks outwards from sq: a knight a knight's jump away, a pawn or king next to it, or a slider at the
+    end of a ray of empty squares. Pins don't matter, a pinned piece still gives check.
+    '''
+    def isSquareAttacked(self, sq, attackerColor):
+        squares = self.squares
+        knight = attackerColor | KNIGHT
+        for offset in KNIGHT_OFFSETS:
+            source = sq + offset
+            if not source & 0x88 and squares[source] == knight:
+                return True
+        pawn = attackerColor | PAWN
+        for offset in PAWN_ATTACK_SOURCES[attackerColor]:
+            source = sq + offset
+            if not source & 0x88 and squares[source] == pawn:
                 return True
+        king = attackerColor | KING
+        for offset in KING_OFFSETS:
+            source = sq + offset
+            if not source & 0x88 and squares[source] == king:
+                return True
+        queen = attackerColor | QUEEN
+        for directions, slider in ((ROOK_DIRECTIONS, attackerColor | ROOK), (BISHOP_DIRECTIONS, attackerColor | BISHOP)):
+            for d in directions:
+                source = sq + d
+                while not source & 0x88:
+                    piece = squares[source]
+                    if piece:
+                        if piece == slider or piece == queen:
+                            return True
+                        break
+                    source += d
         return False
-            
+
+    '''
+    Returns the 0x88 squares of every piece of attackerColor that attacks the 0x88 square sq, found the same way
+    as isSquareAttacked
+    '''
+    def getAttackers(self, sq, attackerColor):
+        squares = self.squares
+        attackers = []
+        for offsets, attacker in ((KNIGHT_OFFSETS, attackerColor | KNIGHT),
+                                  (PAWN_ATTACK_SOURCES[attackerColor], attackerColor | PAWN),
+                                  (KING_OFFSETS, attackerColor | KING)):
+            for offset in offsets:
+                source = sq + offset
+                if not source & 0x88 and squares[source] == attacker:
+                    attackers.append(source)
+        queen = attackerColor | QUEEN
+        for directions, slider in ((ROOK_DIRECTIONS, attackerColor | ROOK), (BISHOP_DIRECTIONS, attackerColor | BISHOP)):
+            for d in directions:
+                source = sq + d
+                while not source & 0x88:
+                    piece = squares[source]
+                    if piece:
+                        if piece == slider or piece == queen:
+                            attackers.append(source)
+                        break
+                    source += d
+        return attackers
+
+    '''
+    Static exchange evaluation of a capture: the material the side to move wins (negative if it loses material)
+    when it makes move and then both sides keep recapturing on the end square with their least valuable piece,
+    each stopping when going on doesn't pay. The pieces that took are lifted off the board as the exchange goes
+    on, so the ones behind them (a rook behind a rook, a bishop behind a queen) join in. Pins are ignored.
+    '''
+    def staticExchange(self, move):
+        squares = self.squares
+        target = move.endSq
+        gains = [EXCHANGE_VALUES[move.pieceCapturedCode & 7] if move.pieceCapturedCode else 0]
+        onTarget = move.promotionCode or move.pieceMovedCode
+        if move.promotionCode:
+            gains[0] += EXCHANGE_VALUES[move.promotionCode & 7] - EXCHANGE_VALUES[PAWN]
+        lifted = [(move.startSq, squares[move.startSq]), (move.captureSq, squares[move.captureSq])]
+        squares[move.startSq] = squares[move.captureSq] = EMPTY
+        color = (move.pieceMovedCode & BLACK) ^ BLACK
+        while True:
+            attackers = self.getAttackers(target, color)
+            if not attackers:
+                break
+            source = min(attackers, key=lambda sq: EXCHANGE_VALUES[squares[sq] & 7])
+            gains.append(EXCHANGE_VALUES[onTarget & 7] - gains[-1])
+            onTarget = squares[source]
+            lifted.append((source, onTarget))
+            squares[source] = EMPTY
+            color ^= BLACK
+        for sq, piece in reversed(lifted):
+            squares[sq] = piece
+        while len(gains) > 1: #each side only goes on with the exchange if that is better than stopping
+            gain = gains.pop()
+            gains[-1] = -max(-gains[-1], gain)
+        return gains[0]
+
 
     """
-    All moves without considering checks
+    All moves of the given kind without considering checks
     """
-    def getAllPossibleMoves(self):
+    def getAllPossibleMoves(self, kind=GEN_ALL):
         moves = []
-        for r in range(len(self.board)): # number of rows
-            for c in range(len(self.board[r])): #number of columns in a row
-                turn = self.board[r][c][0]
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves) #calls the appropriate move function based on the piece type
+        squares = self.squares
+        allyColor = WHITE if self.whiteToMove else BLACK
+        for sq in SQUARES:
+            piece = squares[sq]
+            if piece and piece & BLACK == allyColor:
+                self.moveFunctions[piece & 7](sq, moves, kind) #calls the appropriate move function based on the piece type
         return moves
 
     '''
-    This will get all the pawn moves located at row, column and add these moves to the list
+    Adds the move from square start to square end (both 0x88) to the list
+    '''
+    def addMove(self, start, end, moves):
+        moves.append(Move.fromSquares(start, end, self.squares))
+
+    '''
+    This will get all the pawn moves for the pawn on the 0x88 square sq and add these moves to the list
     '''
-    def getPawnMoves(self, r, c, moves): # Still need to fix index out of bounds, en passant and pawn p
+    def getPawnMoves(self, sq, moves, kind=GEN_ALL):
+        squares = self.squares
+        pinDirection = self.pins.get(sq)
         if self.whiteToMove: #white pawn moves
-            if self.board[r] == 0:
-                self.board[r][c][1] == "Q"
-            else:
-                if self.board[r-1][c] == '--': #1 square pawn advance
-                    moves.append(Move((r,c), (r-1, c), self.board))
-                    if r == 6 and self.board[r-2][c] == '--':
-                        moves.append(Move((r,c), (r-2, c), self.board))
-                if c-1 >= 0: # makes sure we don't capturing off the board on column '-1', Captures to the left
-                    if self.board[r-1][c-1][0] == 'b': #make sure it is an enemy piece to be captured
-                        moves.append(Move((r, c), (r-1, c-1), self.board))
-                if c+1 <= 7: #captures to the right
-                    if self.board[r-1][c+1][0] == 'b':
-                        moves.append(Move((r, c), (r-1, c+1), self.board))
-    
+            forward = -16
+            startRow = 6
+            promotionRow = 0
+            enemyColor = BLACK
         else: #Black pawn moves
-            if self.board[r] == 7:
-                print("test")
-                self.board[r][c][1] == "Q"
-            else:
-                if self.board[r+1][c] == '--':
-                    moves.append(Move((r,c), (r+1, c), self.board))
-                    if r == 1 and self.board[r+2][c] == '--':
-                        moves.append(Move((r,c), (r+2, c), self.board))
-                if c-1 >= 0: 
-                    if self.board[r+1][c-1][0] == 'w': #make sure it is an enemy piece to be captured
-                        moves.append(Move((r, c), (r+1, c-1), self.board))
-                if c+1 <= 7: #captures to the right
-                    if self.board[r+1][c+1][0] == 'w':
-                        moves.append(Move((r, c), (r+1, c+1), self.board))
-
-
-    def getBishopMoves(self, r, c, moves):
-        if self.whiteToMove:
-            for i in range(1, 8):
-                if r-i >= 0 and c-i >= 0:
-                    if self.board[r-i][c-i] == '--':
-                        moves.append(Move((r,c), (r-i, c-i), self.board))
-                    if self.board[r-i][c-i][0] == 'b':
-                        moves.append(Move((r,c), (r-i, c-i), self.board))
-                        break
-                if r-i >= 0 and c+i <= 7:
-                    if self.board[r-i][c+i] == '--':
-                        moves.append(Move((r,c), (r-i, c+i), self.board))
-                    if self.board[r-i][c+i][0] == 'b':
-                        moves.append(Move((r,c), (r-i, c+i), self.board))
-                        break
-                if r+i <= 7 and c-i >= 0:
-                    if self.board[r+i][c-i] == '--':
-                        moves.append(Move((r,c), (r+i, c-i), self.board))
-                    if self.board[r+i][c-i][0] == 'b':
-                        moves.append(Move((r,c), (r+i, c-i), self.board))
-                        break
-                if r+i <= 7 and c+i <= 7:
-                    if self.board[r+i][c+i] == '--':
-                        moves.append(Move((r,c), (r+i, c+i), self.board))
-                    if self.board[r+i][c+i][0] == 'b':
-                        moves.append(Move((r,c), (r+i, c+i), self.board))
-                        break
-        else:
-            for i in range(1, 8):
-                if r-i >= 0 and c-i >= 0:
-                    if self.board[r-i][c-i] == '--':
-                        moves.append(Move((r,c), (r-i, c-i), self.board))
-                    if self.board[r-i][c-i][0] == 'w':
-                        moves.append(Move((r,c), (r-i, c-i), self.board))
-                        break
-                if r-i >= 0 and c+i <= 7:
-                    if self.board[r-i][c+i] == '--':
-                        moves.append(Move((r,c), (r-i, c+i), self.board))
-                    if self.board[r-i][c+i][0] == 'w':
-                        moves.append(Move((r,c), (r-i, c+i), self.board))
-                        break
-                if r+i <= 7 and c-i >= 0:
-                    if self.board[r+i][c-i] == '--':
-                        moves.append(Move((r,c), (r+i, c-i), self.board))
-                    if self.board[r+i][c-i][0] == 'w':
-                        moves.append(Move((r,c), (r+i, c-i), self.board))
-                        break
-                if r+i <= 7 and c+i <= 7:
-                    if self.board[r+i][c+i] == '--':
-                        moves.append(Move((r,c), (r+i, c+i), self.board))
-                    if self.board[r+i][c+i][0] == 'w':
-                        moves.append(Move((r,c), (r+i, c+i), self.board))
-                        break
+            forward = 16
+            startRow = 1
+            promotionRow = 7
+            enemyColor = WHITE
+
+        end = sq + forward
+        if squares[end] == EMPTY: #1 square pawn advance
+            if pinDirection is None or pinDirection == forward or pinDirection == -forward:
+                if end >> 4 == promotionRow:
+                    if kind != GEN_QUIETS: #promotions are generated with the captures
+                        self.addPromotions(sq, end, moves)
+                elif kind != GEN_CAPTURES:
+                    self.addMove(sq, end, moves)
+                    if sq >> 4 == startRow and squares[end + forward] == EMPTY:
+                        self.addMove(sq, end + forward, moves)
+        if kind == GEN_QUIETS:
+            return
+        for capture in (forward - 1, forward + 1): #captures to the left and right
+            end = sq + capture
+            if not end & 0x88: # makes sure we don't capture off the board
+                piece = squares[end]
+                if piece and piece & BLACK == enemyColor: #make sure it is an enemy piece to be captured
+                    if pinDirection is None or pinDirection == capture or pinDirection == -capture:
+                        if end >> 4 == promotionRow:
+                            self.addPromotions(sq, end, moves)
+                        else:
+                            self.addMove(sq, end, moves)
+                elif end == self.enpassantSquare and self.enpassantIsLegal(sq, end):
+                    self.addMove(sq, end, moves)
+
+    '''
+    Adds a promotion to each of queen, rook, bishop and knight for the pawn moving from start to end
+    '''
+    def addPromotions(self, start, end, moves):
+        color = self.squares[start] & BLACK
+        for pieceType in (QUEEN, ROOK, BISHOP, KNIGHT):
+            moves.append(Move.fromSquares(start, end, self.squares, color | pieceType))
+
+    '''
+    An en passant capture takes two pawns off the same row at once, so it can expose the king in a way the pins
+    don't cover (king and rook on the row of both pawns). The capture is played on the mailbox and the king is
+    checked directly instead.
+    '''
+    def enpassantIsLegal(self, start, end):
+        squares = self.squares
+        captureSq = (start & 0x70) | (end & 7)
+        pawn, capturedPawn = squares[start], squares[captureSq]
+        squares[start] = EMPTY
+        squares[captureSq] = EMPTY
+        squares[end] = pawn
+        inCheck = self.inCheck()
+        squares[start] = pawn
+        squares[captureSq] = capturedPawn
+        squares[end] = EMPTY
+        return not inCheck
+
+    '''
+    Slides from the square in each direction until it runs off the board or hits a piece. A pinned piece
+    can only move along the line of the pin.
+    '''
+    def getSlidingMoves(self, sq, moves, directions, kind=GEN_ALL):
+        squares = self.squares
+        pinDirection = self.pins.get(sq)
+        allyColor = WHITE if self.whiteToMove else BLACK
+        moveCache = MOVE_CACHE if INLINE_MOVE_LOOKUPS else {} #an empty dict sends every lookup to fromSquares
+        keyStart = sq | squares[sq] << 14 #the part of the Move.fromSquares cache key that is the same for every end square
+        for d in directions:
+            if pinDirection is not None and pinDirection != d and pinDirection != -d:
+                continue
+            end = sq + d
+            while not end & 0x88:
+                endPiece = squares[end]
+                if endPiece and endPiece & BLACK == allyColor: #friendly piece
+                    break
+                if kind == GEN_ALL or (kind == GEN_CAPTURES) == (endPiece != EMPTY):
+                    move = moveCache.get(keyStart | end << 7 | endPiece << 18)
+                    if move is None:
+                        move = Move.fromSquares(sq, end, squares)
+                    moves.append(move)
+                if endPiece: #captured an enemy piece
+                    break
+                end += d
+
+    def getBishopMoves(self, sq, moves, kind=GEN_ALL):
+        self.getSlidingMoves(sq, moves, BISHOP_DIRECTIONS, kind)
+
+    '''
+    This will get all the rook moves for the rook on the 0x88 square sq and add these moves to the list
+    '''
+    def getRookMoves(self, sq, moves, kind=GEN_ALL):
+        self.getSlidingMoves(sq, moves, ROOK_DIRECTIONS, kind)
+
+
+    def getKnightMoves(self, sq, moves, kind=GEN_ALL):
+        if sq in self.pins: #a pinned knight can never move
+            return
+        squares = self.squares
+        allyColor = WHITE if self.whiteToMove else BLACK
+        for offset in KNIGHT_OFFSETS:
+            end = sq + offset
+            if not end & 0x88:
+                piece = squares[end]
+                if piece == EMPTY or piece & BLACK != allyColor:
+                    if kind == GEN_ALL or (kind == GEN_CAPTURES) == (piece != EMPTY):
+                        self.addMove(sq, end, moves)
+
+
+
+    def getQueenMoves(self, sq, moves, kind=GEN_ALL):
+        self.getSlidingMoves(sq, moves, QUEEN_DIRECTIONS, kind)
 
     '''
-    This will get all the rook moves located at row, column and add these moves to the list
+    Gets the king moves to squares that aren't attacked
     '''
-    def getRookMoves(self, r, c, moves): # need to add castling
+    def getKingMoves(self, sq, moves, kind=GEN_ALL):
+        squares = self.squares
+        allyColor = WHITE if self.whiteToMove else BLACK
+
+        for offset in KING_OFFSETS:
+            end = sq + offset
+            if not end & 0x88:
+                piece = squares[end]
+                if piece == EMPTY or piece & BLACK != allyColor:
+                    if kind == GEN_ALL or (kind == GEN_CAPTURES) == (piece != EMPTY):
+                        if self.kingIsSafeOn(end):
+                            self.addMove(sq, end, moves)
+
+    '''
+    Gets the castling moves for the king on sq. The king can't castle out of, through or into check, so this is
+    only called when the king isn't in check.
+    '''
+    def getCastleMoves(self, sq, moves):
+        squares = self.squares
         if self.whiteToMove:
-            for i in range(1, 8):
-                if r-i >= 0:
-                    if self.board[r-i][c] == '--':
-                        moves.append(Move((r,c), (r-i,c), self.board))
-                    if self.board[r-i][c][0] == 'b':
-                        moves.append(Move((r,c), (r-i,c), self.board))
-                        break
-                if r+i <= 7:
-                    if self.board[r+i][c] == '--':
-                        moves.append(Move((r,c), (r+i,c), self.board))
-                    if self.board[r+i][c][0] == 'b':
-                        moves.append(Move((r,c), (r+i,c), self.board))
-                        break
-                if c-i >= 0:
-                    if self.board[r][c-i] == '--':
-                        moves.append(Move((r,c), (r,c-i), self.board))
-                    if self.board[r][c-i][0] == 'b':
-                        moves.append(Move((r,c), (r,c-i), self.board))
-                        break
-                if c+i <= 7:
-                    if self.board[r][c+i] == '--':
-                        moves.append(Move((r,c), (r,c+i), self.board))
-                    if self.board[r][c+i][0] == 'b':
-                        moves.append(Move((r,c), (r,c+i), self.board))
-                        break
+            kingside, queenside = WHITE_KINGSIDE, WHITE_QUEENSIDE
         else:
-            for i in range(1, 8):
-                if r-i >= 0:
-                    if self.board[r-i][c] == '--':
-                        moves.append(Move((r,c), (r-i,c), self.board))
-                    if self.board[r-i][c][0] == 'w':
-                        moves.append(Move((r,c), (r-i,c), self.board))
-                        break
-                if r+i <= 7:
-                    if self.board[r+i][c] == '--':
-                        moves.append(Move((r,c), (r+i,c), self.board))
-                    if self.board[r+i][c][0] == 'w':
-                        moves.append(Move((r,c), (r+i,c), self.board))
-                        break
-                if c-i >= 0:
-                    if self.board[r][c-i] == '--':
-                        moves.append(Move((r,c), (r,c-i), self.board))
-                    if self.board[r][c-i][0] == 'w':
-                        moves.append(Move((r,c), (r,c-i), self.board))
-                        break
-                if c+i <= 7:
-                    if self.board[r][c+i] == '--':
-                        moves.append(Move((r,c), (r,c+i), self.board))
-                    if self.board[r][c+i][0] == 'w':
-                        moves.append(Move((r,c), (r,c+i), self.board))
-                        break
-            
-    
-    def getKnightMoves(self, r, c, moves):
-        knightMoves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                    (1, -2), (1, 2), (2, -1), (2, 1)]
-        
+            kingside, queenside = BLACK_KINGSIDE, BLACK_QUEENSIDE
+        if self.castleRights & kingside:
+            if squares[sq + 1] == EMPTY and squares[sq + 2] == EMPTY:
+                if self.kingIsSafeOn(sq + 1) and self.kingIsSafeOn(sq + 2):
+                    self.addMove(sq, sq + 2, moves)
+        if self.castleRights & queenside:
+            if squares[sq - 1] == EMPTY and squares[sq - 2] == EMPTY and squares[sq - 3] == EMPTY:
+                if self.kingIsSafeOn(sq - 1) and self.kingIsSafeOn(sq - 2):
+                    self.addMove(sq, sq - 2, moves)
+
+    '''
+    Returns True if the king of the player to move wouldn't be in check on the 0x88 square sq. The king is taken
+    off its square while the attacks on sq are looked up, so it can't hide behind itself by stepping back along a
+    checking line.
+    '''
+    def kingIsSafeOn(self, sq):
         if self.whiteToMove:
-            for move in knightMoves:
-                newRow = r + move[0]
-                newCol = c + move[1]
-                
-                if 0 <= newRow <= 7 and 0 <= newCol <= 7:
-                    if self.board[newRow][newCol] == '--' or self.board[newRow][newCol][0] == 'b':
-                        moves.append(Move((r, c), (newRow, newCol), self.board))
+            kingRow, kingCol = self.whiteKingLocation
+            enemyColor = BLACK
         else:
-            for move in knightMoves:
-                newRow = r + move[0]
-                newCol = c + move[1]
-                
-                if 0 <= newRow <= 7 and 0 <= newCol <= 7:
-                    if self.board[newRow][newCol] == '--' or self.board[newRow][newCol][0] == 'w':
-                        moves.append(Move((r, c), (newRow, newCol), self.board))
+            kingRow, kingCol = self.blackKingLocation
+            enemyColor = WHITE
+        squares = self.squares
+        kingSq = kingRow * 16 + kingCol
+        king = squares[kingSq]
+        squares[kingSq] = EMPTY
+        attacked = self.isSquareAttacked(sq, enemyColor)
+        squares[kingSq] = king
+        return not attacked
 
 
 
-    def getQueenMoves(self, r, c, moves):
-        queenMoves = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
-        if self.whiteToMove:
-            for direction in queenMoves:
-                dr, dc = direction
-                
-                for i in range(1, 8):
-                    new_r = r + i * dr
-                    new_c = c + i * dc
-                    
-                    if 0 <= new_r < 8 and 0 <= new_c < 8:
-                        target_piece = self.board[new_r][new_c]
-                        
-                        if target_piece == '--':
-                            moves.append(Move((r, c), (new_r, new_c), self.board))
-                        elif target_piece[0] == 'b':
-                            moves.append(Move((r, c), (new_r, new_c), self.board))
-                            break
-                    else:
-                        break
-        else:
-            for direction in queenMoves:
-                dr, dc = direction
-                
-                for i in range(1, 8):
-                    new_r = r + i * dr
-                    new_c = c + i * dc
-                    
-                    if 0 <= new_r < 8 and 0 <= new_c < 8:
-                        target_piece = self.board[new_r][new_c]
-                        
-                        if target_piece == '--':
-                            moves.append(Move((r, c), (new_r, new_c), self.board))
-                        elif target_piece[0] == 'w':
-                            moves.append(Move((r, c), (new_r, new_c), self.board))
-                            break
-                    else:
-                        break
-                    
-            
-                        
-                        
-    def getKingMoves(self, r, c, moves):
-        directions = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (-1, 1), (1, -1)]
-        board_height = len(self.board)
-        board_width = len(self.board[0])
-        color = 'b' if self.whiteToMove else 'w'
-
-        for direction in directions:
-            dr, dc = direction
-            new_r, new_c = r + dr, c + dc
-            
-            if 0 <= new_r < board_height and 0 <= new_c < board_width:
-                target_piece = self.board[new_r][new_c]
-                
-                if target_piece == '--' or target_piece[0] == color:
-                    moves.append(Move((r, c), (new_r, new_c), self.board))
-
-            
-            
+
+'''
+Most valuable victim, least valuable attacker: take the biggest piece with the smallest one first. Promotions
+count the piece promoted to as won material.
+'''
+def captureOrder(move):
+    victim = PIECE_VALUES[move.pieceCapturedCode & 7] if move.pieceCapturedCode else 0
+    if move.promotionCode:
+        victim += PIECE_VALUES[move.promotionCode & 7]
+    return victim * 16 - PIECE_VALUES[move.pieceMovedCode & 7] // 100
 
 
 class Move():
+    # Moves only store their squares and pieces and are never changed after they are made, so the generators
+    # share one interned Move per (start, end, pieceMoved, pieceCaptured, promotion) instead of allocating a new
+    # object for every candidate square. __slots__ keeps each move small and skips the per-instance __dict__.
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured',
+                 'startSq', 'endSq', 'captureSq', 'pieceMovedCode', 'pieceCapturedCode',
+                 'isPawnPromotion', 'promotionPiece', 'promotionCode', 'isEnpassantMove', 'isCastleMove', 'moveID')
+
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4,
                    "5": 3, "6": 2, "7": 1, "8": 0}
     rowsToRanks = {v:k for k, v in ranksToRows.items()}
@@ -415,14 +1090,61 @@ class Move():
                   "e": 4, "f": 5, "g": 6, "h": 7}
     colToFiles = {v: k for k, v in filesToCol.items()}
     # Constructor
-    def __init__(self, startSq, endSq, board):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+    # A pawn reaching the last rank promotes to promotionPiece ('Q', 'R', 'B' or 'N'). En passant and castling
+    # are worked out from the board, so a move built from two clicks matches the generated move.
+    def __init__(self, startSq, endSq, board, promotionPiece='Q'):
+        pieceMoved = board[startSq[0]][startSq[1]]
+        if pieceMoved[1] == 'p' and endSq[0] in (0, 7):
+            promotionPiece = pieceMoved[0] + promotionPiece
+        else:
+            promotionPiece = '--'
+        self.setSquares(startSq[0] * 16 + startSq[1], endSq[0] * 16 + endSq[1],
+                        pieceMoved, board[endSq[0]][endSq[1]], promotionPiece)
+
+    '''
+    Fills in the move from the 0x88 squares start and end, the names of the pieces on them and the name of the
+    piece a pawn promotes to ('--' if it isn't a promotion)
+    '''
+    def setSquares(self, start, end, pieceMoved, pieceCaptured, promotionPiece='--'):
+        self.startRow = start >> 4
+        self.startCol = start & 7
+        self.endRow = end >> 4
+        self.endCol = end & 7
+        self.startSq = start #0x88 squares and piece codes used by GameState
+        self.endSq = end
+        self.captureSq = end
+        self.pieceMoved = pieceMoved
+        #a pawn moving diagonally onto an empty square is capturing en passant
+        self.isEnpassantMove = pieceMoved[1] == 'p' and self.startCol != self.endCol and pieceCaptured == '--'
+        if self.isEnpassantMove:
+            pieceCaptured = ('b' if pieceMoved[0] == 'w' else 'w') + 'p'
+            self.captureSq = (start & 0x70) | (end & 7)
+        self.pieceCaptured = pieceCaptured
+        self.isCastleMove = pieceMoved[1] == 'K' and abs(self.startCol - self.endCol) == 2
+        self.isPawnPromotion = promotionPiece != '--'
+        self.promotionPiece = promotionPiece
+        self.pieceMovedCode = PIECE_CODES[pieceMoved]
+        self.pieceCapturedCode = PIECE_CODES[pieceCaptured]
+        self.promotionCode = PIECE_CODES[promotionPiece]
+        #integer move code: start square (0-63) in the low 6 bits, end square in the next 6 and the promotion
+        #piece type above them
+        self.moveID = (self.startRow * 8 + self.startCol) | (self.endRow * 8 + self.endCol) << 6 \
+            | (self.promotionCode & 7) << 12
+
+    '''
+    Returns the interned move from the 0x88 square start to end for the pieces on squares, creating it the first
+    time it is seen. promotion is the piece code a pawn promotes to. The cache is bounded by the number of
+    distinct (start, end, moved, captured, promotion) combinations.
+    '''
+    @staticmethod
+    def fromSquares(start, end, squares, promotion=EMPTY):
+        key = start | end << 7 | squares[start] << 14 | squares[end] << 18 | promotion << 22
+        move = MOVE_CACHE.get(key)
+        if move is None:
+            move = Move.__new__(Move)
+            move.setSquares(start, end, PIECE_NAMES[squares[start]], PIECE_NAMES[squares[end]], PIECE_NAMES[promotion])
+            MOVE_CACHE[key] = move
+        return move
 
     """
     Overriding the equals
@@ -432,10 +1154,20 @@ class Move():
             return self.moveID == other.moveID
         return False
 
+    '''
+    Moves that are equal hash the same, so moves can be used in sets and as dictionary keys
+    '''
+    def __hash__(self):
+        return self.moveID
+
+    '''
+    Coordinate notation, with the promotion piece added for promotions (e7e8q)
+    '''
     def getChessNotation(self):
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += self.promotionPiece[1].lower()
+        return notation
 
     def getRankFile(self, r, c):
         return self.colToFiles[c] + self.rowsToRanks[r]
-
-        
\ No newline at end of file
@@ -0,0 +1,25 @@
+# Static evaluation of a GameState: material plus piece-square tables, blended between a middlegame and an
+# endgame table by how much material is left on the board. Scores are in centipawns.
+#
+# The tables live in ChessEngine because GameState keeps the material, table scores and phase as running totals
+# that makeMove/undoMove update with a few lookups, so evaluating a position doesn't look at the board at all.
+try: #imported from the installed ChessBot package
+    from .ChessEngine import MAX_PHASE
+except ImportError: #run from the source folder
+    from ChessEngine import MAX_PHASE
+
+
+'''
+Scores the position from white's point of view from the totals kept by the GameState
+'''
+def evaluateWhite(gs):
+    phase = min(gs.phase, MAX_PHASE)
+    return (gs.middlegameScore * phase + gs.endgameScore * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+'''
+Scores the position from the point of view of the player to move, which is what negamax search wants
+'''
+def evaluate(gs):
+    score = evaluateWhite(gs)
+    return score if gs.whiteToMove else -score
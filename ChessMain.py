@@ -1,44 +1,74 @@
 # This is our main driver file. It will be responsible for handling user input and displaying the current GameState Object.
-import pygame as p
-import ChessEngine
+import os
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine, ChessWorker
+    from .LegalMoveCache import LegalMoveCache
+except ImportError: #run from the source folder
+    import ChessEngine
+    import ChessWorker
+    from LegalMoveCache import LegalMoveCache
+
+p = None #pygame, imported by main() so the engine modules can be used (and this one imported) without it
 
 WIDTH = HEIGHT = 512 ## 400 is another good option for resolution
 DIMENSIONS = 8 # board is 8x8 squares
 SQ_SIZE = HEIGHT // DIMENSIONS
-MAX_FPS = 15 #For animations later
-IMAGES = {}
+MAX_FPS = 15 #For animations later, and how often the engine's answer is looked for while it thinks
+IMAGES = {} #piece name -> sprite already scaled to SQ_SIZE
+PICTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Pictures') #installed with the package
+WHITE_IS_HUMAN = True #False lets the engine play white
+BLACK_IS_HUMAN = False #False lets the engine play black
+ENGINE_THINK_TIME = 2.0 #seconds per engine move
+BOOK_PATH = None #opening book file for the engine (see OpeningBook.py), None to always search
+SHOW_ENGINE_INFO = False #print the engine's depth, score and principal variation while it thinks
 
 '''
-Initialize a global dictionary of images. This will be called once in the main
+Returns the sprite of a piece, loading and scaling it the first time it is drawn. Sprites are converted to the
+screen's pixel format once so blitting them doesn't convert them again every time.
 '''
-
-def loadImages():
-    pieces = ['wp', 'bp', 'wK', 'wQ', 'wR', 'wB', 'wN', 'bK', 'bQ', 'bR', 'bB', 'bN']
-    for piece in pieces:
-        IMAGES[piece] = p.transform.scale(p.image.load("../Pictures/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
+def getImage(piece):
+    image = IMAGES.get(piece)
+    if image is None:
+        image = p.image.load(os.path.join(PICTURES_DIR, piece + ".png"))
+        image = p.transform.smoothscale(image.convert_alpha(), (SQ_SIZE, SQ_SIZE))
+        IMAGES[piece] = image
+    return image
 
 ####
 #The main driver for our code. THis will handle user input and updating the graphics
         
 def main():
+    global p
+    import pygame as p
     p.init()
     screen = p.display.set_mode((WIDTH, HEIGHT))
     clock = p.time.Clock()
-    screen.fill(p.Color("white"))
+    view = BoardView(screen)
     gs = ChessEngine.GameState() # Calls the constructor and creates an instance of GameState with the three variables
-    validMoves = gs.getValidMoves()
+    gs.moveCache = LegalMoveCache() #undo and redo keep coming back to the same positions
+    validMoves = set(gs.getValidMoves()) # moves are hashable so checking a click against them is O(1)
     moveMade = False #Flag varibale for when a move is made
+    #the engine searches in another process so the window keeps responding while it thinks
+    worker = None if WHITE_IS_HUMAN and BLACK_IS_HUMAN else ChessWorker.EngineWorker(bookPath=BOOK_PATH)
+    engineThinking = False
 
-    loadImages() #only do this once before the while loop
     running = True
     sqSelected = () # no square is selected intially, keep track of the last click of the user, contains the row and column
     playerClicks = [] #keeps track of the player clicks (two tuples: (6, 4), (4, 4))
 
     while running:
-        for e in p.event.get():
+        humanTurn = (gs.whiteToMove and WHITE_IS_HUMAN) or (not gs.whiteToMove and BLACK_IS_HUMAN)
+        #nothing changes on screen until the human does something, so sleep until an event comes in instead of
+        #redrawing every frame. While the engine thinks its answer is looked for MAX_FPS times a second.
+        idle = not validMoves or (humanTurn and not engineThinking and (worker is None or worker.pondering))
+        events = [p.event.wait()] + p.event.get() if idle else p.event.get()
+        for e in events:
             if e.type == p.QUIT:
                 running = False
-            elif e.type == p.MOUSEBUTTONDOWN:
+            elif e.type == p.VIDEOEXPOSE: #the window was covered, everything has to be drawn again
+                view.invalidate()
+            elif e.type == p.MOUSEBUTTONDOWN and humanTurn:
                 location = p.mouse.get_pos() # gets x and y location of the mouse
                 col = location[0]//SQ_SIZE
                 row = location[1]//SQ_SIZE
@@ -55,6 +85,8 @@ def main():
                     print(move.getChessNotation())
                     if move in validMoves:
                         moveMade = True
+                        if worker is not None:
+                            worker.stop() #stop pondering, it's the engines turn now
                         gs.makeMove(move)
                         sqSelected = () #resets user clicks
                         playerClicks = []
@@ -64,43 +96,108 @@ def main():
                     #key handlers
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z:
+                    if worker is not None:
+                        worker.stop() #cancel the search, the position it was searching is gone
+                        engineThinking = False
                     gs.undoMove()
+                    #against the engine, take back its reply as well so it is the humans turn again
+                    humanTurn = (gs.whiteToMove and WHITE_IS_HUMAN) or (not gs.whiteToMove and BLACK_IS_HUMAN)
+                    if worker is not None and (WHITE_IS_HUMAN or BLACK_IS_HUMAN) and not humanTurn:
+                        gs.undoMove()
+                    sqSelected = ()
+                    playerClicks = []
                     moveMade = True
 
         if moveMade:
-            validMoves = gs.getValidMoves() # only gets valid moves when a move is actually made
+            validMoves = set(gs.getValidMoves()) # only gets valid moves when a move is actually made
+            moveMade = False
+
+        #engine move finder
+        if worker is not None and validMoves:
+            humanTurn = (gs.whiteToMove and WHITE_IS_HUMAN) or (not gs.whiteToMove and BLACK_IS_HUMAN)
+            if not humanTurn and not engineThinking:
+                worker.startSearch(gs, timeLimit=ENGINE_THINK_TIME)
+                engineThinking = True
+            elif humanTurn and not engineThinking and not worker.pondering:
+                worker.startSearch(gs, ponder=True) #think on the humans time
+            result = worker.getResult()
+            while result is not None:
+                kind, payload = result
+                if kind == 'info':
+                    if SHOW_ENGINE_INFO:
+                        print(f"depth {payload['depth']} score {payload['score']} nps {payload['nps']} pv {' '.join(payload['pv'])}")
+                elif engineThinking: #bestmove
+                    engineThinking = False
+                    #None if there was no legal move, or the move is stale because the position changed meanwhile
+                    move = gs.getMoveByID(payload) if payload is not None else None
+                    if move is not None:
+                        print(move.getChessNotation())
+                        gs.makeMove(move)
+                        validMoves = set(gs.getValidMoves())
+                result = worker.getResult()
 
-        drawGameState(screen, gs)
+        dirtyRects = view.draw(gs.board, sqSelected)
+        if dirtyRects:
+            p.display.update(dirtyRects) #only send the squares that changed to the screen
         clock.tick(MAX_FPS)
-        p.display.flip()
+
+    if worker is not None:
+        worker.close()
             
 
-"""
-Responsible for all of the graphics with in the current game state
-"""
-def drawGameState(screen, gs):
-    drawBoard(screen) # add these 2 in later
-    drawPieces(screen, gs.board) #draws pieces ontop of those squares
+class BoardView():
+    # Draws the game onto the screen one square at a time. The checkered board is drawn once into a cached
+    # surface, and the board as it was last drawn is kept so every frame only the squares that changed since
+    # (the squares of the last move or undo and the old and new selected square) are drawn again.
+    def __init__(self, screen):
+        self.screen = screen
+        self.background = p.Surface((WIDTH, HEIGHT))
+        drawBoard(self.background)
+        self.highlight = p.Surface((SQ_SIZE, SQ_SIZE), p.SRCALPHA)
+        self.highlight.fill(p.Color(255, 255, 0, 100))
+        self.drawnBoard = None #what each square showed when it was last drawn, None redraws everything
+        self.drawnSelection = ()
+
+    '''
+    Forces the next draw to redraw the whole board
+    '''
+    def invalidate(self):
+        self.drawnBoard = None
+
+    '''
+    Redraws the squares that changed since the last call and returns their rects for pygame.display.update
+    '''
+    def draw(self, board, sqSelected):
+        if self.drawnBoard is None:
+            dirty = {(r, c) for r in range(DIMENSIONS) for c in range(DIMENSIONS)}
+        else:
+            dirty = {(r, c) for r in range(DIMENSIONS) for c in range(DIMENSIONS)
+                     if board[r][c] != self.drawnBoard[r][c]}
+        if sqSelected != self.drawnSelection:
+            dirty.update(square for square in (sqSelected, self.drawnSelection) if square)
+        rects = []
+        for r, c in dirty:
+            rect = p.Rect((c*SQ_SIZE, r*SQ_SIZE), (SQ_SIZE, SQ_SIZE))
+            self.screen.blit(self.background, rect, rect) #the empty square from the cached board
+            if (r, c) == sqSelected:
+                self.screen.blit(self.highlight, rect)
+            piece = board[r][c]
+            if piece != "--":
+                self.screen.blit(getImage(piece), rect)
+            rects.append(rect)
+        self.drawnBoard = [row[:] for row in board]
+        self.drawnSelection = sqSelected
+        return rects
 
 """
 Draws the squares on the board. Top left square is always White for either perspective
 """
-def drawBoard(screen):
+def drawBoard(surface):
     colors = [p.Color("white"), p.Color("dark gray")]
     for r in range(DIMENSIONS):
         for c in range(DIMENSIONS):
             color = colors[((r+c) % 2)]
-            p.draw.rect(screen, color, p.Rect((c*SQ_SIZE, r*SQ_SIZE), (SQ_SIZE, SQ_SIZE)))
-
-"""
-Draws the pieces on the board using the current GameState.board
-"""
-def drawPieces(screen, board):
-    for r in range(DIMENSIONS):
-        for c in range(DIMENSIONS):
-            piece = board[r][c]
-            if piece != "--":
-                screen.blit(IMAGES[piece], p.Rect((c*SQ_SIZE, r*SQ_SIZE), (SQ_SIZE, SQ_SIZE)))
+            p.draw.rect(surface, color, p.Rect((c*SQ_SIZE, r*SQ_SIZE), (SQ_SIZE, SQ_SIZE)))
 
 if __name__ == "__main__":
     main()
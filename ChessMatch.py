@@ -0,0 +1,661 @@
+# Plays two engine configurations against each other without the GUI, to test whether a change makes the engine
+# stronger (or faster). Games are spread over a pool of processes, every opening is played twice with the colors
+# reversed, and each finished game is written to the results file (one JSON object per line) as soon as it ends.
+# Elo and the SPRT log likelihood ratio are updated after every game, and the match stops as soon as the SPRT is
+# conclusive.
+#
+# An engine is given as comma separated key=value pairs. The built-in engine plays in the worker process; cmd= runs
+# any UCI engine instead, for example an older checkout of this repository (cmd=python ../old/ChessUCI.py).
+#
+#   name=NAME          shown in the results
+#   hash=MB            transposition table size of the built-in engine
+#   tablebases=DIR     endgame tablebases for the built-in engine
+#   cmd=COMMAND        a UCI engine to run instead of the built-in one
+#   tc=BASE+INC        clock in seconds per game plus increment per move
+#   movetime=SECONDS, nodes=N, depth=N       limits per move (override the --tc/--movetime/--nodes/--depth given
+#                                            for both engines)
+#
+#   python ChessMatch.py --engine name=new,hash=32 --engine name=old,cmd="python ../old/ChessUCI.py" \
+#       --tc 5+0.05 --openings openings.epd --games 2000 --sprt 0 5 --workers 8 --output results.jsonl
+#   python ChessMatch.py --engine name=20k,nodes=20000 --engine name=10k,nodes=10000 --book book.bin
+import collections
+import json
+import math
+import multiprocessing.util
+import os
+import queue
+import random
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine, ChessPGN, ChessSearch, ChessUCI
+    from .OpeningBook import OpeningBook
+    from .Tablebase import Tablebase, WIN, LOSS
+except ImportError: #run from the source folder
+    import ChessEngine
+    import ChessPGN
+    import ChessSearch
+    import ChessUCI
+    from OpeningBook import OpeningBook
+    from Tablebase import Tablebase, WIN, LOSS
+
+GAMES_IN_FLIGHT = 2 #games queued per worker
+LIMIT_KEYS = ('tc', 'movetime', 'nodes', 'depth')
+DEFAULT_TC = '10+0.1'
+DEFAULT_OPENING_PLIES = 8 #plies played from the book, taken from PGN games, or played at random
+MAX_PLIES = 400 #a game still going after this many plies is a draw
+TIME_MARGIN = 0.1 #seconds a move may overrun the clock before it loses on time (process scheduling)
+RESPONSE_MARGIN = 1.0 #seconds a UCI engine may take beyond its clock or movetime before it loses by timeout
+SEARCH_TIMEOUT = 60.0 #seconds a UCI engine with only node or depth limits gets for a move
+READY_TIMEOUT = 30.0 #seconds a UCI engine gets to answer uci and isready
+
+#adjudication: a draw once both engines' scores stayed within DRAW_SCORE for DRAW_PLIES plies from move DRAW_MOVE
+#on, a resignation once both agreed for RESIGN_PLIES plies that one side is RESIGN_SCORE ahead
+DEFAULT_ADJUDICATION = {'drawMove': 40, 'drawPlies': 8, 'drawScore': 10, 'resignPlies': 6, 'resignScore': 600}
+
+
+'''
+Turns an engine string (name=new,nodes=20000,...) into a config dict. Limits not in it are taken from defaults.
+'''
+def parseEngine(text, defaults, number):
+    config = {'name': f'engine{number}', 'hash': ChessUCI.DEFAULT_HASH, 'tablebases': None, 'cmd': None}
+    limits = {}
+    for item in text.split(','):
+        key, separator, value = item.partition('=')
+        key = key.strip()
+        if not separator or not value:
+            raise ValueError(f'expected key=value in engine {text!r}, got {item!r}')
+        if key in ('name', 'tablebases', 'cmd'):
+            config[key] = value.strip().strip('"\'') if key == 'cmd' else value.strip()
+        elif key == 'hash':
+            config['hash'] = int(value)
+        elif key in LIMIT_KEYS:
+            limits[key] = value
+        else:
+            raise ValueError(f'unknown engine option {key!r} in {text!r}')
+    if not limits: #the engine sets none of its own limits, use the ones for both
+        limits = {key: value for key, value in defaults.items() if value is not None}
+    if not limits:
+        limits = {'tc': DEFAULT_TC}
+    config['tc'] = parseTimeControl(limits['tc']) if 'tc' in limits else None
+    config['movetime'] = float(limits['movetime']) if 'movetime' in limits else None
+    config['nodes'] = int(limits['nodes']) if 'nodes' in limits else None
+    config['depth'] = int(limits['depth']) if 'depth' in limits else None
+    return config
+
+
+'''
+Parses BASE+INC (or just BASE) in seconds into (base, increment)
+'''
+def parseTimeControl(text):
+    base, separator, increment = str(text).partition('+')
+    return float(base), float(increment) if separator else 0.0
+
+
+'''
+Plays the built-in engine: one Searcher kept for the whole game, like ChessUCI does
+'''
+class EnginePlayer():
+    def __init__(self, config):
+        self.config = config
+        self.tablebase = Tablebase(config['tablebases']) if config['tablebases'] else None
+        self.searcher = ChessSearch.Searcher(config['hash'], tablebase=self.tablebase)
+
+    def newGame(self):
+        self.searcher.reset()
+
+    '''
+    Returns (move, score) for gs: the move to play and the engine's score in centipawns from the side to move
+    '''
+    def play(self, gs, startFEN, moveTexts, clocks):
+        timeLimit = moveTime(self.config, gs.whiteToMove, clocks)
+        move = self.searcher.search(gs, self.config['depth'], timeLimit, self.config['nodes'])
+        return move, self.searcher.bestScore
+
+    def close(self):
+        if self.tablebase is not None:
+            self.tablebase.close()
+
+
+'''
+Plays a UCI engine running in its own process. A thread reads the engine's output into a queue, so waiting for
+an answer can time out instead of hanging the match on an engine that never replies.
+'''
+class UCIPlayer():
+    def __init__(self, config):
+        self.config = config
+        self.score = 0 #score of the last info line, from the side to move
+        self.start()
+
+    def start(self):
+        self.process = subprocess.Popen(shlex.split(self.config['cmd']), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        self.lines = queue.Queue()
+        threading.Thread(target=readLines, args=(self.process.stdout, self.lines), daemon=True).start()
+        self.send('uci')
+        self.waitFor('uciok', READY_TIMEOUT)
+        self.send(f"setoption name Hash value {self.config['hash']}")
+
+    '''
+    Kills the engine and starts it again, after it timed out (a late bestmove would be taken as the answer to the
+    next position) or stopped
+    '''
+    def restart(self):
+        self.process.kill()
+        self.process.wait()
+        self.start()
+
+    def send(self, line):
+        self.process.stdin.write(line + '\n')
+        self.process.stdin.flush()
+
+    '''
+    Reads lines until one starting with token and returns it split into words. Raises TimeoutError if that
+    takes more than timeout seconds and EOFError if the engine stops.
+    '''
+    def waitFor(self, token, timeout):
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                line = self.lines.get(timeout=max(deadline - time.perf_counter(), 0.0))
+            except queue.Empty:
+                raise TimeoutError(f"UCI engine {self.config['name']!r} didn't answer {token} in {timeout:.1f}s")
+            if line is None:
+                raise EOFError(f"UCI engine {self.config['name']!r} stopped")
+            words = line.split()
+            if words and words[0] == token:
+                return words
+            if words and words[0] == 'info':
+                self.readScore(words)
+
+    def readScore(self, words):
+        if 'score' not in words:
+            return
+        i = words.index('score')
+        if i + 2 < len(words) and words[i + 1] == 'cp':
+            self.score = int(words[i + 2])
+        elif i + 2 < len(words) and words[i + 1] == 'mate':
+            mate = int(words[i + 2])
+            self.score = ChessSearch.MATE_SCORE - 2 * mate + 1 if mate > 0 else -ChessSearch.MATE_SCORE - 2 * mate
+
+    def newGame(self):
+        if self.process.poll() is not None: #it stopped during the last game
+            self.restart()
+        self.send('ucinewgame')
+        self.send('isready')
+        self.waitFor('readyok', READY_TIMEOUT)
+
+    '''
+    Returns (move, score) like EnginePlayer.play. Raises TimeoutError when the engine doesn't answer in time and
+    EOFError or OSError when it stopped; the engine is restarted for the next game either way.
+    '''
+
+    def play(self, gs, startFEN, moveTexts, clocks):
+        self.score = 0
+        self.send(f"position fen {startFEN}{' moves ' + ' '.join(moveTexts) if moveTexts else ''}")
+        limits = []
+        if self.config['tc'] is not None:
+            increment = int(self.config['tc'][1] * 1000)
+            limits += [f'wtime {int(clocks[0] * 1000)}', f'btime {int(clocks[1] * 1000)}',
+                       f'winc {increment}', f'binc {increment}']
+        if self.config['movetime'] is not None:
+            limits.append(f"movetime {int(self.config['movetime'] * 1000)}")
+        if self.config['nodes'] is not None:
+            limits.append(f"nodes {self.config['nodes']}")
+        if self.config['depth'] is not None:
+            limits.append(f"depth {self.config['depth']}")
+        try:
+            self.send('go ' + ' '.join(limits))
+            words = self.waitFor('bestmove', responseTimeout(self.config, 0 if gs.whiteToMove else 1, clocks))
+        except (EOFError, OSError):
+            self.restart()
+            raise
+        move = ChessUCI.parseMove(gs, words[1]) if len(words) > 1 else None
+        return move, self.score
+
+    def close(self):
+        try:
+            self.send('quit')
+            self.process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+'''
+Puts every line of a UCI engine's output on lines, then None when the output ends
+'''
+def readLines(stdout, lines):
+    for line in stdout:
+        lines.put(line)
+    lines.put(None)
+
+
+'''
+Seconds to wait for a UCI engine's bestmove before it loses by timeout: what is left on its clock or its movetime
+plus RESPONSE_MARGIN, or SEARCH_TIMEOUT when it only has node or depth limits
+'''
+def responseTimeout(config, side, clocks):
+    timeouts = []
+    if config['tc'] is not None:
+        timeouts.append(clocks[side] + RESPONSE_MARGIN)
+    if config['movetime'] is not None:
+        timeouts.append(config['movetime'] + RESPONSE_MARGIN)
+    return min(timeouts) if timeouts else SEARCH_TIMEOUT
+
+
+'''
+Seconds the built-in engine may spend on this move, or None when it only has node or depth limits
+'''
+def moveTime(config, whiteToMove, clocks):
+    limits = {}
+    if config['tc'] is not None:
+        increment = config['tc'][1] * 1000
+        limits.update(wtime=clocks[0] * 1000, btime=clocks[1] * 1000, winc=increment, binc=increment)
+    if config['movetime'] is not None:
+        limits['movetime'] = config['movetime'] * 1000
+    return ChessUCI.allocateTime(limits, whiteToMove)
+
+
+def makePlayer(config):
+    return UCIPlayer(config) if config['cmd'] else EnginePlayer(config)
+
+
+'''
+True if neither side has enough material left to ever mate: only kings, plus at most one bishop or knight
+'''
+def insufficientMaterial(gs):
+    counts = gs.pieceCounts
+    for color in (ChessEngine.WHITE, ChessEngine.BLACK):
+        if counts[color | ChessEngine.PAWN] or counts[color | ChessEngine.ROOK] or counts[color | ChessEngine.QUEEN]:
+            return False
+    minors = sum(counts[color | pieceType] for color in (ChessEngine.WHITE, ChessEngine.BLACK)
+                 for pieceType in (ChessEngine.KNIGHT, ChessEngine.BISHOP))
+    return minors <= 1
+
+
+'''
+Plays one game from startFEN between players (white, black). Returns (result, reason, moveTexts) with the result
+as in PGN ('1-0', '0-1' or '1/2-1/2').
+'''
+def playGame(players, configs, startFEN, adjudication=DEFAULT_ADJUDICATION, tablebase=None):
+    gs = ChessEngine.GameState()
+    gs.loadFEN(startFEN)
+    for player in players:
+        player.newGame()
+    clocks = [config['tc'][0] if config['tc'] is not None else 0.0 for config in configs]
+    seen = collections.Counter([gs.zobristKey])
+    moveTexts = []
+    drawPlies = resignPlies = 0
+    resignSide = None #the side both engines agree is winning
+
+    def winner(white, reason):
+        return ('1-0' if white else '0-1'), reason, moveTexts
+
+    while True:
+        moves = gs.getValidMoves()
+        if not moves:
+            if gs.inCheck():
+                return winner(not gs.whiteToMove, 'checkmate')
+            return '1/2-1/2', 'stalemate', moveTexts
+        if gs.halfmoveClock >= 100:
+            return '1/2-1/2', 'fifty moves', moveTexts
+        if seen[gs.zobristKey] >= 3:
+            return '1/2-1/2', 'repetition', moveTexts
+        if insufficientMaterial(gs):
+            return '1/2-1/2', 'insufficient material', moveTexts
+        if len(moveTexts) >= MAX_PLIES:
+            return '1/2-1/2', 'move limit', moveTexts
+        if tablebase is not None:
+            probed = tablebase.probe(gs)
+            if probed is not None:
+                if probed[0] == WIN:
+                    return winner(gs.whiteToMove, 'tablebase')
+                if probed[0] == LOSS:
+                    return winner(not gs.whiteToMove, 'tablebase')
+                return '1/2-1/2', 'tablebase', moveTexts
+
+        side = 0 if gs.whiteToMove else 1
+        config = configs[side]
+        startTime = time.perf_counter()
+        try:
+            move, score = players[side].play(gs, startFEN, moveTexts, clocks)
+        except TimeoutError:
+            return winner(side == 1, 'timeout')
+        except (EOFError, OSError):
+            return winner(side == 1, 'engine stopped')
+        if config['tc'] is not None:
+            clocks[side] -= time.perf_counter() - startTime
+            if clocks[side] < -TIME_MARGIN:
+                return winner(side == 1, 'time forfeit')
+            clocks[side] = max(clocks[side], 0.0) + config['tc'][1]
+        move = gs.getMoveByID(move.moveID) if move is not None else None
+        if move is None:
+            return winner(side == 1, 'illegal move')
+        whiteScore = score if side == 0 else -score
+        gs.makeMove(move)
+        moveTexts.append(move.getChessNotation())
+        seen[gs.zobristKey] += 1
+
+        if len(moveTexts) >= 2 * adjudication['drawMove'] and abs(score) <= adjudication['drawScore']:
+            drawPlies += 1
+            if drawPlies >= adjudication['drawPlies']:
+                return '1/2-1/2', 'adjudication', moveTexts
+        else:
+            drawPlies = 0
+        if abs(score) >= adjudication['resignScore']:
+            whiteLeads = whiteScore > 0
+            resignPlies = resignPlies + 1 if whiteLeads == resignSide else 1
+            resignSide = whiteLeads
+            if resignPlies >= adjudication['resignPlies']:
+                return winner(resignSide, 'adjudication')
+        else:
+            resignPlies = 0
+            resignSide = None
+
+
+# each worker process keeps its players (and their processes and transposition tables) for all of its games
+workerPlayers = None
+workerTablebase = None
+
+
+'''
+Plays game number gameNumber from startFEN in a worker, with configs[white] playing white. Returns the record
+that goes to the results file.
+'''
+def runGame(configs, gameNumber, startFEN, white, adjudication, tablebasePath):
+    global workerPlayers, workerTablebase
+    if workerPlayers is None:
+        workerPlayers = [makePlayer(config) for config in configs]
+        workerTablebase = Tablebase(tablebasePath) if tablebasePath else None
+        #a worker process closes them when the pool shuts it down (the UCI engines would outlive it otherwise)
+        multiprocessing.util.Finalize(None, closePlayers, exitpriority=10)
+    order = (white, 1 - white)
+    startTime = time.perf_counter()
+    result, reason, moveTexts = playGame([workerPlayers[i] for i in order], [configs[i] for i in order],
+                                         startFEN, adjudication, workerTablebase)
+    #score of the first engine: 1 for a win, 0.5 for a draw
+    score = 0.5 if result == '1/2-1/2' else float((result == '1-0') == (white == 0))
+    return {'game': gameNumber, 'white': configs[order[0]]['name'], 'black': configs[order[1]]['name'],
+            'result': result, 'reason': reason, 'score': score, 'plies': len(moveTexts),
+            'seconds': round(time.perf_counter() - startTime, 3), 'opening': startFEN, 'moves': ' '.join(moveTexts)}
+
+
+'''
+Closes the players of this process: at the end of a match played without worker processes, and when a worker
+process exits
+'''
+def closePlayers():
+    global workerPlayers, workerTablebase
+    for player in workerPlayers or ():
+        player.close()
+    if workerTablebase is not None:
+        workerTablebase.close()
+    workerPlayers = workerTablebase = None
+
+
+'''
+Yields opening positions as FEN, forever: from an EPD/FEN file (each line is an opening) or PGN file (the
+position after the first plies moves of each game), in random order and starting over when they run out; from
+an opening book (plies book moves, picked by weight); otherwise plies random moves from the start position.
+'''
+def openingPositions(path=None, bookPath=None, plies=DEFAULT_OPENING_PLIES, rng=random):
+    if path is not None:
+        if path.lower().endswith('.pgn'):
+            openings = list(pgnOpenings(path, plies))
+        else:
+            openings = [fen for fen, operations in ChessPGN.readEPD(path)]
+        if not openings:
+            raise ValueError(f'no openings in {path}')
+        while True:
+            rng.shuffle(openings)
+            yield from openings
+    book = OpeningBook(bookPath) if bookPath is not None else None
+    gs = ChessEngine.GameState()
+    while True:
+        gs.loadFEN(ChessEngine.START_FEN)
+        for ply in range(plies):
+            move = book.chooseMove(gs, rng) if book is not None else None
+            if move is None: #out of book, or no book
+                moves = gs.getValidMoves()
+                if not moves or book is not None:
+                    break
+                move = rng.choice(moves)
+            gs.makeMove(move)
+        if gs.getValidMoves():
+            yield gs.getFEN()
+
+
+'''
+Yields the position after the first plies moves of every PGN game that is at least that long
+'''
+def pgnOpenings(path, plies):
+    gs = ChessEngine.GameState()
+    for headers, sanMoves in ChessPGN.readPGN(path):
+        if len(sanMoves) < plies:
+            continue
+        try:
+            gs.loadFEN(headers.get('FEN', ChessEngine.START_FEN))
+            for san in sanMoves[:plies]:
+                gs.makeMove(gs.parseSAN(san))
+        except ValueError:
+            continue
+        yield gs.getFEN()
+
+
+'''
+Expected score of the stronger side for an Elo difference
+'''
+def expectedScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def eloFromScore(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 400 * math.log10(score / (1 - score))
+
+
+'''
+Returns (elo, margin) of the first engine from wins, draws and losses: the Elo difference and the half width of
+its 95% confidence interval
+'''
+def eloEstimate(wins, draws, losses):
+    games = wins + draws + losses
+    if not games:
+        return 0.0, float('inf')
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0: #every game had the same result
+        return eloFromScore(score), float('inf')
+    spread = 1.96 * math.sqrt(variance / games)
+    return eloFromScore(score), (eloFromScore(score + spread) - eloFromScore(score - spread)) / 2
+
+
+'''
+Log likelihood ratio of the SPRT for H1 (the first engine is elo1 stronger) against H0 (elo0 stronger), with
+the usual normal approximation of the game scores. Half a game of each result is added to the variance so a
+match that only has wins (or only losses) so far still moves towards a verdict.
+'''
+def sprtLLR(wins, draws, losses, elo0, elo1):
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = ((wins + 0.5) * (1 - score) ** 2 + (draws + 0.5) * (0.5 - score) ** 2 +
+                (losses + 0.5) * score ** 2) / (games + 1.5)
+    score0, score1 = expectedScore(elo0), expectedScore(elo1)
+    return (score1 - score0) * (2 * score - score0 - score1) * games / (2 * variance)
+
+
+'''
+Returns the (lower, upper) LLR bounds for error rates alpha and beta: H0 is accepted at the lower bound and H1 at
+the upper one
+'''
+def sprtBounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+class MatchStats():
+    def __init__(self, sprt=None, alpha=0.05, beta=0.05):
+        self.wins = self.draws = self.losses = 0
+        self.sprt = sprt #(elo0, elo1) or None
+        self.bounds = sprtBounds(alpha, beta)
+        self.startTime = time.perf_counter()
+
+    def add(self, record):
+        if record['score'] == 1:
+            self.wins += 1
+        elif record['score'] == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def llr(self):
+        return sprtLLR(self.wins, self.draws, self.losses, *self.sprt) if self.sprt is not None else 0.0
+
+    '''
+    'H0' or 'H1' once the SPRT has accepted one of them, otherwise None
+    '''
+    def verdict(self):
+        if self.sprt is None:
+            return None
+        llr = self.llr()
+        if llr <= self.bounds[0]:
+            return 'H0'
+        if llr >= self.bounds[1]:
+            return 'H1'
+        return None
+
+    def gamesPerHour(self):
+        elapsed = time.perf_counter() - self.startTime
+        return self.games() * 3600 / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        elo, margin = eloEstimate(self.wins, self.draws, self.losses)
+        line = (f'games {self.games()}  +{self.wins} ={self.draws} -{self.losses}  elo {elo:+.1f} +/- {margin:.1f}  '
+                f'{self.gamesPerHour():.0f} games/hour')
+        if self.sprt is not None:
+            line += f'  LLR {self.llr():.2f} ({self.bounds[0]:.2f}, {self.bounds[1]:.2f})'
+        return line
+
+
+'''
+Plays up to games games between the two engine configs on workers processes (in this process if workers is 1),
+two per opening with the colors reversed. Every finished game is written to out as a JSON line and a summary to
+progress. Stops early once the SPRT of stats is conclusive. Returns stats.
+'''
+def runMatch(configs, openings, games, workers=None, stats=None, adjudication=DEFAULT_ADJUDICATION,
+             tablebasePath=None, out=None, progress=sys.stderr):
+    stats = stats if stats is not None else MatchStats()
+    workers = workers if workers else os.cpu_count() or 1
+
+    def tasks():
+        for gameNumber in range(games):
+            if gameNumber % 2 == 0:
+                fen = next(openings)
+            yield configs, gameNumber + 1, fen, gameNumber % 2, adjudication, tablebasePath
+
+    def record(result):
+        stats.add(result)
+        if out is not None:
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+        if progress is not None:
+            print(stats.summary(), file=progress)
+        return stats.verdict() is not None
+
+    if workers == 1:
+        try:
+            for task in tasks():
+                if record(runGame(*task)):
+                    break
+        finally:
+            closePlayers()
+        return stats
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        stopped = False
+        for task in tasks():
+            pending.add(pool.submit(runGame, *task))
+            if len(pending) < workers * GAMES_IN_FLIGHT:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if any([record(future.result()) for future in done]):
+                stopped = True
+                break
+        if stopped: #games not started yet are dropped, the ones being played are still counted
+            for future in pending:
+                future.cancel()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not future.cancelled():
+                    record(future.result())
+    return stats
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Play two engine configurations against each other')
+    parser.add_argument('--engine', action='append', required=True, metavar='KEY=VALUE,...',
+                        help='an engine, given twice: name=, hash=, tablebases=, cmd=, tc=, movetime=, nodes=, depth=')
+    parser.add_argument('--games', type=int, default=1000, help='most games to play')
+    parser.add_argument('--workers', type=int, default=None, help='games played at once (default: one per core)')
+    parser.add_argument('--tc', default=None, help=f'clock per game as BASE+INC seconds (default {DEFAULT_TC})')
+    parser.add_argument('--movetime', default=None, help='seconds per move')
+    parser.add_argument('--nodes', default=None, help='nodes per move')
+    parser.add_argument('--depth', default=None, help='depth per move')
+    parser.add_argument('--openings', default=None, help='EPD/FEN file of openings, or PGN file to take them from')
+    parser.add_argument('--book', default=None, help='opening book to play the openings from')
+    parser.add_argument('--opening-plies', type=int, default=DEFAULT_OPENING_PLIES,
+                        help='plies of each PGN game, book or random moves that make an opening')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the choice of openings')
+    parser.add_argument('--sprt', type=float, nargs=2, default=None, metavar=('ELO0', 'ELO1'),
+                        help='stop once the SPRT accepts elo0 or elo1 for the first engine')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--tablebases', default=None, metavar='DIR', help='adjudicate positions in the tablebases')
+    parser.add_argument('--draw-move', type=int, default=DEFAULT_ADJUDICATION['drawMove'],
+                        help='move number from which draws are adjudicated')
+    parser.add_argument('--draw-plies', type=int, default=DEFAULT_ADJUDICATION['drawPlies'])
+    parser.add_argument('--draw-score', type=int, default=DEFAULT_ADJUDICATION['drawScore'])
+    parser.add_argument('--resign-plies', type=int, default=DEFAULT_ADJUDICATION['resignPlies'])
+    parser.add_argument('--resign-score', type=int, default=DEFAULT_ADJUDICATION['resignScore'])
+    parser.add_argument('--output', default=None, help='file to stream the games to, one JSON object per line')
+    args = parser.parse_args(argv)
+    if len(args.engine) != 2:
+        parser.error('give --engine exactly twice')
+
+    defaults = {'tc': args.tc, 'movetime': args.movetime, 'nodes': args.nodes, 'depth': args.depth}
+    try:
+        configs = [parseEngine(text, defaults, number + 1) for number, text in enumerate(args.engine)]
+    except ValueError as error:
+        parser.error(str(error))
+    adjudication = {'drawMove': args.draw_move, 'drawPlies': args.draw_plies, 'drawScore': args.draw_score,
+                    'resignPlies': args.resign_plies, 'resignScore': args.resign_score}
+    openings = openingPositions(args.openings, args.book, args.opening_plies, random.Random(args.seed))
+    stats = MatchStats(args.sprt, args.alpha, args.beta)
+
+    out = open(args.output, 'w') if args.output else None
+    try:
+        runMatch(configs, openings, args.games, args.workers, stats, adjudication, args.tablebases, out)
+    finally:
+        if out is not None:
+            out.close()
+    print(f"{configs[0]['name']} vs {configs[1]['name']}: {stats.summary()}")
+    verdict = stats.verdict()
+    if verdict is not None:
+        print(f"SPRT: {verdict} accepted, {configs[0]['name']} is "
+              f"{'not ' if verdict == 'H0' else ''}{args.sprt[1]:g} Elo stronger")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
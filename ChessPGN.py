@@ -0,0 +1,135 @@
+# Streaming readers for game and position files. Files are read one line at a time and only the game being read
+# is kept in memory, so a PGN or EPD file of any size can be processed with constant memory.
+#
+#   for headers, moves in readPGN('games.pgn'): ...        moves are in SAN, as written in the file
+#   for fen in readPositions('games.pgn'): ...             the position after every move of every game
+#   for fen, operations in readEPD('tests.epd'): ...
+import contextlib
+import re
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine
+except ImportError: #run from the source folder
+    import ChessEngine
+
+HEADER_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_RE = re.compile(r'[{}();]|\$\d+|[^\s{}();]+')
+MOVE_NUMBER_RE = re.compile(r'^\d+\.*')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+
+'''
+Opens a path for reading, or passes an already open file through
+'''
+@contextlib.contextmanager
+def openSource(source):
+    if isinstance(source, str):
+        with open(source, encoding='utf-8', errors='replace') as f:
+            yield f
+    else:
+        yield source
+
+
+'''
+Yields every game in a PGN file as (headers, moves): the tag pairs as a dict and the moves of the main line in
+SAN. Comments, variations, move numbers and NAGs are skipped. source is a path or an open text file.
+'''
+def readPGN(source):
+    headers = {}
+    moves = []
+    inComment = False #inside a {...} comment, which can run over several lines
+    variationDepth = 0 #inside (...) variations, which can be nested
+    with openSource(source) as f:
+        for line in f:
+            if not inComment and line.startswith('%'): #escaped line
+                continue
+            stripped = line.strip()
+            if not inComment and variationDepth == 0 and stripped.startswith('['):
+                match = HEADER_RE.match(stripped)
+                if match:
+                    if moves: #a new game started without a result on the last one
+                        yield headers, moves
+                        headers, moves = {}, []
+                    headers[match.group(1)] = match.group(2)
+                    continue
+            for token in TOKEN_RE.findall(line):
+                if inComment:
+                    inComment = token != '}'
+                elif token == '{':
+                    inComment = True
+                elif token == ';': #comment to the end of the line
+                    break
+                elif token == '(':
+                    variationDepth += 1
+                elif token == ')':
+                    variationDepth = max(0, variationDepth - 1)
+                elif variationDepth or token.startswith('$'):
+                    continue
+                elif token in RESULTS:
+                    yield headers, moves
+                    headers, moves = {}, []
+                else:
+                    move = MOVE_NUMBER_RE.sub('', token)
+                    if move:
+                        moves.append(move)
+    if moves or headers:
+        yield headers, moves
+
+
+'''
+Yields (fen, operations) for every position in an EPD file. operations maps each opcode to its operand string
+(bm, id, ...; perft files use D1, D2, ...). A line without operations can also be a whole FEN. Blank lines and
+lines starting with # are skipped.
+'''
+def readEPD(source):
+    with openSource(source) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if ';' not in line: #a plain FEN (or EPD position without operations)
+                yield line, {}
+                continue
+            fields = line.split(None, 4)
+            fen = ' '.join(fields[:4])
+            operations = {}
+            if len(fields) > 4:
+                for operation in fields[4].split(';'):
+                    operation = operation.strip()
+                    if operation:
+                        opcode, _, operand = operation.partition(' ')
+                        operations[opcode] = operand.strip().strip('"')
+            yield fen, operations
+
+
+'''
+Yields the FEN of every position reached in the games of a PGN file (after every move, and the start position
+of each game as well with includeStart). A game stops at its first move that can't be parsed, and a game with a
+FEN tag that can't be set up is skipped.
+'''
+def pgnPositions(source, includeStart=False):
+    gs = ChessEngine.GameState()
+    for headers, moves in readPGN(source):
+        try:
+            gs.loadFEN(headers.get('FEN', ChessEngine.START_FEN))
+        except ValueError:
+            continue
+        if includeStart:
+            yield gs.getFEN()
+        for san in moves:
+            try:
+                move = gs.parseSAN(san)
+            except ValueError:
+                break
+            gs.makeMove(move)
+            yield gs.getFEN()
+
+
+'''
+Yields positions as FEN from a .pgn file (every position of every game) or from an EPD/FEN file (one position
+per line)
+'''
+def readPositions(path):
+    if path.lower().endswith('.pgn'):
+        return pgnPositions(path)
+    return (fen for fen, operations in readEPD(path))
@@ -0,0 +1,233 @@
+# Searches one position on several cores at once (Lazy SMP). Every worker process runs the normal iterative
+# deepening Searcher on the same position, and they all share one transposition table in shared memory: what one
+# worker finds is picked up by the others through the table, so together they reach a given depth sooner than one
+# process would. The workers start with different history scores so they don't all walk the tree in the same order.
+#
+# Positions go to the workers as GameState.toBytes() and the results come back as move IDs, so no GameState or
+# Move object is ever pickled. Worker 0 is the main search: when it finishes the others are stopped, and the move
+# of whichever worker completed the deepest iteration is played. Every search hands each worker process exactly one
+# task (they wait for each other before searching), and each task starts from fresh history and killers, so the
+# main search never inherits a helper's noisy move order from an earlier search.
+#
+# Lazy SMP only pays off with a core per worker. On a machine with one core the workers take turns and the helpers'
+# nodes are pure overhead: --bench --depth 4 --workers 1 2 measured 0.74-0.76x (slower) with 2 workers there.
+#
+#   python ChessParallel.py --workers 4 --time 5
+#   python ChessParallel.py --bench --depth 5 --workers 1 2 4     time to depth on each worker count vs 1 worker
+import os
+import random
+import sys
+import threading
+import time
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine, ChessPerft, ChessSearch
+    from .TranspositionTable import SharedTranspositionTable
+except ImportError: #run from the source folder
+    import ChessEngine
+    import ChessPerft
+    import ChessSearch
+    from TranspositionTable import SharedTranspositionTable
+
+HISTORY_NOISE = 64 #helpers other than the main one start each search with random history scores up to this
+START_TIMEOUT = 10.0 #seconds a task waits for the other workers to pick up theirs before it searches anyway
+BENCH_POSITIONS = ('startpos', 'kiwipete', 'position4', 'position6') #from ChessPerft.POSITIONS
+
+
+class ParallelSearcher():
+    # The worker processes and the shared table are kept between searches, like a Searcher's table, so start one
+    # ParallelSearcher per game and close() it at the end.
+    def __init__(self, workers=None, hashMegabytes=64):
+        import multiprocessing #only a parallel search needs the process pool, keep it out of the engine's import time
+        from concurrent.futures import ProcessPoolExecutor
+        self.workers = workers if workers else os.cpu_count() or 1
+        self.table = SharedTranspositionTable(hashMegabytes)
+        self.activeSearchID = multiprocessing.Value('i', 0, lock=False) #0 stops every helper
+        self.startBarrier = multiprocessing.Barrier(self.workers) #pins one task of a search to each worker process
+        self.searchID = 0
+        self.pool = ProcessPoolExecutor(self.workers, initializer=initHelper,
+                                        initargs=(self.table.array, self.activeSearchID, self.startBarrier))
+        self.bestMove = None
+        self.bestScore = 0
+        self.completedDepth = 0
+        self.nodes = 0
+        self.pv = []
+        self.futures = [] #helper searches of the search in progress
+
+    '''
+    Searches gs on every worker and returns the best move, or None if there are no legal moves. maxDepth,
+    timeLimit and nodeLimit are the same as for Searcher.search; nodeLimit applies to each worker. infoCallback is
+    called once at the end with the same dict Searcher passes it, with nodes counted over all the workers.
+    '''
+    def search(self, gs, maxDepth=None, timeLimit=None, nodeLimit=None, infoCallback=None):
+        startTime = time.perf_counter()
+        rootMoves = gs.getValidMoves()
+        self.bestMove = rootMoves[0] if rootMoves else None
+        self.bestScore = 0
+        self.completedDepth = 0
+        self.nodes = 0
+        self.pv = [self.bestMove] if rootMoves else []
+        if len(rootMoves) <= 1: #nothing to think about
+            return self.bestMove
+
+        self.searchID += 1
+        self.activeSearchID.value = self.searchID
+        self.table.newSearch()
+        if self.startBarrier.broken: #a worker timed out waiting for the others last time
+            self.startBarrier.reset()
+        position = gs.toBytes()
+        futures = self.futures = [self.pool.submit(helperSearch, self.searchID, helper, position, maxDepth,
+                                                   timeLimit, nodeLimit) for helper in range(self.workers)]
+        results = [futures[0].result()]
+        self.activeSearchID.value = 0 #the main search is done, stop the helpers
+        results += [future.result() for future in futures[1:]]
+        self.futures = []
+
+        #the deepest finished iteration wins, the main search on a tie
+        best = max(range(len(results)), key=lambda i: (results[i][2], -i))
+        moveID, score, depth, nodes, pv = results[best]
+        if moveID is not None:
+            self.bestMove = next(move for move in rootMoves if move.moveID == moveID)
+            self.bestScore = score
+            self.completedDepth = depth
+            self.pv = movesFromIDs(gs, pv)
+        self.nodes = sum(result[3] for result in results)
+        elapsed = time.perf_counter() - startTime
+        if infoCallback is not None:
+            infoCallback({'depth': self.completedDepth, 'score': self.bestScore, 'nodes': self.nodes,
+                          'nps': int(self.nodes / elapsed) if elapsed > 0 else 0,
+                          'time': elapsed, 'pv': list(self.pv)})
+        return self.bestMove
+
+    '''
+    Stops a search running in the workers. The search() call still returns the best move found so far.
+    '''
+    def stop(self):
+        self.activeSearchID.value = 0
+
+    '''
+    Forgets what the shared table learned in earlier games
+    '''
+    def newGame(self):
+        self.table.clear()
+
+    def close(self):
+        self.stop()
+        self.startBarrier.abort() #release tasks still waiting for workers that will never start theirs
+        for future in self.futures: #helpers that haven't started won't be run (cancel_futures needs Python 3.9)
+            future.cancel()
+        self.pool.shutdown(wait=True)
+
+
+# each worker process keeps one Searcher attached to the shared table
+helperSearcher = None
+helperActiveSearchID = None
+helperStartBarrier = None
+
+
+def initHelper(tableArray, activeSearchID, startBarrier):
+    global helperSearcher, helperActiveSearchID, helperStartBarrier
+    helperSearcher = ChessSearch.Searcher(table=SharedTranspositionTable(array=tableArray))
+    helperActiveSearchID = activeSearchID
+    helperStartBarrier = startBarrier
+
+
+'''
+Runs in a worker process: searches the position and returns (moveID, score, completedDepth, nodes, pv move IDs).
+The task first waits until every worker process holds a task of this search, so no process runs two of them one
+after the other, then sets up its own move order: the main search (helper 0) starts from an empty history, the
+others from random history seeded by the search and helper number.
+'''
+def helperSearch(searchID, helper, position, maxDepth, timeLimit, nodeLimit):
+    searcher = helperSearcher
+    try:
+        helperStartBarrier.wait(START_TIMEOUT)
+    except threading.BrokenBarrierError: #a worker didn't turn up or the searcher is closing, search anyway
+        pass
+    searcher.killers = [[None, None] for ply in range(ChessSearch.MAX_PLY)]
+    if helper > 0:
+        noise = random.Random(searchID * 1000 + helper)
+        searcher.history = [[noise.randrange(HISTORY_NOISE) for sq in range(128)] for piece in range(16)]
+    else:
+        searcher.history = [[0] * 128 for piece in range(16)]
+    gs = ChessEngine.GameState.fromBytes(position)
+    move = searcher.search(gs, maxDepth, timeLimit, nodeLimit,
+                           stopCallback=lambda: helperActiveSearchID.value != searchID)
+    return (move.moveID if move is not None else None, searcher.bestScore, searcher.completedDepth,
+            searcher.nodes, [pvMove.moveID for pvMove in searcher.pv])
+
+
+'''
+Turns a line of move IDs from a worker back into this process's Move objects, stopping at the first move that
+isn't legal
+'''
+def movesFromIDs(gs, moveIDs):
+    line = []
+    for moveID in moveIDs:
+        move = next((move for move in gs.getValidMoves() if move.moveID == moveID), None)
+        if move is None:
+            break
+        gs.makeMove(move)
+        line.append(move)
+    for move in line:
+        gs.undoMove()
+    return line
+
+
+'''
+Searches each benchmark position to depth with every worker count and prints the time it took and the speedup
+over the first count (normally 1). Returns {workers: seconds}.
+'''
+def benchmark(workerCounts, depth, hashMegabytes=64, out=sys.stdout):
+    positions = [fen for name, fen, counts in ChessPerft.POSITIONS if name in BENCH_POSITIONS]
+    times = {}
+    for workers in workerCounts:
+        searcher = ParallelSearcher(workers, hashMegabytes)
+        total = nodes = 0
+        for fen in positions:
+            gs = ChessEngine.GameState()
+            gs.loadFEN(fen)
+            searcher.newGame()
+            start = time.perf_counter()
+            searcher.search(gs, maxDepth=depth)
+            total += time.perf_counter() - start
+            nodes += searcher.nodes
+        searcher.close()
+        times[workers] = total
+        speedup = times[workerCounts[0]] / total if total > 0 else 0.0
+        print(f'workers {workers:2}  time {total:8.2f}s  nodes {nodes:9}  nps {ChessPerft.nodesPerSecond(nodes, total):8.0f}  '
+              f'speedup {speedup:.2f}x', file=out)
+    return times
+
+
+def main(argv=None):
+    import argparse #only the command line needs it, keep it out of the engine's import time
+    parser = argparse.ArgumentParser(description='Search a position on several cores (Lazy SMP)')
+    parser.add_argument('--fen', default=ChessEngine.START_FEN)
+    parser.add_argument('--workers', type=int, nargs='+', default=[os.cpu_count() or 1],
+                        help='worker processes (several counts with --bench, default: one per core)')
+    parser.add_argument('--time', type=float, default=None, help='seconds to search')
+    parser.add_argument('--depth', type=int, default=None, help='maximum depth in plies')
+    parser.add_argument('--nodes', type=int, default=None, help='maximum nodes per worker')
+    parser.add_argument('--hash', type=int, default=64, metavar='MB', help='shared transposition table size')
+    parser.add_argument('--bench', action='store_true', help='time to depth on the benchmark positions per worker count')
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        benchmark(args.workers, args.depth or 5, args.hash)
+        return 0
+    if args.time is None and args.depth is None and args.nodes is None:
+        args.time = 5.0
+    gs = ChessEngine.GameState()
+    gs.loadFEN(args.fen)
+    searcher = ParallelSearcher(args.workers[0], args.hash)
+    try:
+        move = searcher.search(gs, args.depth, args.time, args.nodes, ChessSearch.printInfo)
+    finally:
+        searcher.close()
+    print('bestmove', move.getChessNotation() if move is not None else '(none)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
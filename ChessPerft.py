@@ -0,0 +1,276 @@
+# Perft (performance test) for the move generator. Perft counts every leaf of the legal move tree to a fixed depth;
+# the counts are known for a set of standard positions, so any mistake in getValidMoves or makeMove/undoMove shows
+# up as a wrong count, and the time it takes is a benchmark for the generator.
+#
+#   python ChessPerft.py --depth 4                      perft of the starting position
+#   python ChessPerft.py --fen "<fen>" --depth 3 --divide
+#   python ChessPerft.py --suite                        check the standard positions against their known counts
+#   python ChessPerft.py --suite --check                ... and fail on counts or speed that differ from the baseline
+#   python ChessPerft.py --suite --record               ... and save the counts and the median speed of a few runs
+#                                                       as the new baseline
+#
+# Speeds in the baseline are relative: nodes per second divided by the speed of a fixed calibration loop timed in the
+# same process, so a baseline recorded on one machine still means something on another.
+#   python ChessPerft.py --depth 3 --verify             check the incremental key and evaluation after every move
+import json
+import os
+import statistics
+import sys
+import time
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine
+    from .TranspositionTable import TranspositionTable
+except ImportError: #run from the source folder
+    import ChessEngine
+    from TranspositionTable import TranspositionTable
+
+# (name, fen, {depth: nodes}) from https://www.chessprogramming.org/Perft_Results
+POSITIONS = [
+    ('startpos', ChessEngine.START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+]
+
+SUITE_MAX_NODES = 700000 #the suite runs each position to the deepest known depth with at most this many nodes
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perft_baseline.json')
+BASELINE_TOLERANCE = 0.25 #--check fails when the relative speed drops more than this fraction below the baseline
+CALIBRATION_ITERATIONS = 1000000
+CALIBRATION_RUNS = 5 #the fastest run counts, slower ones were interrupted by something else
+SUITE_MIN_SECONDS = 1.0 #each suite position is timed again until this much time is spent on it (the fastest run counts)
+SUITE_MAX_RUNS = 5
+RECORD_RUNS = 5 #--record runs the suite this many times and keeps the median relative speed of each position
+
+
+'''
+Counts the leaf nodes of the legal move tree depth plies deep. The last ply is counted from the length of the
+move list without making the moves. With a TranspositionTable the count of every subtree is stored under the
+position's Zobrist key, so positions reached again by transposition aren't searched twice.
+'''
+def perft(gs, depth, table=None):
+    if depth == 0:
+        return 1
+    if table is not None and depth > 1:
+        entry = table.probe(gs.zobristKey)
+        if entry is not None and entry[1] == depth:
+            return entry[2]
+    moves = gs.getValidMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1, table)
+        gs.undoMove()
+    if table is not None:
+        table.store(gs.zobristKey, depth, nodes)
+    return nodes
+
+
+'''
+Perft split by root move. Returns a dict of move notation -> nodes, which is what you compare against another
+engine to find the move that is generated wrongly.
+'''
+def divide(gs, depth, table=None):
+    results = {}
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        results[move.getChessNotation()] = perft(gs, depth - 1, table)
+        gs.undoMove()
+    return results
+
+
+'''
+Runs perft (or divide) from fen and returns (nodes, seconds). hashMegabytes > 0 uses a transposition table of
+that size.
+'''
+def runPerft(fen, depth, showDivide=False, hashMegabytes=0, out=sys.stdout):
+    gs = ChessEngine.GameState()
+    gs.loadFEN(fen)
+    table = TranspositionTable(hashMegabytes) if hashMegabytes > 0 else None
+    start = time.perf_counter()
+    if showDivide:
+        results = divide(gs, depth, table)
+        nodes = sum(results.values())
+    else:
+        nodes = perft(gs, depth, table)
+    elapsed = time.perf_counter() - start
+    if showDivide:
+        for notation in sorted(results):
+            print(f'{notation}: {results[notation]}', file=out)
+        print(f'moves: {len(results)}', file=out)
+    print(f'depth {depth}  nodes {nodes}  time {elapsed:.3f}s  nps {nodesPerSecond(nodes, elapsed):.0f}', file=out)
+    if table is not None:
+        stats = table.getStats()
+        print(f"hash hits {stats['hits']}  misses {stats['misses']}  hit rate {stats['hitRate']:.1%}  "
+              f"overwrites {stats['overwrites']}", file=out)
+    return nodes, elapsed
+
+
+def nodesPerSecond(nodes, elapsed):
+    return nodes / elapsed if elapsed > 0 else 0.0
+
+
+'''
+A fixed piece of pure Python of the kind the move generator does (list indexing, bit tests, appends), whose speed
+the perft speeds are divided by to take the machine and interpreter out of them
+'''
+def calibrationLoop(iterations):
+    squares = [sq & 7 for sq in range(128)]
+    found = []
+    for i in range(iterations):
+        sq = (i * 7) & 127
+        if not sq & 0x88 and squares[sq]:
+            found.append(sq + 16)
+        if len(found) > 64:
+            found = []
+    return len(found)
+
+
+'''
+Returns calibration loop iterations per second, the best of a few runs
+'''
+def calibrate(iterations=CALIBRATION_ITERATIONS, runs=CALIBRATION_RUNS):
+    best = None
+    for run in range(runs):
+        start = time.perf_counter()
+        calibrationLoop(iterations)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return iterations / best
+
+
+'''
+Runs every standard position to the deepest depth with at most maxNodes nodes. Returns a dict of
+name -> {depth, nodes, expected, seconds, nps, relativeSpeed}, relativeSpeed being nps / calibrate(). Short
+positions are run a few times, taking turns with a calibration run, and the best of each counts, so a busy moment
+of the machine doesn't count against one of them.
+'''
+def runSuite(maxNodes=SUITE_MAX_NODES, out=sys.stdout):
+    results = {}
+    calibrate() #warm up, so the first position isn't timed on a cold machine
+    for name, fen, counts in POSITIONS:
+        depth = max(d for d, n in counts.items() if n <= maxNodes)
+        gs = ChessEngine.GameState()
+        gs.loadFEN(fen)
+        calibration = 0.0
+        elapsed = None
+        spent = 0.0
+        for run in range(SUITE_MAX_RUNS): #calibration and perft take turns so both see the machine in the same state
+            calibration = max(calibration, calibrate(runs=1))
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            runTime = time.perf_counter() - start
+            elapsed = runTime if elapsed is None else min(elapsed, runTime)
+            spent += runTime
+            if spent >= SUITE_MIN_SECONDS:
+                break
+        nps = nodesPerSecond(nodes, elapsed)
+        status = 'ok' if nodes == counts[depth] else f'FAIL (expected {counts[depth]})'
+        print(f'{name:10} depth {depth}  nodes {nodes:8}  time {elapsed:7.3f}s  nps {nps:8.0f}  '
+              f'relative {nps / calibration:.4f}  {status}', file=out)
+        results[name] = {'depth': depth, 'nodes': nodes, 'expected': counts[depth], 'seconds': elapsed, 'nps': nps,
+                         'relativeSpeed': nps / calibration}
+    return results
+
+
+'''
+Compares suite results with the recorded baseline. Returns a list of problems: node counts that differ from the
+known counts or the baseline, and positions whose relative speed fell more than tolerance below the baseline.
+'''
+def checkAgainstBaseline(results, baseline, tolerance=BASELINE_TOLERANCE):
+    problems = []
+    for name, result in results.items():
+        if result['nodes'] != result['expected']:
+            problems.append(f"{name}: {result['nodes']} nodes, expected {result['expected']}")
+        if name not in baseline:
+            continue
+        recorded = baseline[name]
+        if recorded['depth'] != result['depth'] or 'relativeSpeed' not in recorded:
+            problems.append(f"{name}: baseline was recorded at depth {recorded['depth']} or in an old format, "
+                            f"re-record it")
+        elif result['nodes'] != recorded['nodes']:
+            problems.append(f"{name}: {result['nodes']} nodes, the baseline has {recorded['nodes']}")
+        elif result['relativeSpeed'] < recorded['relativeSpeed'] * (1 - tolerance):
+            problems.append(f"{name}: relative speed {result['relativeSpeed']:.3f} is more than {tolerance:.0%} "
+                            f"below the baseline of {recorded['relativeSpeed']:.3f}")
+    return problems
+
+
+def loadBaseline(path=BASELINE_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def saveBaseline(results, path=BASELINE_FILE):
+    baseline = {name: {'depth': r['depth'], 'nodes': r['nodes'], 'relativeSpeed': round(r['relativeSpeed'], 4)}
+                for name, r in results.items()}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    import argparse #only the command line needs it, keep it out of the engine's import time
+    parser = argparse.ArgumentParser(description='Perft / divide for the ChessEngine move generator')
+    parser.add_argument('--fen', default=ChessEngine.START_FEN, help='position to search (default: the starting position)')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--divide', action='store_true', help='print the node count for every root move')
+    parser.add_argument('--hash', type=int, default=0, metavar='MB', help='transposition table size for perft (default: off)')
+    parser.add_argument('--suite', action='store_true', help='run the standard positions against their known counts')
+    parser.add_argument('--max-nodes', type=int, default=SUITE_MAX_NODES, help='largest perft the suite will run per position')
+    parser.add_argument('--check', action='store_true',
+                        help='with --suite, fail if the counts differ from or the speed is below the recorded baseline')
+    parser.add_argument('--record', action='store_true', help='with --suite, record the counts and speed as the new baseline')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline file for --check and --record')
+    parser.add_argument('--verify', action='store_true',
+                        help='recompute the Zobrist key and evaluation totals after every move (slow)')
+    parser.add_argument('--profile', default=None, metavar='FILE', help='count and time the hot paths, write JSON')
+    parser.add_argument('--flamegraph', default=None, metavar='FILE', help='write folded stacks for a flame graph')
+    args = parser.parse_args(argv)
+    ChessEngine.DEBUG_INCREMENTAL = args.verify
+    profiling = args.profile or args.flamegraph
+    if profiling:
+        try: #imported from the installed ChessBot package
+            from . import ChessProfile
+        except ImportError: #run from the source folder
+            import ChessProfile
+        ChessProfile.enable()
+
+    if not args.suite:
+        runPerft(args.fen, args.depth, args.divide, args.hash)
+        if profiling:
+            ChessProfile.finish(args.profile, args.flamegraph)
+        return 0
+
+    results = runSuite(args.max_nodes)
+    if profiling: #the speed check below is meaningless with the counters on, they slow everything down
+        ChessProfile.finish(args.profile, args.flamegraph)
+    problems = [f"{name}: {r['nodes']} nodes, expected {r['expected']}"
+                for name, r in results.items() if r['nodes'] != r['expected']]
+    if args.check:
+        problems = checkAgainstBaseline(results, loadBaseline(args.baseline))
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    if problems:
+        return 1
+    if args.record:
+        runs = [results] + [runSuite(args.max_nodes) for run in range(RECORD_RUNS - 1)]
+        for name, result in results.items(): #one run can land on a busy or a quiet moment of the machine
+            result['relativeSpeed'] = statistics.median(run[name]['relativeSpeed'] for run in runs)
+        saveBaseline(results, args.baseline)
+        print(f'baseline written to {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
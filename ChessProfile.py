@@ -0,0 +1,223 @@
+# Opt-in counters and timers for the engine's hot paths: how often the piece move generators, makeMove/undoMove,
+# the attack tests and the evaluation are called and how long they take, how many Move objects get created, and
+# how many nodes and cutoffs the search goes through.
+#
+# Nothing is measured until enable() is called: it replaces the functions with counting wrappers, and disable()
+# puts the originals back, so the engine runs at full speed whenever profiling is off. The wrappers add about a
+# microsecond to every call they time, so the times are for comparing runs with each other rather than absolute.
+#
+#   ChessProfile.enable()
+#   gs = ChessEngine.GameState()        make the GameState after enable(), see rebind()
+#   ...
+#   data = ChessProfile.snapshot()
+#   ChessProfile.dumpJSON('profile.json')
+#   ChessProfile.dumpFolded('profile.folded')         for flamegraph.pl or speedscope
+#
+# The command lines of ChessSearch and ChessPerft take --profile FILE (JSON) and --flamegraph FILE (folded stacks).
+import json
+import sys
+import time
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine, ChessEval, ChessSearch
+except ImportError: #run from the source folder
+    import ChessEngine
+    import ChessEval
+    import ChessSearch
+
+# (owner, attribute) of every function that gets counted and timed
+TIMED = [(ChessEngine.GameState, name) for name in (
+    'getValidMoves', 'checkForPinsAndChecks', 'getPawnMoves', 'getKnightMoves', 'getBishopMoves', 'getRookMoves',
+    'getQueenMoves', 'getKingMoves', 'getCastleMoves', 'makeMove', 'undoMove', 'inCheck', 'squareUnderAttack',
+    'isSquareAttacked')] + [(ChessEval, 'evaluate'), (ChessSearch.Searcher, 'search')]
+# functions that are only counted: the interned Move lookup and the creation of a new Move object
+COUNTED = [(ChessEngine.Move, 'fromSquares'), (ChessEngine.Move, 'setSquares')]
+
+enabled = False
+originals = {} #(owner, attribute) -> the function as it was before enable()
+calls = {} #function name -> calls
+seconds = {} #function name -> time spent in it, including what it called
+folded = {} #call stack 'a;b;c' -> time spent in c itself, for flame graphs
+stack = [] #frames of the wrapped calls in progress: [name, path, start time, time of wrapped calls inside]
+searchTotals = {'searches': 0, 'nodes': 0, 'cutoffs': 0}
+startTime = None
+
+
+def timedWrapper(name, function):
+    def wrapper(*args, **kwargs):
+        calls[name] += 1
+        if not stack:
+            path = name
+        elif stack[-1][0] == name: #recursion shows as one frame
+            path = stack[-1][1]
+        else:
+            path = f'{stack[-1][1]};{name}'
+        frame = [name, path, time.perf_counter(), 0.0]
+        stack.append(frame)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - frame[2]
+            stack.pop()
+            if not stack or stack[-1][0] != name: #only the outermost of recursive calls counts the time
+                seconds[name] += elapsed
+            folded[path] = folded.get(path, 0.0) + elapsed - frame[3]
+            if stack:
+                stack[-1][3] += elapsed
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+def countedWrapper(name, function):
+    def wrapper(*args, **kwargs):
+        calls[name] += 1
+        return function(*args, **kwargs)
+    wrapper.__name__ = function.__name__
+    return wrapper
+
+
+'''
+Wraps search so the nodes and cutoffs of every search are added to the totals
+'''
+def searchWrapper(function):
+    def search(self, *args, **kwargs):
+        try:
+            return function(self, *args, **kwargs)
+        finally:
+            searchTotals['searches'] += 1
+            searchTotals['nodes'] += self.nodes
+            searchTotals['cutoffs'] += self.cutoffs
+    search.__name__ = function.__name__
+    return search
+
+
+def qualifiedName(owner, attribute):
+    return f'{owner.__name__}.{attribute}'
+
+
+'''
+Starts counting. GameStates made before this keep calling the piece generators they were made with; pass them
+to rebind() to count those too. searcherClasses are more Searcher classes to count the searches of, for when
+ChessSearch runs as __main__ and its Searcher isn't ChessSearch.Searcher.
+'''
+def enable(*searcherClasses):
+    global enabled, startTime
+    if enabled:
+        return
+    reset()
+    extra = [(owner, 'search') for owner in searcherClasses if owner is not ChessSearch.Searcher]
+    for owner, attribute in TIMED + extra + COUNTED:
+        raw = owner.__dict__[attribute]
+        originals[(owner, attribute)] = raw
+        function = raw.__func__ if isinstance(raw, staticmethod) else raw
+        name = qualifiedName(owner, attribute)
+        if (owner, attribute) in COUNTED:
+            wrapped = countedWrapper(name, function)
+        else:
+            if attribute == 'search':
+                function = searchWrapper(function)
+            wrapped = timedWrapper(name, function)
+        setattr(owner, attribute, staticmethod(wrapped) if isinstance(raw, staticmethod) else wrapped)
+    ChessEngine.INLINE_MOVE_LOOKUPS = False #count the sliders' Move lookups too
+    enabled = True
+    startTime = time.perf_counter()
+
+
+'''
+Stops counting and puts the original functions back. What was counted stays readable.
+'''
+def disable():
+    global enabled
+    if not enabled:
+        return
+    for (owner, attribute), raw in originals.items():
+        setattr(owner, attribute, raw)
+    originals.clear()
+    ChessEngine.INLINE_MOVE_LOOKUPS = True
+    enabled = False
+
+
+'''
+Points the piece generators of a GameState at whatever GameState has now, wrapped or not
+'''
+def rebind(gs):
+    gs.moveFunctions = {ChessEngine.PAWN: gs.getPawnMoves, ChessEngine.ROOK: gs.getRookMoves,
+                        ChessEngine.KNIGHT: gs.getKnightMoves, ChessEngine.BISHOP: gs.getBishopMoves,
+                        ChessEngine.KING: gs.getKingMoves, ChessEngine.QUEEN: gs.getQueenMoves}
+
+
+def reset():
+    global startTime
+    for owner, attribute in TIMED + COUNTED:
+        calls[qualifiedName(owner, attribute)] = 0
+    for owner, attribute in TIMED:
+        seconds[qualifiedName(owner, attribute)] = 0.0
+    folded.clear()
+    stack.clear()
+    searchTotals.update(searches=0, nodes=0, cutoffs=0)
+    startTime = time.perf_counter()
+
+
+'''
+Returns everything counted so far as a dict of plain values: per timed function its calls and seconds, the
+Move lookups and allocations, and the search totals
+'''
+def snapshot():
+    functions = {}
+    for owner, attribute in TIMED:
+        name = qualifiedName(owner, attribute)
+        functions[name] = {'calls': calls.get(name, 0), 'seconds': round(seconds.get(name, 0.0), 6)}
+    return {
+        'elapsed': round(time.perf_counter() - startTime, 6) if startTime is not None else 0.0,
+        'functions': functions,
+        'moveLookups': calls.get(qualifiedName(ChessEngine.Move, 'fromSquares'), 0),
+        'moveAllocations': calls.get(qualifiedName(ChessEngine.Move, 'setSquares'), 0),
+        'search': dict(searchTotals),
+    }
+
+
+def dumpJSON(path):
+    with open(path, 'w') as f:
+        json.dump(snapshot(), f, indent=2)
+        f.write('\n')
+
+
+'''
+Writes the time spent in every call stack in the folded format flame graph tools read: one line per stack,
+frames separated by ';', then the time in microseconds
+'''
+def dumpFolded(path):
+    with open(path, 'w') as f:
+        for callStack, elapsed in sorted(folded.items()):
+            microseconds = int(elapsed * 1e6)
+            if microseconds:
+                f.write(f'{callStack} {microseconds}\n')
+
+
+'''
+Prints the counters as a table, slowest functions first
+'''
+def printReport(out=sys.stderr):
+    data = snapshot()
+    print(f"{'function':32} {'calls':>10} {'seconds':>9} {'us/call':>8}", file=out)
+    for name, stat in sorted(data['functions'].items(), key=lambda item: -item[1]['seconds']):
+        if stat['calls']:
+            print(f"{name:32} {stat['calls']:10} {stat['seconds']:9.3f} {stat['seconds'] / stat['calls'] * 1e6:8.2f}",
+                  file=out)
+    search = data['search']
+    print(f"Move lookups {data['moveLookups']}  allocations {data['moveAllocations']}  "
+          f"searches {search['searches']}  nodes {search['nodes']}  cutoffs {search['cutoffs']}", file=out)
+
+
+'''
+Stops counting and writes the JSON snapshot and the folded stacks to the paths that are given, then prints the
+report. Used by the --profile and --flamegraph options of the command lines.
+'''
+def finish(jsonPath=None, foldedPath=None, out=sys.stderr):
+    disable()
+    if jsonPath:
+        dumpJSON(jsonPath)
+    if foldedPath:
+        dumpFolded(foldedPath)
+    printReport(out)
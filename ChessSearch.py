@@ -0,0 +1,385 @@
+# Chooses a move for a GameState. The search is an iterative deepening negamax with alpha-beta pruning: it
+# searches 1 ply deep, then 2, then 3... until it runs out of its time or node budget, and always has the best
+# move of the deepest finished iteration to fall back on. Each iteration is made cheaper by the one before it
+# through the transposition table (the best move from last time is searched first), killer moves and the
+# history heuristic. Captures are searched to the end at the leaves (quiescence search) so the evaluation is
+# never taken in the middle of an exchange, leaving out captures that lose material by static exchange. With
+# endgame tablebases (see Tablebase.py) positions with few enough pieces aren't searched at all, their exact
+# distance to mate is looked up.
+#
+#   python ChessSearch.py --time 2
+#   python ChessSearch.py --fen "<fen>" --depth 5
+import sys
+import time
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine, ChessEval
+    from .ChessEngine import EXCHANGE_VALUES
+    from .TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+except ImportError: #run from the source folder
+    import ChessEngine
+    import ChessEval
+    from ChessEngine import EXCHANGE_VALUES
+    from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+MATE_SCORE = 100000
+MATE_THRESHOLD = MATE_SCORE - 1000 #scores above this are mates, closer mates score higher
+INFINITY = 1000000
+MAX_PLY = 128
+CHECK_LIMITS_EVERY = 1024 #nodes between looks at the clock, must be a power of 2
+
+'''
+Raised inside the search when the time or node budget runs out or stop() is called
+'''
+class SearchStopped(Exception):
+    pass
+
+
+class Searcher():
+    # The transposition table, killers and history are kept between searches so a game (or an analysis session)
+    # keeps the work from earlier moves. table can be passed in to use a different (e.g. shared) table of the same
+    # interface instead of a new TranspositionTable; moves are stored in it as move IDs. tablebase is an optional
+    # Tablebase.Tablebase probed at every node below the root.
+    def __init__(self, hashMegabytes=16, table=None, tablebase=None):
+        self.table = table if table is not None else TranspositionTable(hashMegabytes)
+        self.tablebase = tablebase
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        self.history = [[0] * 128 for piece in range(16)]
+        self.stopRequested = False
+        self.nodes = 0
+        self.cutoffs = 0 #beta cutoffs, for ChessProfile
+        self.deadline = None
+        self.budgetStart = None #when the time up to the deadline started to count, reset at a ponderhit
+        self.nodeLimit = None
+        self.stopCallback = None
+        self.bestMove = None
+        self.bestScore = 0
+        self.completedDepth = 0
+        self.pv = []
+        self.iterationBestMove = None #best root move of the iteration in progress
+        self.iterationBestScore = 0
+        self.iterationPv = []
+        self.childPv = [] #principal variation below the node that just returned
+
+    '''
+    Asks a running search to stop as soon as possible. search() still returns the best move found so far.
+    '''
+    def stop(self):
+        self.stopRequested = True
+
+    '''
+    Clears everything learned from earlier searches, for a new game
+    '''
+    def reset(self):
+        self.table.clear()
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        self.history = [[0] * 128 for piece in range(16)]
+
+    '''
+    Searches gs and returns the best move, or None if there are no legal moves. The search stops at maxDepth,
+    after timeLimit seconds or after nodeLimit nodes, whichever comes first (with none of them it searches until
+    stop() is called). infoCallback is called after every finished iteration with a dict of depth, score, nodes,
+    nps, time and pv. stopCallback is polled along with the clock and stops the search when it returns True, for
+    callers that can't reach stop() (another process). gs is left as it was.
+    '''
+    def search(self, gs, maxDepth=None, timeLimit=None, nodeLimit=None, infoCallback=None, stopCallback=None):
+        startTime = time.perf_counter()
+        self.deadline = startTime + timeLimit if timeLimit is not None else None
+        self.budgetStart = startTime
+        self.nodeLimit = nodeLimit
+        self.stopCallback = stopCallback
+        self.stopRequested = False
+        self.nodes = 0
+        self.cutoffs = 0
+        self.table.newSearch()
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        for pieceHistory in self.history: #keep the history from earlier searches but let new moves catch up
+            for sq in range(128):
+                pieceHistory[sq] >>= 3
+
+        rootMoves = gs.getValidMoves()
+        self.bestMove = rootMoves[0] if rootMoves else None
+        self.bestScore = 0
+        self.completedDepth = 0
+        self.pv = [self.bestMove] if rootMoves else []
+        if len(rootMoves) <= 1: #nothing to think about
+            return self.bestMove
+
+        moveLogLength = len(gs.moveLog)
+        #every root move leads to a position with a known result, so one iteration finds the best move
+        rootInTablebase = self.tablebase is not None and self.tablebase.probe(gs) is not None
+        depth = 0
+        while maxDepth is None or depth < maxDepth:
+            depth += 1
+            if depth >= MAX_PLY:
+                break
+            self.iterationBestMove = None
+            try:
+                score = self.negamax(gs, depth, -INFINITY, INFINITY, 0)
+            except SearchStopped:
+                while len(gs.moveLog) > moveLogLength: #unwind the moves the search was in the middle of
+                    gs.undoMove()
+                if self.iterationBestMove is not None: #a root move beat the previous best before time ran out
+                    self.bestMove = self.iterationBestMove
+                    self.bestScore = self.iterationBestScore
+                    self.pv = self.iterationPv
+                break
+            self.bestMove = self.iterationBestMove
+            self.bestScore = score
+            self.pv = self.iterationPv
+            self.completedDepth = depth
+            elapsed = time.perf_counter() - startTime
+            if infoCallback is not None:
+                infoCallback({'depth': depth, 'score': score, 'nodes': self.nodes,
+                              'nps': int(self.nodes / elapsed) if elapsed > 0 else 0,
+                              'time': elapsed, 'pv': list(self.pv)})
+            if abs(score) > MATE_THRESHOLD and MATE_SCORE - abs(score) <= depth: #found the shortest mate
+                break
+            if rootInTablebase:
+                break
+            #the next iteration takes several times longer than this one, don't start what can't finish
+            now = time.perf_counter()
+            if self.deadline is not None and now + 2 * (now - self.budgetStart) > self.deadline:
+                break
+        return self.bestMove
+
+    '''
+    Raises SearchStopped once the budget is used up
+    '''
+    def checkLimits(self):
+        if self.stopRequested:
+            raise SearchStopped()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchStopped()
+        if self.nodeLimit is not None and self.nodes >= self.nodeLimit:
+            raise SearchStopped()
+        if self.stopCallback is not None and self.stopCallback():
+            raise SearchStopped()
+
+    '''
+    Negamax alpha-beta search. Returns the score of gs from the point of view of the player to move. Keeps the
+    principal variation in self.iterationPv at the root.
+    '''
+    def negamax(self, gs, depth, alpha, beta, ply):
+        self.nodes += 1
+        self.childPv = []
+        if self.nodes & (CHECK_LIMITS_EVERY - 1) == 0:
+            self.checkLimits()
+        if ply > 0 and self.isRepetition(gs):
+            return 0
+        if ply > 0 and self.tablebase is not None:
+            probed = self.tablebase.probe(gs)
+            if probed is not None:
+                return tablebaseScore(probed, ply)
+        inCheck = gs.inCheck()
+        if inCheck and ply < MAX_PLY - 1: #look one ply further when in check so forced lines get resolved
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self.quiescence(gs, alpha, beta, ply)
+
+        key = gs.zobristKey
+        alphaOriginal = alpha
+        hashMoveID = None
+        entry = self.table.probe(key)
+        if entry is not None:
+            hashMoveID = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                value = scoreFromTable(entry[2], ply)
+                flag = entry[3]
+                if flag == EXACT or (flag == LOWER_BOUND and value >= beta) or (flag == UPPER_BOUND and value <= alpha):
+                    return value
+
+        #moves come hash move first, then captures by MVV-LVA, killers and quiet moves by history, and each
+        #stage is only generated once the search gets to it
+        killers = self.killers[ply]
+        bestScore = -INFINITY
+        bestMove = None
+        bestLine = []
+        legalMoves = 0
+        for move in gs.generateMoves(hashMoveID, killers, quietOrder=self.historyScore):
+            legalMoves += 1
+            gs.makeMove(move)
+            score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+            gs.undoMove()
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+                if score > alpha:
+                    alpha = score
+                    bestLine = [move] + self.childPv
+                    if ply == 0:
+                        self.iterationBestMove = move
+                        self.iterationBestScore = score
+                        self.iterationPv = bestLine
+                    if alpha >= beta:
+                        self.cutoffs += 1
+                        if not move.pieceCapturedCode and not move.promotionCode: #quiet move that caused a cutoff
+                            if killers[0] != move.moveID:
+                                killers[1] = killers[0]
+                                killers[0] = move.moveID
+                            self.history[move.pieceMovedCode][move.endSq] += depth * depth
+                        break
+        if not legalMoves:
+            return -MATE_SCORE + ply if inCheck else 0 #checkmate or stalemate
+
+        if bestScore <= alphaOriginal:
+            flag = UPPER_BOUND
+        elif bestScore >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.table.store(key, depth, scoreToTable(bestScore, ply), flag, bestMove.moveID)
+        self.childPv = bestLine
+        return bestScore
+
+    '''
+    Searches captures and promotions only until the position is quiet, so the evaluation isn't taken halfway
+    through an exchange. The player to move can always "stand pat" on the static evaluation instead of capturing.
+    '''
+    def quiescence(self, gs, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & (CHECK_LIMITS_EVERY - 1) == 0:
+            self.checkLimits()
+        self.childPv = []
+        standPat = ChessEval.evaluate(gs)
+        if standPat >= beta or ply >= MAX_PLY - 1:
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+
+        for move in gs.generateMoves(capturesOnly=True):
+            #a capture that loses material once the recaptures are counted is left out; taking a piece at least
+            #as big can't lose, so only the rest need the static exchange
+            if not move.promotionCode and (EXCHANGE_VALUES[move.pieceCapturedCode & 7] <
+                                           EXCHANGE_VALUES[move.pieceMovedCode & 7]) and gs.staticExchange(move) < 0:
+                continue
+            gs.makeMove(move)
+            score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+            gs.undoMove()
+            if score >= beta:
+                self.cutoffs += 1
+                self.childPv = []
+                return score
+            if score > alpha:
+                alpha = score
+        self.childPv = []
+        return alpha
+
+    '''
+    Quiet move order: moves that caused cutoffs elsewhere in the tree come first
+    '''
+    def historyScore(self, move):
+        return self.history[move.pieceMovedCode][move.endSq]
+
+    '''
+    True if the position already came up earlier in the game or the search with the same player to move. Only
+    the plies since the last capture or pawn move (the halfmove clock) can repeat, so only those are looked at.
+    '''
+    def isRepetition(self, gs):
+        key = gs.zobristKey
+        stateLog = gs.stateLog
+        for i in range(len(stateLog) - 2, max(-1, len(stateLog) - gs.halfmoveClock - 1), -2):
+            if stateLog[i][2] == key:
+                return True
+        return False
+
+
+'''
+Mate scores are stored relative to the position in the table and relative to the root in the search, so a mate
+found through a transposition still counts the plies to it correctly
+'''
+def scoreToTable(score, ply):
+    if score > MATE_THRESHOLD:
+        return score + ply
+    if score < -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score > MATE_THRESHOLD:
+        return score - ply
+    if score < -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+'''
+Turns a tablebase result (result, plies to mate) at ply into a mate score, as if the search had found the mate
+'''
+def tablebaseScore(probed, ply):
+    result, plies = probed
+    if result > 0:
+        return MATE_SCORE - ply - plies
+    if result < 0:
+        return -MATE_SCORE + ply + plies
+    return 0
+
+
+'''
+Returns (mate, value): mate in moves for mate scores (negative when getting mated), otherwise centipawns
+'''
+def describeScore(score):
+    if score > MATE_THRESHOLD:
+        return True, (MATE_SCORE - score + 1) // 2
+    if score < -MATE_THRESHOLD:
+        return True, -((MATE_SCORE + score + 1) // 2)
+    return False, score
+
+
+'''
+Searches gs for timeLimit seconds with a fresh Searcher and returns the best move
+'''
+def findBestMove(gs, timeLimit=1.0, maxDepth=None):
+    return Searcher().search(gs, maxDepth=maxDepth, timeLimit=timeLimit)
+
+
+def printInfo(info, out=sys.stdout):
+    mate, value = describeScore(info['score'])
+    score = f'mate {value}' if mate else f'cp {value}'
+    pv = ' '.join(move.getChessNotation() for move in info['pv'])
+    print(f"depth {info['depth']}  score {score}  nodes {info['nodes']}  nps {info['nps']}  "
+          f"time {info['time']:.2f}s  pv {pv}", file=out)
+
+
+def main(argv=None):
+    import argparse #only the command line needs it, keep it out of the engine's import time
+    parser = argparse.ArgumentParser(description='Search a position with the ChessEngine alpha-beta search')
+    parser.add_argument('--fen', default=ChessEngine.START_FEN)
+    parser.add_argument('--time', type=float, default=None, help='seconds to search')
+    parser.add_argument('--depth', type=int, default=None, help='maximum depth in plies')
+    parser.add_argument('--nodes', type=int, default=None, help='maximum nodes')
+    parser.add_argument('--hash', type=int, default=16, metavar='MB', help='transposition table size')
+    parser.add_argument('--tablebases', default=None, metavar='DIR', help='directory of endgame tablebases')
+    parser.add_argument('--profile', default=None, metavar='FILE', help='count and time the hot paths, write JSON')
+    parser.add_argument('--flamegraph', default=None, metavar='FILE', help='write folded stacks for a flame graph')
+    args = parser.parse_args(argv)
+    if args.time is None and args.depth is None and args.nodes is None:
+        args.time = 5.0
+    profiling = args.profile or args.flamegraph
+    if profiling:
+        try: #imported from the installed ChessBot package
+            from . import ChessProfile
+        except ImportError: #run from the source folder
+            import ChessProfile
+        ChessProfile.enable(Searcher)
+
+    tablebase = None
+    if args.tablebases:
+        try: #imported from the installed ChessBot package
+            from .Tablebase import Tablebase
+        except ImportError: #run from the source folder
+            from Tablebase import Tablebase
+        tablebase = Tablebase(args.tablebases)
+    gs = ChessEngine.GameState()
+    gs.loadFEN(args.fen)
+    searcher = Searcher(args.hash, tablebase=tablebase)
+    move = searcher.search(gs, args.depth, args.time, args.nodes, printInfo)
+    print('bestmove', move.getChessNotation() if move is not None else '(none)')
+    if profiling:
+        ChessProfile.finish(args.profile, args.flamegraph)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,318 @@
+# UCI (Universal Chess Interface) front end, so the engine can be run by tournament managers and analysis GUIs:
+#
+#   python ChessUCI.py
+#
+# The process stays up for the whole session and keeps one Searcher, so the transposition table, killers and
+# history carry over from move to move. A "position" command that only adds moves to the last one is applied by
+# making the new moves (and one that takes moves back by undoing them) instead of setting the board up again.
+# Searches run in a thread so "stop" and "ponderhit" are read while the engine thinks.
+import sys
+import threading
+import time
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine, ChessSearch
+    from .OpeningBook import OpeningBook
+    from .Tablebase import Tablebase
+except ImportError: #run from the source folder
+    import ChessEngine
+    import ChessSearch
+    from OpeningBook import OpeningBook
+    from Tablebase import Tablebase
+
+ENGINE_NAME = 'ChessBot'
+ENGINE_AUTHOR = 'the ChessBot authors'
+DEFAULT_HASH = 16 #MB
+MAX_HASH = 1024
+MOVE_OVERHEAD = 0.05 #seconds kept back from every move for the time it takes to send it
+DEFAULT_MOVES_TO_GO = 30 #moves the remaining clock time is spread over when the GUI doesn't say
+
+
+class UCIEngine():
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.outputLock = threading.Lock()
+        self.hashMegabytes = DEFAULT_HASH
+        self.searcher = ChessSearch.Searcher(self.hashMegabytes)
+        self.gs = ChessEngine.GameState()
+        self.baseFen = ChessEngine.START_FEN #the position the move list of the last position command starts from
+        self.moves = [] #moves of the last position command, in UCI notation
+        self.positionValid = True #False after a position command that couldn't be set up, go then answers 0000
+        self.searchThread = None
+        self.stopFlag = threading.Event()
+        self.ponderDone = threading.Event() #set by ponderhit or stop, until then a ponder search can't finish
+        self.infinite = False
+        self.deadline = None #clock deadline of a search that was started as a ponder search
+        self.ponderBudget = None #seconds the move gets once the ponder move is played
+        self.book = None #OpeningBook from the BookFile option
+        self.useBook = False #OwnBook option
+        self.tablebase = None #Tablebase from the TablebasePath option
+
+    def send(self, line):
+        with self.outputLock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    '''
+    Handles one line from the GUI. Returns False when the engine should quit.
+    '''
+    def handleCommand(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_AUTHOR}')
+            self.send(f'option name Hash type spin default {DEFAULT_HASH} min 1 max {MAX_HASH}')
+            self.send('option name Ponder type check default false')
+            self.send('option name OwnBook type check default false')
+            self.send('option name BookFile type string default <empty>')
+            self.send('option name TablebasePath type string default <empty>')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.setOption(args)
+        elif command == 'ucinewgame':
+            self.stopSearch()
+            self.searcher.reset()
+            self.setPosition(ChessEngine.START_FEN, [])
+        elif command == 'position':
+            self.stopSearch()
+            self.position(args)
+        elif command == 'go':
+            self.stopSearch()
+            self.go(args)
+        elif command == 'stop':
+            self.stopSearch()
+        elif command == 'ponderhit':
+            self.ponderHit()
+        elif command == 'quit':
+            self.stopSearch()
+            return False
+        return True
+
+    def setOption(self, args):
+        text = ' '.join(args)
+        if not text.startswith('name ') or ' value ' not in text:
+            return
+        name, value = text[len('name '):].split(' value ', 1)
+        name, value = name.strip().lower(), value.strip()
+        if name == 'hash':
+            self.stopSearch()
+            self.hashMegabytes = max(1, min(MAX_HASH, int(value)))
+            self.searcher = ChessSearch.Searcher(self.hashMegabytes, tablebase=self.tablebase)
+        elif name == 'ownbook':
+            self.useBook = value.lower() == 'true'
+        elif name == 'bookfile':
+            if self.book is not None:
+                self.book.close()
+                self.book = None
+            if value and value != '<empty>':
+                try:
+                    self.book = OpeningBook(value)
+                except OSError as error:
+                    self.send(f'info string cannot open book {value}: {error}')
+        elif name == 'tablebasepath':
+            self.stopSearch()
+            if self.tablebase is not None:
+                self.tablebase.close()
+                self.tablebase = None
+            if value and value != '<empty>':
+                try:
+                    self.tablebase = Tablebase(value)
+                except OSError as error:
+                    self.send(f'info string cannot open tablebases {value}: {error}')
+                else:
+                    if not self.tablebase.maxPieces:
+                        self.send(f'info string no tablebases found in {value}')
+            self.searcher.tablebase = self.tablebase
+
+    '''
+    position [startpos | fen <fen>] [moves <move> ...]
+    '''
+    def position(self, args):
+        if 'moves' in args:
+            split = args.index('moves')
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+        if setup and setup[0] == 'fen':
+            fen = ' '.join(setup[1:])
+        else:
+            fen = ChessEngine.START_FEN
+        self.setPosition(fen, moves)
+
+    '''
+    Brings self.gs to fen followed by moves. When fen is the same as last time only the moves after the longest
+    common start of the two move lists are undone and made. A FEN that can't be loaded or an illegal move marks
+    the position invalid, so the next go answers bestmove 0000 instead of searching some other position.
+    '''
+    def setPosition(self, fen, moves):
+        self.positionValid = False
+        if fen != self.baseFen:
+            try:
+                self.gs.loadFEN(fen)
+            except Exception as error: #whatever is wrong with the FEN, the command loop has to keep running
+                self.send(f'info string invalid position: {error}')
+                self.baseFen = None #self.gs no longer matches any position command
+                return
+            self.baseFen = fen
+            self.moves = []
+        common = 0
+        while common < min(len(moves), len(self.moves)) and moves[common] == self.moves[common]:
+            common += 1
+        for i in range(len(self.moves) - common):
+            self.gs.undoMove()
+        del self.moves[common:]
+        for text in moves[common:]:
+            move = parseMove(self.gs, text)
+            if move is None:
+                self.send(f'info string illegal move {text}')
+                return
+            self.gs.makeMove(move)
+            self.moves.append(text)
+        self.positionValid = True
+
+    '''
+    go [wtime <ms>] [btime <ms>] [winc <ms>] [binc <ms>] [movestogo <n>] [movetime <ms>] [depth <n>] [nodes <n>]
+       [infinite] [ponder]
+    '''
+    def go(self, args):
+        limits = {}
+        i = 0
+        while i < len(args):
+            if args[i] in ('infinite', 'ponder'):
+                limits[args[i]] = True
+                i += 1
+            elif i + 1 < len(args):
+                try:
+                    limits[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:
+                i += 1
+
+        timeLimit = allocateTime(limits, self.gs.whiteToMove)
+        maxDepth = limits.get('depth')
+        nodeLimit = limits.get('nodes')
+        self.infinite = limits.get('infinite', False)
+        pondering = limits.get('ponder', False)
+        if not self.positionValid:
+            self.send('bestmove 0000')
+            return
+        if self.useBook and self.book is not None and not pondering and not self.infinite:
+            move = self.book.chooseMove(self.gs)
+            if move is not None: #known theory, no need to think
+                self.send('info string book move')
+                self.send(f'bestmove {move.getChessNotation()}')
+                return
+        self.stopFlag.clear()
+        self.ponderDone.clear()
+        self.deadline = None
+        self.ponderBudget = timeLimit if pondering else None
+        if pondering or self.infinite: #no limits until stop or ponderhit
+            timeLimit = None
+        else:
+            self.ponderDone.set()
+        self.searchThread = threading.Thread(target=self.runSearch, args=(maxDepth, timeLimit, nodeLimit), daemon=True)
+        self.searchThread.start()
+
+    def runSearch(self, maxDepth, timeLimit, nodeLimit):
+        startTime = time.perf_counter()
+        move = self.searcher.search(self.gs, maxDepth, timeLimit, nodeLimit, self.sendInfo, self.shouldStop)
+        #a ponder or infinite search that ran out of things to do still waits for the GUI before it answers
+        if self.infinite:
+            self.stopFlag.wait()
+        self.ponderDone.wait()
+        if move is None:
+            self.send('bestmove 0000')
+            return
+        elapsed = time.perf_counter() - startTime
+        self.send(f'info nodes {self.searcher.nodes} time {int(elapsed * 1000)} '
+                  f'hashfull {self.searcher.table.hashfull()}')
+        pv = self.searcher.pv
+        if len(pv) > 1:
+            self.send(f'bestmove {move.getChessNotation()} ponder {pv[1].getChessNotation()}')
+        else:
+            self.send(f'bestmove {move.getChessNotation()}')
+
+    '''
+    Polled by the search: stops it on "stop", and once a ponder search has become a normal one, on its deadline
+    '''
+    def shouldStop(self):
+        if self.stopFlag.is_set():
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    def sendInfo(self, info):
+        mate, value = ChessSearch.describeScore(info['score'])
+        score = f'mate {value}' if mate else f'cp {value}'
+        pv = ' '.join(move.getChessNotation() for move in info['pv'])
+        self.send(f"info depth {info['depth']} score {score} nodes {info['nodes']} nps {info['nps']} "
+                  f"time {int(info['time'] * 1000)} hashfull {self.searcher.table.hashfull()} pv {pv}")
+
+    '''
+    The opponent played the move we were pondering on: the search goes on as a normal search of this move,
+    with the time it would have been given
+    '''
+    def ponderHit(self):
+        if self.ponderBudget is not None:
+            self.deadline = time.perf_counter() + self.ponderBudget
+            self.searcher.budgetStart = time.perf_counter() #the time spent pondering doesn't count against it
+            self.searcher.deadline = self.deadline #lets the search skip an iteration it can't finish
+        self.ponderDone.set()
+
+    '''
+    Stops a running search and waits for it to send its bestmove
+    '''
+    def stopSearch(self):
+        if self.searchThread is None:
+            return
+        self.stopFlag.set()
+        self.ponderDone.set()
+        self.searchThread.join()
+        self.searchThread = None
+
+
+'''
+Returns the legal move for a move in UCI notation (e2e4, e7e8q), or None
+'''
+def parseMove(gs, text):
+    text = text.lower()
+    for move in gs.getValidMoves():
+        if move.getChessNotation() == text:
+            return move
+    return None
+
+
+'''
+Seconds to spend on the move for the limits of a go command, or None for no time limit. movetime is used as
+given; otherwise the clock time is spread over the moves still to go, plus most of the increment.
+'''
+def allocateTime(limits, whiteToMove):
+    if 'movetime' in limits:
+        return max(0.01, limits['movetime'] / 1000 - MOVE_OVERHEAD)
+    clock = limits.get('wtime' if whiteToMove else 'btime')
+    if clock is None:
+        return None
+    increment = limits.get('winc' if whiteToMove else 'binc', 0)
+    movesToGo = limits.get('movestogo', DEFAULT_MOVES_TO_GO)
+    budget = clock / max(1, movesToGo) + increment * 3 // 4
+    budget = min(budget, clock / 2) #never bet more than half the clock on one move
+    return max(0.01, budget / 1000 - MOVE_OVERHEAD)
+
+
+def main():
+    engine = UCIEngine()
+    for line in sys.stdin:
+        if not engine.handleCommand(line.strip()):
+            break
+    engine.stopSearch()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# Runs the engine search in a separate process so the pygame loop in ChessMain never waits on it: the window keeps
+# drawing at full frame rate while the engine uses a whole core. Positions go to the worker as GameState.toBytes()
+# and results come back through a queue as move IDs, which the GUI looks up in its own valid moves.
+#
+# Every search gets an ID. The ID of the search the GUI still wants is kept in shared memory and the worker's
+# search stops as soon as it changes, so cancelling (undo, closing the window, a new search) never has to wait
+# for the engine, and results from cancelled searches are recognised by their ID and thrown away.
+import multiprocessing
+import queue
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine, ChessSearch
+    from .OpeningBook import OpeningBook
+except ImportError: #run from the source folder
+    import ChessEngine
+    import ChessSearch
+    from OpeningBook import OpeningBook
+
+
+class EngineWorker():
+    def __init__(self, hashMegabytes=16, bookPath=None):
+        self.requests = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.activeSearchID = multiprocessing.Value('i', 0, lock=False) #0 means no search is wanted
+        self.searchID = 0
+        self.pondering = False
+        self.process = multiprocessing.Process(target=runWorker, daemon=True,
+                                               args=(self.requests, self.results, self.activeSearchID,
+                                                     hashMegabytes, bookPath))
+        self.process.start()
+
+    '''
+    Starts searching gs in the worker and returns the search ID. Any search already running is cancelled. With
+    ponder=True the search has no limits: it runs on the opponent's time to fill the transposition table and
+    is stopped when the opponent moves. Other searches play a book move straight away if the position is in the
+    opening book.
+    '''
+    def startSearch(self, gs, timeLimit=None, maxDepth=None, nodeLimit=None, ponder=False):
+        self.searchID += 1
+        self.activeSearchID.value = self.searchID
+        self.pondering = ponder
+        if ponder:
+            timeLimit = maxDepth = nodeLimit = None
+        self.requests.put(('go', self.searchID, gs.toBytes(), timeLimit, maxDepth, nodeLimit, not ponder))
+        return self.searchID
+
+    '''
+    Cancels the current search (or ponder). Its result will be ignored.
+    '''
+    def stop(self):
+        self.activeSearchID.value = 0
+        self.pondering = False
+
+    '''
+    Tells the worker to forget what it learned in earlier games
+    '''
+    def newGame(self):
+        self.stop()
+        self.requests.put(('newgame',))
+
+    '''
+    Returns the next message for the current search without waiting, or None. Messages are ('info', infoDict)
+    after each finished iteration and ('bestmove', moveID) when the search is done; moveID is None if there were no
+    legal moves. Messages from cancelled searches are dropped.
+    '''
+    def getResult(self):
+        while True:
+            try:
+                message = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            kind, searchID, payload = message
+            if searchID == self.searchID and searchID == self.activeSearchID.value:
+                if kind == 'bestmove':
+                    self.activeSearchID.value = 0
+                return kind, payload
+
+    '''
+    Stops the worker process, used when the window is closed
+    '''
+    def close(self):
+        self.stop()
+        self.requests.put(('quit',))
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+'''
+The worker process: keeps one Searcher (and its transposition table) for the whole game and runs the searches it
+is sent one at a time
+'''
+def runWorker(requests, results, activeSearchID, hashMegabytes, bookPath):
+    searcher = ChessSearch.Searcher(hashMegabytes)
+    book = OpeningBook(bookPath) if bookPath else None
+    while True:
+        request = requests.get()
+        if request[0] == 'quit':
+            break
+        if request[0] == 'newgame':
+            searcher.reset()
+            continue
+        _, searchID, position, timeLimit, maxDepth, nodeLimit, useBook = request
+        if activeSearchID.value != searchID: #cancelled before it started
+            continue
+        gs = ChessEngine.GameState.fromBytes(position)
+        bookMove = book.chooseMove(gs) if useBook and book is not None else None
+        if bookMove is not None:
+            results.put(('bestmove', searchID, bookMove.moveID))
+            continue
+
+        def sendInfo(info):
+            info = dict(info, pv=[move.getChessNotation() for move in info['pv']])
+            results.put(('info', searchID, info))
+
+        move = searcher.search(gs, maxDepth, timeLimit, nodeLimit, sendInfo,
+                               stopCallback=lambda: activeSearchID.value != searchID)
+        results.put(('bestmove', searchID, move.moveID if move is not None else None))
@@ -0,0 +1,82 @@
+# A bounded cache of legal move lists keyed by GameState.zobristKey. The key covers everything the legal moves
+# depend on (pieces, side to move, castling rights and a usable en passant file), so the moves of a position can
+# be reused whenever the same position comes back: after an undo, when stepping through a game, in analysis.
+#
+# Entries are evicted least recently used first once the cache grows past its memory budget. A GameState only
+# uses a cache if one is given to it (gs.moveCache = LegalMoveCache()); the search and perft visit far too many
+# positions once each to gain anything from one.
+from collections import OrderedDict
+
+# rough size of an entry without its moves (the key, the dict slot and the tuple), and per move (a reference to
+# the interned Move), used to keep the cache within its memory budget
+ENTRY_BYTES = 200
+MOVE_BYTES = 8
+
+
+class LegalMoveCache():
+    def __init__(self, megabytes=4):
+        self.maxBytes = megabytes * 1024 * 1024
+        self.entries = OrderedDict() #zobrist key -> tuple of moves, least recently used first
+        self.bytesUsed = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    '''
+    Returns the moves stored for key as a tuple, or None
+    '''
+    def get(self, key):
+        moves = self.entries.get(key)
+        if moves is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return moves
+
+    '''
+    Stores the legal moves of the position with this key, evicting the least recently used positions if the
+    cache is over its budget
+    '''
+    def put(self, key, moves):
+        entries = self.entries
+        if key in entries:
+            self.bytesUsed -= entrySize(entries.pop(key))
+        moves = tuple(moves)
+        entries[key] = moves
+        self.bytesUsed += entrySize(moves)
+        while self.bytesUsed > self.maxBytes and len(entries) > 1:
+            oldKey, oldMoves = entries.popitem(last=False)
+            self.bytesUsed -= entrySize(oldMoves)
+            self.evictions += 1
+
+    '''
+    Forgets the moves of one position. Only needed if a position was changed without makeMove/undoMove or
+    loadBoard, which would leave its key out of date.
+    '''
+    def invalidate(self, key):
+        moves = self.entries.pop(key, None)
+        if moves is not None:
+            self.bytesUsed -= entrySize(moves)
+
+    def clear(self):
+        self.entries.clear()
+        self.bytesUsed = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {'positions': len(self.entries), 'bytes': self.bytesUsed, 'hits': self.hits, 'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0, 'evictions': self.evictions}
+
+
+def entrySize(moves):
+    return ENTRY_BYTES + MOVE_BYTES * len(moves)
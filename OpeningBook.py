@@ -0,0 +1,205 @@
+# An opening book in the Polyglot .bin layout: a file of 16 byte entries (key, move, weight, learn; big endian)
+# sorted by key, one entry per book move of a position. The file is memory mapped and looked up by binary search,
+# so opening even a very large book costs nothing up front, and every engine process using the same book shares
+# the pages the operating system has already read.
+#
+# The keys are GameState.zobristKey rather than the Polyglot random numbers, so books are built from PGN files with
+# this module (python OpeningBook.py build games.pgn -o book.bin) instead of taken from other engines. Moves are
+# stored in the Polyglot encoding and turned back into the legal Move they stand for when the book is probed.
+#
+#   book = OpeningBook('book.bin')
+#   move = book.chooseMove(gs)          a legal Move picked at random by weight, or None out of book
+import mmap
+import random
+import struct
+import sys
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine, ChessPGN
+except ImportError: #run from the source folder
+    import ChessEngine
+    import ChessPGN
+
+ENTRY = struct.Struct('>QHHI') #key, move, weight, learn
+KEY = struct.Struct('>Q')
+MAX_WEIGHT = 0xFFFF
+#result of a game -> weight a move gets for (white, black) when building a book: 2 for a win, 1 for a draw
+RESULT_WEIGHTS = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}
+DEFAULT_RESULT_WEIGHTS = (1, 1) #unknown result
+
+
+class OpeningBook():
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = self.file.seek(0, 2)
+        self.entries = size // ENTRY.size
+        #an empty file can't be mapped, it simply has no moves
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.entries else b''
+
+    '''
+    Returns [(moveCode, weight), ...] for the entries of key in file order (heaviest first in a built book)
+    '''
+    def lookup(self, key):
+        data = self.data
+        low, high = 0, self.entries
+        while low < high: #first entry with a key >= key
+            middle = (low + high) // 2
+            if KEY.unpack_from(data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        for index in range(low, self.entries):
+            entryKey, moveCode, weight, learn = ENTRY.unpack_from(data, index * ENTRY.size)
+            if entryKey != key:
+                break
+            found.append((moveCode, weight))
+        return found
+
+    '''
+    Returns [(move, weight), ...] for the book moves of the position, as the legal Move objects getValidMoves
+    returns. Entries that aren't legal here (a key collision) are left out.
+    '''
+    def getMoves(self, gs):
+        moves = []
+        for moveCode, weight in self.lookup(gs.zobristKey):
+            move = gs.getMoveByID(moveIDFromCode(gs, moveCode))
+            if move is not None:
+                moves.append((move, weight))
+        return moves
+
+    '''
+    Picks one of the book moves of the position at random, in proportion to their weights. Returns None if the
+    position isn't in the book.
+    '''
+    def chooseMove(self, gs, rng=random):
+        moves = [(move, weight) for move, weight in self.getMoves(gs) if weight > 0]
+        if not moves:
+            return None
+        pick = rng.randrange(sum(weight for move, weight in moves))
+        for move, weight in moves:
+            pick -= weight
+            if pick < 0:
+                return move
+
+    def __len__(self):
+        return self.entries
+
+    def close(self):
+        if self.entries:
+            self.data.close()
+        self.file.close()
+
+
+'''
+Encodes a move the Polyglot way: to file, to rank, from file, from rank (3 bits each, rank 0 is white's first
+rank) and the promotion piece (1 knight to 4 queen). Castling is written as the king taking its own rook.
+'''
+def moveCode(move):
+    endCol = move.endCol
+    if move.isCastleMove:
+        endCol = 7 if endCol == 6 else 0
+    promotion = move.promotionCode & 7
+    return endCol | (7 - move.endRow) << 3 | move.startCol << 6 | (7 - move.startRow) << 9 | \
+        (promotion - ChessEngine.PAWN if promotion else 0) << 12
+
+
+'''
+Turns a Polyglot move code back into the moveID of the move in this position
+'''
+def moveIDFromCode(gs, code):
+    endCol, endRow = code & 7, 7 - (code >> 3 & 7)
+    startCol, startRow = code >> 6 & 7, 7 - (code >> 9 & 7)
+    promotion = code >> 12 & 7
+    piece = gs.squares[startRow * 16 + startCol]
+    if piece & 7 == ChessEngine.KING and startCol == 4 and endRow == startRow and endCol in (0, 7):
+        target = gs.squares[endRow * 16 + endCol]
+        if target & 7 == ChessEngine.ROOK and target & ChessEngine.BLACK == piece & ChessEngine.BLACK:
+            endCol = 6 if endCol == 7 else 2 #king takes own rook: castling
+    return (startRow * 8 + startCol) | (endRow * 8 + endCol) << 6 | (promotion + ChessEngine.PAWN if promotion else 0) << 12
+
+
+'''
+Writes a book file from {(key, moveCode): weight}. Entries are sorted by key and, within a position, heaviest
+first. When a position has a weight over MAX_WEIGHT all of its weights are scaled down to fit.
+'''
+def writeBook(path, weights):
+    positions = {}
+    for (key, code), weight in weights.items():
+        if weight > 0:
+            positions.setdefault(key, []).append((weight, code))
+    written = 0
+    with open(path, 'wb') as f:
+        for key in sorted(positions):
+            moves = sorted(positions[key], key=lambda entry: (-entry[0], entry[1]))
+            heaviest = moves[0][0]
+            for weight, code in moves:
+                if heaviest > MAX_WEIGHT:
+                    weight = max(1, weight * MAX_WEIGHT // heaviest)
+                f.write(ENTRY.pack(key, code, weight, 0))
+                written += 1
+    return written
+
+
+'''
+Builds a book from the first maxPly moves of every game in the PGN files. Every time a move is played it gets
+2 for a win of the side that played it, 1 for a draw and 0 for a loss, and moves played in fewer than minGames
+games are left out. Returns the number of entries written.
+'''
+def buildBook(pgnPaths, path, maxPly=20, minGames=1):
+    weights = {}
+    games = {}
+    gs = ChessEngine.GameState()
+    for pgnPath in pgnPaths:
+        for headers, sanMoves in ChessPGN.readPGN(pgnPath):
+            try:
+                gs.loadFEN(headers.get('FEN', ChessEngine.START_FEN))
+            except ValueError:
+                continue
+            resultWeights = RESULT_WEIGHTS.get(headers.get('Result'), DEFAULT_RESULT_WEIGHTS)
+            for san in sanMoves[:maxPly]:
+                try:
+                    move = gs.parseSAN(san)
+                except ValueError:
+                    break
+                entry = (gs.zobristKey, moveCode(move))
+                weights[entry] = weights.get(entry, 0) + resultWeights[0 if gs.whiteToMove else 1]
+                games[entry] = games.get(entry, 0) + 1
+                gs.makeMove(move)
+    return writeBook(path, {entry: weight for entry, weight in weights.items() if games[entry] >= minGames})
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Build or probe an opening book')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from PGN files')
+    build.add_argument('pgn', nargs='+')
+    build.add_argument('-o', '--output', required=True)
+    build.add_argument('--max-ply', type=int, default=20, help='moves from the start of each game to use')
+    build.add_argument('--min-games', type=int, default=1, help='leave out moves played in fewer games')
+    probe = commands.add_parser('probe', help='list the book moves of a position')
+    probe.add_argument('book')
+    probe.add_argument('--fen', default=ChessEngine.START_FEN)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        entries = buildBook(args.pgn, args.output, args.max_ply, args.min_games)
+        print(f'{entries} moves written to {args.output}')
+        return 0
+    gs = ChessEngine.GameState()
+    gs.loadFEN(args.fen)
+    book = OpeningBook(args.book)
+    moves = book.getMoves(gs)
+    total = sum(weight for move, weight in moves)
+    for move, weight in moves:
+        print(f'{move.getChessNotation():6} weight {weight:5}  {100 * weight / total if total else 0:5.1f}%')
+    if not moves:
+        print('not in book')
+    book.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,676 @@
+# Endgame tablebases: for every position of a small set of pieces (KQK, KRK, KPK, KRKP, ...) the exact distance to
+# mate, worked out once by retrograde analysis and looked up during the search instead of searched.
+#
+# A table is a file of one byte per position: 0 for a draw (or a position that can't happen), otherwise 1 + the
+# number of plies to mate with best play from the player to move, who wins when that number is odd and gets mated
+# when it is even. Positions are indexed by the squares of their pieces in the order of the table name, white
+# first. Symmetry keeps the tables small: without pawns the board can be rotated and mirrored so the white king is
+# always in the a1-d1-d4 triangle (10 squares instead of 64), with pawns it can only be mirrored left to right
+# (the white king on files a-d). A position where the weaker side is white is looked up in the table of the
+# other colors with the board turned around. Tables assume no castling rights and no en passant capture.
+#
+# Generation works backwards from the mates. A first pass over every position (split over the cores) finds the
+# mates and stalemates, counts the moves that stay in the table, and looks up the moves that capture or promote in
+# the smaller tables (which are generated first). Then positions are settled in order of their distance to mate:
+# when a position is lost every position that can move into it is won one ply further out, and when it is won
+# the positions that can move into it lose one more way out, and are lost once they have none left. The
+# positions that can move into one are found by moving its pieces backwards, so no move lists are kept.
+#
+#   python Tablebase.py generate KQK KRK KPK --dir tablebases
+#   python Tablebase.py probe --fen "8/8/8/4k3/8/8/8/K1Q5 w - - 0 1" --dir tablebases
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try: #imported from the installed ChessBot package
+    from . import ChessEngine
+    from .ChessEngine import (EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, PIECE_VALUES,
+                              ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KING_OFFSETS, KNIGHT_OFFSETS, PAWN_ATTACK_SOURCES)
+except ImportError: #run from the source folder
+    import ChessEngine
+    from ChessEngine import (EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, PIECE_VALUES,
+                             ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KING_OFFSETS, KNIGHT_OFFSETS, PAWN_ATTACK_SOURCES)
+
+FILE_EXTENSION = '.tb'
+LETTERS = 'KQRBNP' #order of the pieces of each side in a table name
+LETTER_TYPES = {'K': KING, 'Q': QUEEN, 'R': ROOK, 'B': BISHOP, 'N': KNIGHT, 'P': PAWN}
+TYPE_LETTERS = {pieceType: letter for letter, pieceType in LETTER_TYPES.items()}
+DRAWN_TABLES = ('KK', 'KBK', 'KNK') #nobody can ever be mated, so these need no file
+PROMOTION_TYPES = (QUEEN, ROOK, BISHOP, KNIGHT)
+MAX_PLIES = 254 #the most a byte can hold
+CHUNK_SIZE = 1 << 15 #positions per task of the first pass
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+# bits of the per position flags during generation
+VALID = 1 #a position that can happen with this side to move (the side that just moved isn't in check)
+NO_LOSS = 2 #has a move that doesn't lose (a draw or a win that left the table), so it can't be lost
+MATED = 4
+
+SQ88 = tuple((s >> 3) * 16 + (s & 7) for s in range(64)) #board order square (row * 8 + col) -> 0x88 square
+SQ64 = [0] * 128
+for s, sq in enumerate(SQ88):
+    SQ64[sq] = s
+
+
+'''
+Returns, for every difference between two 0x88 squares (offset by 119), the direction a slider moving along
+directions needs to go from one to the other, or 0
+'''
+def buildRays(directions):
+    rays = [0] * 239
+    for direction in directions:
+        for steps in range(1, 8):
+            rays[direction * steps + 119] = direction
+    return rays
+
+ROOK_RAYS = buildRays(ROOK_DIRECTIONS)
+BISHOP_RAYS = buildRays(BISHOP_DIRECTIONS)
+KNIGHT_JUMPS = frozenset(KNIGHT_OFFSETS)
+KING_STEPS = frozenset(KING_OFFSETS)
+PAWN_CAPTURES = {WHITE: frozenset((-17, -15)), BLACK: frozenset((15, 17))} #square attacked minus pawn square
+PAWN_FORWARD = {WHITE: -16, BLACK: 16}
+PAWN_START_ROW = {WHITE: 6, BLACK: 1}
+PAWN_DOUBLE_ROW = {WHITE: 4, BLACK: 3} #where a pawn ends up after a double step
+SLIDER_DIRECTIONS = {ROOK: ROOK_DIRECTIONS, BISHOP: BISHOP_DIRECTIONS, QUEEN: ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+STEP_OFFSETS = {KNIGHT: KNIGHT_OFFSETS, KING: KING_OFFSETS}
+
+
+def transformSquare(s, swap, flipRows, flipCols):
+    r, c = s >> 3, s & 7
+    if swap:
+        r, c = c, r
+    if flipRows:
+        r = 7 - r
+    if flipCols:
+        c = 7 - c
+    return r * 8 + c
+
+# the 8 symmetries of the board (identity first), and the 2 that keep pawns moving the right way
+ALL_TRANSFORMS = [tuple(transformSquare(s, swap, flipRows, flipCols) for s in range(64))
+                  for swap in (0, 1) for flipRows in (0, 1) for flipCols in (0, 1)]
+MIRROR_TRANSFORMS = [ALL_TRANSFORMS[0], ALL_TRANSFORMS[1]]
+TRIANGLE = tuple(s for s in range(64) if 7 - (s >> 3) <= (s & 7) <= 3) #a1-d1-d4
+LEFT_HALF = tuple(s for s in range(64) if s & 7 <= 3) #files a-d
+
+
+class Layout():
+    # How the positions of one table are numbered: index = (white king slot, then 64 per other piece) plus
+    # size for black to move. Every position has one canonical index, the smallest one any symmetry gives it.
+    def __init__(self, name):
+        self.name = name
+        white, black = splitName(name)
+        self.pieces = [WHITE | LETTER_TYPES[letter] for letter in white] + [BLACK | LETTER_TYPES[letter] for letter in black]
+        self.blackKing = len(white) #index of the black king in pieces
+        self.order = {code: i for i, code in reversed(list(enumerate(self.pieces)))} #code -> its first index
+        self.hasPawns = 'P' in name
+        transforms = MIRROR_TRANSFORMS if self.hasPawns else ALL_TRANSFORMS
+        self.slotSquares = LEFT_HALF if self.hasPawns else TRIANGLE
+        self.slotOf = {s: slot for slot, s in enumerate(self.slotSquares)}
+        #the symmetries that bring the white king on each square into its slots
+        self.kingTransforms = [[transform for transform in transforms if transform[s] in self.slotOf] for s in range(64)]
+        self.size = len(self.slotSquares) * 64 ** (len(self.pieces) - 1) #positions per side to move
+        #runs of identical pieces, whose squares are sorted so swapping them gives the same index
+        self.groups = []
+        start = 0
+        for i in range(1, len(self.pieces) + 1):
+            if i == len(self.pieces) or self.pieces[i] != self.pieces[start]:
+                if i - start > 1:
+                    self.groups.append((start, i))
+                start = i
+
+    def canonicalIndex(self, squares, whiteToMove):
+        best = None
+        for transform in self.kingTransforms[squares[0]]:
+            mapped = [transform[s] for s in squares]
+            for start, end in self.groups:
+                mapped[start:end] = sorted(mapped[start:end])
+            index = self.slotOf[mapped[0]]
+            for s in mapped[1:]:
+                index = index * 64 + s
+            if best is None or index < best:
+                best = index
+        return best if whiteToMove else best + self.size
+
+    '''
+    Returns (squares, whiteToMove) of an index
+    '''
+    def decode(self, index):
+        whiteToMove = index < self.size
+        if not whiteToMove:
+            index -= self.size
+        squares = [0] * len(self.pieces)
+        for i in range(len(self.pieces) - 1, 0, -1):
+            squares[i] = index & 63
+            index >>= 6
+        squares[0] = self.slotSquares[index]
+        return squares, whiteToMove
+
+
+'''
+Splits a table name into the letters of the white and the black pieces: 'KRKP' -> ('KR', 'KP')
+'''
+def splitName(name):
+    split = name.index('K', 1)
+    return name[:split], name[split:]
+
+
+def sideStrength(letters):
+    return sum(PIECE_VALUES[LETTER_TYPES[letter]] for letter in letters), letters
+
+
+'''
+Returns (name, flipped): the table the pieces of one side (white) and the other (black) are found in, and
+whether the colors have to be swapped for it because black is the stronger side
+'''
+def tableName(white, black):
+    white = ''.join(sorted(white, key=LETTERS.index))
+    black = ''.join(sorted(black, key=LETTERS.index))
+    if sideStrength(white) >= sideStrength(black):
+        return white + black, False
+    return black + white, True
+
+
+'''
+The name a table is stored under, with the stronger side first
+'''
+def normalizeName(name):
+    return tableName(*splitName(name.upper()))[0]
+
+
+'''
+The tables the moves out of a table lead to: one piece fewer after a capture, and a promoted piece for a pawn
+'''
+def dependencies(name):
+    white, black = splitName(name)
+    found = set()
+    sides = [white, black]
+    for side in (0, 1):
+        other = 1 - side
+        for i, letter in enumerate(sides[other]):
+            if letter != 'K': #captured
+                remaining = sides[other][:i] + sides[other][i + 1:]
+                found.add(tableName(*((sides[side], remaining) if side == 0 else (remaining, sides[side])))[0])
+        for i, letter in enumerate(sides[side]):
+            if letter != 'P':
+                continue
+            for promotion in 'QRBN':
+                promoted = sides[side][:i] + promotion + sides[side][i + 1:]
+                found.add(tableName(*((promoted, sides[other]) if side == 0 else (sides[other], promoted)))[0])
+                for j, captured in enumerate(sides[other]): #promoting with a capture
+                    if captured != 'K':
+                        remaining = sides[other][:j] + sides[other][j + 1:]
+                        found.add(tableName(*((promoted, remaining) if side == 0 else (remaining, promoted)))[0])
+    found.discard(name)
+    return sorted(found)
+
+
+class Tablebase():
+    # The tables in one directory, opened (memory mapped) the first time a position needs them
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {} #name -> (Layout, mmap), or None when there is no file
+        self.maxPieces = 0
+        if os.path.isdir(directory):
+            for fileName in os.listdir(directory):
+                if fileName.endswith(FILE_EXTENSION):
+                    self.maxPieces = max(self.maxPieces, len(fileName) - len(FILE_EXTENSION))
+
+    def openTable(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.directory, name + FILE_EXTENSION)
+            if os.path.exists(path):
+                layout = Layout(name)
+                with open(path, 'rb') as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if len(data) != 2 * layout.size:
+                    raise ValueError(f'{path} has {len(data)} bytes, expected {2 * layout.size}')
+                self.tables[name] = (layout, data)
+            else:
+                self.tables[name] = None
+        return self.tables[name]
+
+    '''
+    Returns the table byte of a position given as [(pieceCode, square), ...] with squares in board order
+    (row * 8 + col), or None when its table isn't there
+    '''
+    def lookup(self, pieces, whiteToMove):
+        white = ''.join(TYPE_LETTERS[code & 7] for code, s in pieces if not code & BLACK)
+        black = ''.join(TYPE_LETTERS[code & 7] for code, s in pieces if code & BLACK)
+        name, flipped = tableName(white, black)
+        if name in DRAWN_TABLES:
+            return 0
+        table = self.openTable(name)
+        if table is None:
+            return None
+        layout, data = table
+        if flipped: #turn the board around so the stronger side is white
+            pieces = [(code ^ BLACK, s ^ 56) for code, s in pieces]
+            whiteToMove = not whiteToMove
+        order = layout.order
+        squares = [s for code, s in sorted(pieces, key=lambda piece: order[piece[0]])]
+        return data[layout.canonicalIndex(squares, whiteToMove)]
+
+    '''
+    Returns (result, plies) for the player to move in gs: result is WIN, DRAW or LOSS and plies the distance to
+    mate with best play (0 for a draw). None if the position isn't covered by the tables here, or can't happen
+    because the player who just moved is in check.
+    '''
+    def probe(self, gs):
+        if gs.castleRights or enpassantPossible(gs):
+            return None
+        if sum(gs.pieceCounts) > self.maxPieces:
+            return None
+        squares = gs.squares
+        pieces = [(squares[sq], s) for s, sq in enumerate(SQ88) if squares[sq]]
+        value = self.lookup(pieces, gs.whiteToMove)
+        if value is None:
+            return None
+        if not value: #positions that can't happen are stored as draws too
+            kingRow, kingCol = gs.blackKingLocation if gs.whiteToMove else gs.whiteKingLocation
+            if gs.isSquareAttacked(kingRow * 16 + kingCol, WHITE if gs.whiteToMove else BLACK):
+                return None
+        return describeValue(value)
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table[1].close()
+        self.tables = {}
+
+
+'''
+True if the player to move has a pawn that can capture en passant (the tables don't know about en passant, but
+after most double steps there is no pawn to take it anyway)
+'''
+def enpassantPossible(gs):
+    target = gs.enpassantSquare
+    if target is None:
+        return False
+    color = WHITE if gs.whiteToMove else BLACK
+    for offset in PAWN_ATTACK_SOURCES[color]:
+        sq = target + offset
+        if not sq & 0x88 and gs.squares[sq] == color | PAWN:
+            return True
+    return False
+
+
+'''
+Turns a table byte into (result, plies) for the player to move
+'''
+def describeValue(value):
+    if not value:
+        return DRAW, 0
+    plies = value - 1
+    return (WIN if plies & 1 else LOSS), plies
+
+
+def describeResult(result, plies):
+    if result == WIN:
+        return f'win, mate in {(plies + 1) // 2}'
+    if result == LOSS:
+        return f'loss, mated in {plies // 2}'
+    return 'draw'
+
+
+# ---- generation ----
+
+'''
+True if the piece code on the 0x88 square frm attacks target on board
+'''
+def attacks(board, code, frm, target):
+    pieceType = code & 7
+    difference = target - frm
+    if pieceType == PAWN:
+        return difference in PAWN_CAPTURES[code & BLACK]
+    if pieceType == KNIGHT:
+        return difference in KNIGHT_JUMPS
+    if pieceType == KING:
+        return difference in KING_STEPS
+    direction = 0
+    if pieceType != BISHOP:
+        direction = ROOK_RAYS[difference + 119]
+    if not direction and pieceType != ROOK:
+        direction = BISHOP_RAYS[difference + 119]
+    if not direction:
+        return False
+    sq = frm + direction
+    while sq != target:
+        if board[sq]:
+            return False
+        sq += direction
+    return True
+
+
+def isAttacked(board, pieces, sq88, target, attackerColor, skip=-1):
+    for j, code in enumerate(pieces):
+        if j != skip and code & BLACK == attackerColor and attacks(board, code, sq88[j], target):
+            return True
+    return False
+
+
+'''
+Yields the pseudo legal moves of piece i as (to, capturedIndex, promotion), with capturedIndex -1 for a quiet
+move and promotion 0 for no promotion
+'''
+def pieceMoves(board, pieces, sq88, i, occupant):
+    code = pieces[i]
+    color = code & BLACK
+    frm = sq88[i]
+    pieceType = code & 7
+    if pieceType == PAWN:
+        forward = PAWN_FORWARD[color]
+        targets = []
+        one = frm + forward
+        if not board[one]:
+            targets.append((one, -1))
+            if frm >> 4 == PAWN_START_ROW[color] and not board[one + forward]:
+                targets.append((one + forward, -1))
+        for side in (-1, 1):
+            to = one + side
+            if not to & 0x88 and board[to] and board[to] & BLACK != color:
+                targets.append((to, occupant[to]))
+        for to, captured in targets:
+            if to >> 4 in (0, 7):
+                for promotion in PROMOTION_TYPES:
+                    yield to, captured, color | promotion
+            else:
+                yield to, captured, 0
+    elif pieceType in STEP_OFFSETS:
+        for offset in STEP_OFFSETS[pieceType]:
+            to = frm + offset
+            if not to & 0x88 and (not board[to] or board[to] & BLACK != color):
+                yield to, occupant[to] if board[to] else -1, 0
+    else:
+        for direction in SLIDER_DIRECTIONS[pieceType]:
+            to = frm + direction
+            while not to & 0x88:
+                if board[to]:
+                    if board[to] & BLACK != color:
+                        yield to, occupant[to], 0
+                    break
+                yield to, -1, 0
+                to += direction
+
+
+# each process of the generation keeps its layouts, a board and the finished tables it looks captures up in
+workerTablebase = None
+workerLayouts = {}
+workerBoard = bytearray(128)
+workerOccupant = [-1] * 128
+
+
+def getLayout(name):
+    layout = workerLayouts.get(name)
+    if layout is None:
+        layout = workerLayouts[name] = Layout(name)
+    return layout
+
+
+'''
+First pass over the positions start..stop of a table. Returns (flags, remaining, seeds, winsAt, lossesAt): per
+position the flags, the number of different positions in the table its moves lead to, and the best win and
+worst loss its moves out of the table give (0 for none); seeds are the (plies, index) settled by this pass.
+'''
+def forwardChunk(name, directory, start, stop):
+    global workerTablebase
+    if workerTablebase is None or workerTablebase.directory != directory:
+        workerTablebase = Tablebase(directory)
+    tablebase = workerTablebase
+    layout = getLayout(name)
+    pieces = layout.pieces
+    board = workerBoard
+    occupant = workerOccupant
+    count = stop - start
+    flags = bytearray(count)
+    remaining = bytearray(count)
+    winsAt = bytearray(count)
+    lossesAt = bytearray(count)
+    seeds = []
+    for index in range(start, stop):
+        squares, whiteToMove = layout.decode(index)
+        if len(set(squares)) != len(squares) or layout.canonicalIndex(squares, whiteToMove) != index:
+            continue
+        if any(code & 7 == PAWN and squares[i] >> 3 in (0, 7) for i, code in enumerate(pieces)):
+            continue
+        color = WHITE if whiteToMove else BLACK
+        sq88 = [SQ88[s] for s in squares]
+        for i, sq in enumerate(sq88):
+            board[sq] = pieces[i]
+            occupant[sq] = i
+        ownKing = 0 if whiteToMove else layout.blackKing
+        otherKing = layout.blackKing if whiteToMove else 0
+        if isAttacked(board, pieces, sq88, sq88[otherKing], color): #the side that just moved is in check
+            for sq in sq88:
+                board[sq] = EMPTY
+            continue
+        position = index - start
+        flag = VALID
+        children = set()
+        bestWin = 0
+        worstLoss = 0
+        legalMoves = 0
+        for i, code in enumerate(pieces):
+            if code & BLACK != color:
+                continue
+            frm = sq88[i]
+            for to, captured, promotion in list(pieceMoves(board, pieces, sq88, i, occupant)):
+                #make the move on the board, see if it leaves the king in check, and take it back
+                capturedCode = board[to]
+                board[frm] = EMPTY
+                board[to] = promotion or code
+                sq88[i] = to
+                legal = not isAttacked(board, pieces, sq88, sq88[ownKing], color ^ BLACK, captured)
+                sq88[i] = frm
+                board[to] = capturedCode
+                board[frm] = code
+                if not legal:
+                    continue
+                legalMoves += 1
+                if captured < 0 and not promotion:
+                    child = list(squares)
+                    child[i] = SQ64[to]
+                    children.add(layout.canonicalIndex(child, not whiteToMove))
+                    continue
+                childPieces = [(promotion or code, SQ64[to]) if j == i else (pieces[j], squares[j])
+                               for j in range(len(pieces)) if j != captured]
+                value = tablebase.lookup(childPieces, not whiteToMove)
+                if value is None:
+                    raise FileNotFoundError(f'table for {childPieces} missing, generate the dependencies of {name} first')
+                result, plies = describeValue(value)
+                if result == LOSS: #for the opponent
+                    if not bestWin or plies + 1 < bestWin:
+                        bestWin = plies + 1
+                elif result == WIN:
+                    worstLoss = max(worstLoss, plies + 1)
+                else:
+                    flag |= NO_LOSS
+        inCheck = isAttacked(board, pieces, sq88, sq88[ownKing], color ^ BLACK)
+        for sq in sq88:
+            board[sq] = EMPTY
+        if not legalMoves:
+            if inCheck:
+                flag |= MATED
+                seeds.append((0, index))
+            else: #stalemate
+                flag |= NO_LOSS
+        elif bestWin:
+            flag |= NO_LOSS
+            seeds.append((bestWin, index))
+        elif not children and not flag & NO_LOSS: #every move leaves the table and loses
+            seeds.append((worstLoss, index))
+        flags[position] = flag
+        remaining[position] = len(children)
+        winsAt[position] = bestWin
+        lossesAt[position] = worstLoss
+    return flags, remaining, seeds, winsAt, lossesAt
+
+
+'''
+Returns, for each position of indices, the different positions in the table that have a move into it (moves that
+don't capture or promote, found by moving the pieces of the side that just moved backwards)
+'''
+def predecessorChunk(name, indices):
+    layout = getLayout(name)
+    pieces = layout.pieces
+    board = workerBoard
+    found = []
+    for index in indices:
+        squares, whiteToMove = layout.decode(index)
+        moved = BLACK if whiteToMove else WHITE #the side that made the last move
+        sq88 = [SQ88[s] for s in squares]
+        for i, sq in enumerate(sq88):
+            board[sq] = pieces[i]
+        parents = set()
+        for i, code in enumerate(pieces):
+            if code & BLACK != moved:
+                continue
+            to = sq88[i]
+            pieceType = code & 7
+            origins = []
+            if pieceType == PAWN:
+                back = -PAWN_FORWARD[moved]
+                frm = to + back
+                if not board[frm] and frm >> 4 not in (0, 7):
+                    origins.append(frm)
+                    if to >> 4 == PAWN_DOUBLE_ROW[moved] and not board[frm + back]:
+                        origins.append(frm + back)
+            elif pieceType in STEP_OFFSETS:
+                for offset in STEP_OFFSETS[pieceType]:
+                    frm = to - offset
+                    if not frm & 0x88 and not board[frm]:
+                        origins.append(frm)
+            else:
+                for direction in SLIDER_DIRECTIONS[pieceType]:
+                    frm = to + direction
+                    while not frm & 0x88 and not board[frm]:
+                        origins.append(frm)
+                        frm += direction
+            for frm in origins:
+                parent = list(squares)
+                parent[i] = SQ64[frm]
+                parents.add(layout.canonicalIndex(parent, not whiteToMove))
+        for sq in sq88:
+            board[sq] = EMPTY
+        found.append(parents)
+    return found
+
+
+'''
+Generates the table name into directory, and first the tables it depends on that aren't there yet. Work is
+spread over workers processes (in this process if workers is 1). Returns the path of the file.
+'''
+def generate(name, directory, workers=None, out=sys.stdout):
+    name = normalizeName(name)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name + FILE_EXTENSION)
+    if name in DRAWN_TABLES or os.path.exists(path):
+        return path
+    for dependency in dependencies(name):
+        generate(dependency, directory, workers, out)
+
+    workers = workers if workers else os.cpu_count() or 1
+    startTime = time.perf_counter()
+    layout = Layout(name)
+    total = 2 * layout.size
+    flags = bytearray(total)
+    remaining = bytearray(total)
+    lossesAt = bytearray(total)
+    buckets = [[] for plies in range(MAX_PLIES + 2)] #positions to settle at each distance to mate
+    ranges = [(start, min(total, start + CHUNK_SIZE)) for start in range(0, total, CHUNK_SIZE)]
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        if pool is None:
+            chunks = (forwardChunk(name, directory, start, stop) for start, stop in ranges)
+        else:
+            chunks = pool.map(forwardChunk, *zip(*((name, directory, start, stop) for start, stop in ranges)))
+        for (start, stop), (chunkFlags, chunkRemaining, seeds, winsAt, chunkLossesAt) in zip(ranges, chunks):
+            flags[start:stop] = chunkFlags
+            remaining[start:stop] = chunkRemaining
+            lossesAt[start:stop] = chunkLossesAt
+            for plies, index in seeds:
+                buckets[plies].append(index)
+
+        values = bytearray(total)
+        for plies in range(MAX_PLIES + 1):
+            settled = [index for index in set(buckets[plies]) if not values[index]]
+            buckets[plies] = None
+            if not settled:
+                continue
+            for index in settled:
+                values[index] = plies + 1
+            if pool is None:
+                parentSets = predecessorChunk(name, settled)
+            else:
+                batches = [settled[i:i + CHUNK_SIZE // 8] for i in range(0, len(settled), CHUNK_SIZE // 8)]
+                parentSets = [parents for batch in pool.map(predecessorChunk, [name] * len(batches), batches)
+                              for parents in batch]
+            lost = not plies & 1
+            for parents in parentSets:
+                for parent in parents:
+                    if values[parent] or not flags[parent] & VALID:
+                        continue
+                    if lost: #moving here wins
+                        buckets[plies + 1].append(parent)
+                    else: #one more move that loses
+                        remaining[parent] -= 1
+                        if lossesAt[parent] < plies + 1:
+                            lossesAt[parent] = plies + 1
+                        if not remaining[parent] and not flags[parent] & NO_LOSS:
+                            if lossesAt[parent] > MAX_PLIES:
+                                raise ValueError(f'{name}: distance to mate doesn\'t fit in a byte')
+                            buckets[lossesAt[parent]].append(parent)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(values)
+    os.replace(temporary, path) #a table only ever appears complete
+    if out is not None:
+        longest = max(values) - 1 if any(values) else 0
+        print(f'{name}: {sum(1 for flag in flags if flag & VALID)} positions, longest mate {longest} plies, '
+              f'{time.perf_counter() - startTime:.1f}s', file=out)
+    return path
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate or probe endgame tablebases')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generateCommand = commands.add_parser('generate', help='generate tables (and the smaller ones they need)')
+    generateCommand.add_argument('tables', nargs='+', help='piece sets, white first: KQK KRK KPK KRKP ...')
+    generateCommand.add_argument('--dir', default='tablebases')
+    generateCommand.add_argument('--workers', type=int, default=None, help='processes (default: one per core)')
+    probeCommand = commands.add_parser('probe', help='look a position up')
+    probeCommand.add_argument('--fen', required=True)
+    probeCommand.add_argument('--dir', default='tablebases')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        for name in args.tables:
+            generate(name, args.dir, args.workers)
+        return 0
+    gs = ChessEngine.GameState()
+    gs.loadFEN(args.fen)
+    tablebase = Tablebase(args.dir)
+    probed = tablebase.probe(gs)
+    if probed is None:
+        print('not in the tablebases')
+        return 1
+    print(describeResult(*probed))
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        probed = tablebase.probe(gs)
+        gs.undoMove()
+        if probed is not None: #from the other side
+            result, plies = probed
+            print(f'  {move.getChessNotation():6} {describeResult(-result, plies + 1 if result else 0)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
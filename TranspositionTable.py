@@ -0,0 +1,223 @@
+# A fixed size hash table of search results keyed by GameState.zobristKey. It can be shared by anything that wants
+# to remember work per position: the search stores scores and best moves, perft stores subtree node counts.
+#
+# The table is split into buckets of 2 slots. The first slot keeps the deepest (most expensive) result seen for
+# the bucket and is only replaced by an equal or deeper result, or by anything once its entry is from an older
+# search. The second slot is always replaced, so recent positions still get cached when the first slot is taken.
+#
+# SharedTranspositionTable has the same interface and replacement scheme but keeps its slots in shared memory, so
+# several search processes can use one table (see ChessParallel).
+
+# bound flags stored with a score
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+# rough size of one slot in bytes (the list reference plus the entry tuple and the ints inside it), used to turn
+# a memory budget into a number of buckets
+SLOT_BYTES = 140
+
+
+class TranspositionTable():
+    def __init__(self, megabytes=16):
+        self.buckets = max(1, megabytes * 1024 * 1024 // (2 * SLOT_BYTES))
+        self.entries = [None] * (2 * self.buckets)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0 #stores that threw away a different position
+
+    '''
+    Returns the entry stored for key as a tuple (key, depth, value, flag, move, generation), or None
+    '''
+    def probe(self, key):
+        index = (key % self.buckets) << 1
+        entries = self.entries
+        entry = entries[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = entries[index + 1]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    '''
+    Stores a result for key. value is whatever the caller needs (a score, a node count, ...) and depth is how much
+    work it took, which decides what gets kept when the bucket is full.
+    '''
+    def store(self, key, depth, value, flag=EXACT, move=None):
+        index = (key % self.buckets) << 1
+        entries = self.entries
+        entry = (key, depth, value, flag, move, self.generation)
+        self.stores += 1
+        deepest = entries[index]
+        if deepest is None or deepest[0] == key or depth >= deepest[1] or deepest[5] != self.generation:
+            if deepest is not None and deepest[0] != key:
+                #the entry being pushed out of the first slot is still useful, move it to the second slot
+                if entries[index + 1] is not None:
+                    self.overwrites += 1
+                entries[index + 1] = deepest
+            entries[index] = entry
+        else:
+            recent = entries[index + 1]
+            if recent is not None and recent[0] != key:
+                self.overwrites += 1
+            entries[index + 1] = entry
+
+    '''
+    Call at the start of every new search so results from earlier searches can be replaced in the first slot
+    '''
+    def newSearch(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        self.entries = [None] * (2 * self.buckets)
+        self.generation = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    '''
+    How full the table is in permille, sampled from the first 1000 slots the way UCI reports hashfull
+    '''
+    def hashfull(self):
+        sample = self.entries[:1000]
+        used = sum(1 for entry in sample if entry is not None and entry[5] == self.generation)
+        return used * 1000 // len(sample)
+
+    def getStats(self):
+        probes = self.hits + self.misses
+        return {'buckets': self.buckets, 'hits': self.hits, 'misses': self.misses,
+                'hitRate': self.hits / probes if probes else 0.0,
+                'stores': self.stores, 'overwrites': self.overwrites, 'hashfull': self.hashfull()}
+
+
+# A shared slot is two 64 bit words: the key XORed with the data, and the data. A slot that two processes wrote at
+# the same time then fails the key check instead of handing one position's result to another. The data word packs
+# value (offset to be unsigned), depth, flag, move ID + 1 (0 for no move) and generation.
+VALUE_BITS = 20
+VALUE_OFFSET = 1 << (VALUE_BITS - 1)
+DEPTH_SHIFT = VALUE_BITS
+FLAG_SHIFT = DEPTH_SHIFT + 8
+MOVE_SHIFT = FLAG_SHIFT + 2
+GENERATION_SHIFT = MOVE_SHIFT + 16
+HEADER_WORDS = 2 #word 0 holds the generation so every process stores with the same one
+BUCKET_WORDS = 4
+
+
+class SharedTranspositionTable():
+    # A new SharedTranspositionTable lives in a multiprocessing.RawArray; hand table.array to child processes (as a
+    # Process or pool initializer argument) and build SharedTranspositionTable(array=...) there to attach to it.
+    # Only the process that created the table moves the generation on in newSearch(). Values must fit in 20 bits
+    # signed, which search scores do, and moves are stored as move IDs.
+    def __init__(self, megabytes=16, array=None):
+        self.owner = array is None
+        if array is None:
+            import multiprocessing #slow to import and only needed here, the engine alone never loads it
+            buckets = max(1, megabytes * 1024 * 1024 // (BUCKET_WORDS * 8))
+            array = multiprocessing.RawArray('Q', HEADER_WORDS + BUCKET_WORDS * buckets)
+        self.array = array
+        self.words = memoryview(array).cast('B').cast('Q')
+        self.buckets = (len(array) - HEADER_WORDS) // BUCKET_WORDS
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    @property
+    def generation(self):
+        return self.words[0]
+
+    '''
+    Returns the entry stored for key as a tuple (key, depth, value, flag, moveID, generation), or None
+    '''
+    def probe(self, key):
+        index = HEADER_WORDS + (key % self.buckets) * BUCKET_WORDS
+        words = self.words
+        data = words[index + 1]
+        if not data or words[index] ^ data != key:
+            index += 2
+            data = words[index + 1]
+            if not data or words[index] ^ data != key:
+                self.misses += 1
+                return None
+        self.hits += 1
+        return unpackEntry(key, data)
+
+    '''
+    Stores a result for key, with the same replacement scheme as TranspositionTable.store
+    '''
+    def store(self, key, depth, value, flag=EXACT, move=None):
+        index = HEADER_WORDS + (key % self.buckets) * BUCKET_WORDS
+        words = self.words
+        generation = words[0]
+        data = packEntry(depth, value, flag, move, generation)
+        self.stores += 1
+        deepestData = words[index + 1]
+        deepestKey = words[index] ^ deepestData
+        if (not deepestData or deepestKey == key or depth >= (deepestData >> DEPTH_SHIFT) & 0xFF
+                or deepestData >> GENERATION_SHIFT != generation):
+            if deepestData and deepestKey != key:
+                #the entry being pushed out of the first slot is still useful, move it to the second slot
+                if words[index + 3]:
+                    self.overwrites += 1
+                words[index + 2] = words[index]
+                words[index + 3] = deepestData
+            words[index] = key ^ data
+            words[index + 1] = data
+        else:
+            recentData = words[index + 3]
+            if recentData and words[index + 2] ^ recentData != key:
+                self.overwrites += 1
+            words[index + 2] = key ^ data
+            words[index + 3] = data
+
+    '''
+    Call at the start of every new search. Does nothing in processes that attached to another process's table.
+    '''
+    def newSearch(self):
+        if self.owner:
+            self.words[0] = (self.words[0] + 1) & 0xFF
+
+    def clear(self):
+        words = self.words
+        for i in range(len(words)):
+            words[i] = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def hashfull(self):
+        words = self.words
+        generation = words[0]
+        sample = words[HEADER_WORDS + 1:HEADER_WORDS + 2000:2]
+        used = sum(1 for data in sample if data and data >> GENERATION_SHIFT == generation)
+        return used * 1000 // len(sample)
+
+    def getStats(self):
+        probes = self.hits + self.misses
+        return {'buckets': self.buckets, 'hits': self.hits, 'misses': self.misses,
+                'hitRate': self.hits / probes if probes else 0.0,
+                'stores': self.stores, 'overwrites': self.overwrites, 'hashfull': self.hashfull()}
+
+
+def packEntry(depth, value, flag, move, generation):
+    value = max(-VALUE_OFFSET, min(VALUE_OFFSET - 1, value))
+    return ((value + VALUE_OFFSET) | min(depth, 0xFF) << DEPTH_SHIFT | flag << FLAG_SHIFT
+            | (move + 1 if move is not None else 0) << MOVE_SHIFT | generation << GENERATION_SHIFT)
+
+
+def unpackEntry(key, data):
+    move = (data >> MOVE_SHIFT) & 0xFFFF
+    return (key, (data >> DEPTH_SHIFT) & 0xFF, (data & ((1 << VALUE_BITS) - 1)) - VALUE_OFFSET,
+            (data >> FLAG_SHIFT) & 3, move - 1 if move else None, data >> GENERATION_SHIFT)
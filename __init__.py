@@ -1 +1,38 @@
- 
+# ChessBot: a chess engine (move generation, evaluation, search) with an optional pygame GUI in ChessMain.
+#
+#   import ChessBot
+#   gs = ChessBot.GameState()
+#   move = ChessBot.findBestMove(gs, timeLimit=1.0)
+#
+# Nothing is imported until it is first used, so starting a process that only needs the engine doesn't pay for
+# the search, the parallel search or the GUI (and never needs pygame).
+import importlib
+
+# name -> module it lives in
+LAZY_NAMES = {
+    'GameState': 'ChessEngine', 'Move': 'ChessEngine', 'START_FEN': 'ChessEngine',
+    'evaluate': 'ChessEval',
+    'Searcher': 'ChessSearch', 'findBestMove': 'ChessSearch',
+    'perft': 'ChessPerft', 'divide': 'ChessPerft',
+    'TranspositionTable': 'TranspositionTable',
+    'LegalMoveCache': 'LegalMoveCache',
+    'OpeningBook': 'OpeningBook',
+    'Tablebase': 'Tablebase',
+    'EngineWorker': 'ChessWorker',
+    'ParallelSearcher': 'ChessParallel',
+    'readPGN': 'ChessPGN', 'readEPD': 'ChessPGN', 'readPositions': 'ChessPGN',
+    'runBatch': 'ChessBatch',
+    'evaluateFENs': 'ChessEvalBatch', 'evaluatePlanes': 'ChessEvalBatch',
+    'mobilityFENs': 'ChessEvalBatch', 'mobilityPlanes': 'ChessEvalBatch',
+    'runMatch': 'ChessMatch',
+}
+
+__all__ = sorted(LAZY_NAMES)
+
+
+def __getattr__(name):
+    if name not in LAZY_NAMES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module('.' + LAZY_NAMES[name], __name__), name)
+    globals()[name] = value
+    return value
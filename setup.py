@@ -0,0 +1,30 @@
+# The source folder is the ChessBot package: the modules stay flat so they can still be run from here as scripts
+# (python ChessMain.py, python ChessPerft.py, ...), and are installed as ChessBot.ChessEngine and so on.
+#
+#   pip install .            the engine only, no dependencies
+#   pip install .[gui]       with pygame for ChessMain
+#   pip install .[numpy]     with numpy for batched evaluation (ChessEvalBatch)
+from setuptools import setup
+
+setup(
+    name='ChessBot',
+    version='0.1',
+    description='A chess engine with a pygame GUI',
+    packages=['ChessBot'],
+    package_dir={'ChessBot': '.'},
+    package_data={'ChessBot': ['Pictures/*.png', 'perft_baseline.json']},
+    python_requires='>=3.8',
+    extras_require={'gui': ['pygame'], 'numpy': ['numpy']},
+    entry_points={'console_scripts': [
+        'chessbot = ChessBot.ChessMain:main',
+        'chessbot-search = ChessBot.ChessSearch:main',
+        'chessbot-perft = ChessBot.ChessPerft:main',
+        'chessbot-parallel = ChessBot.ChessParallel:main',
+        'chessbot-uci = ChessBot.ChessUCI:main',
+        'chessbot-batch = ChessBot.ChessBatch:main',
+        'chessbot-evalbatch = ChessBot.ChessEvalBatch:main',
+        'chessbot-book = ChessBot.OpeningBook:main',
+        'chessbot-tablebase = ChessBot.Tablebase:main',
+        'chessbot-match = ChessBot.ChessMatch:main',
+    ]},
+)
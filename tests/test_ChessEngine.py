@@ -0,0 +1,256 @@
+# Tests for setting up positions from FEN, reading moves in SAN and finding the attackers of a square. Run from
+# the source folder:
+#
+#   python -m pytest tests
+import io
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ChessEngine
+import ChessPGN
+import ChessPerft
+
+START_FEN = ChessEngine.START_FEN
+
+
+def loadedState(fen):
+    gs = ChessEngine.GameState()
+    gs.loadFEN(fen)
+    return gs
+
+
+'''
+The moves of gs in UCI notation, after playing the SAN moves of line from the position
+'''
+def playSAN(gs, line):
+    moves = []
+    for san in line.split():
+        move = gs.parseSAN(san)
+        gs.makeMove(move)
+        moves.append(move.getChessNotation())
+    return moves
+
+
+class FENRoundTripTest(unittest.TestCase):
+    def testStandardPositions(self):
+        for name, fen, counts in ChessPerft.POSITIONS:
+            with self.subTest(name):
+                self.assertEqual(loadedState(fen).getFEN(), fen)
+
+    def testEnpassantAndCounters(self):
+        for fen in ('rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3',
+                    'r3k2r/8/8/8/4Pp2/8/8/R3K2R b Kq e3 0 31',
+                    '8/8/4k3/8/8/4K3/8/8 w - - 99 120'):
+            with self.subTest(fen):
+                self.assertEqual(loadedState(fen).getFEN(), fen)
+
+    def testMissingFieldsTakeDefaults(self):
+        gs = loadedState('4k3/8/8/8/8/8/8/4K3 b')
+        self.assertEqual(gs.getFEN(), '4k3/8/8/8/8/8/8/4K3 b - - 0 1')
+
+    def testKeyMatchesPlayedPosition(self):
+        gs = loadedState(START_FEN)
+        playSAN(gs, 'e4 c5 Nf3')
+        loaded = loadedState(gs.getFEN())
+        self.assertEqual(loaded.zobristKey, gs.zobristKey)
+        self.assertEqual(loaded.getFEN(), gs.getFEN())
+
+
+class MalformedFENTest(unittest.TestCase):
+    BAD_FENS = [
+        '',
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1', #seven ranks
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBN w KQkq - 0 1', #short rank
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNRR w KQkq - 0 1', #long rank
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQXBNR w KQkq - 0 1', #unknown piece
+        'rnbq1bnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQ - 0 1', #no black king
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBKKBNR w kq - 0 1', #two white kings
+        'P3k3/8/8/8/8/8/8/4K3 w - - 0 1', #pawn on the last rank
+        '4k3/8/8/8/8/8/8/p3K3 b - - 0 1', #pawn on the first rank
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1', #side to move
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQxq - 0 1', #castling
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq z9 0 1', #en passant file
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e 0 1', #en passant square cut short
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e4 0 1', #en passant rank
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - x 1', #halfmove clock
+        'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 -1', #fullmove number
+    ]
+
+    def testRaisesAndKeepsState(self):
+        gs = loadedState(START_FEN)
+        playSAN(gs, 'e4 e5 Nf3')
+        fen, key, moveLog = gs.getFEN(), gs.zobristKey, list(gs.moveLog)
+        for bad in self.BAD_FENS:
+            with self.subTest(bad):
+                with self.assertRaises(ValueError):
+                    gs.loadFEN(bad)
+                self.assertEqual(gs.getFEN(), fen)
+                self.assertEqual(gs.zobristKey, key)
+                self.assertEqual(gs.moveLog, moveLog)
+        #the position still plays like a fresh copy of it
+        self.assertEqual(sorted(move.moveID for move in gs.getValidMoves()),
+                         sorted(move.moveID for move in loadedState(fen).getValidMoves()))
+        gs.undoMove()
+        self.assertEqual(gs.getFEN(), 'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2')
+
+
+class SANTest(unittest.TestCase):
+    def testDisambiguationByFile(self):
+        gs = loadedState('4k3/8/8/8/8/5N2/8/1N2K3 w - - 0 1')
+        self.assertEqual(gs.parseSAN('Nbd2').getChessNotation(), 'b1d2')
+        self.assertEqual(gs.parseSAN('Nfd2').getChessNotation(), 'f3d2')
+        with self.assertRaises(ValueError):
+            gs.parseSAN('Nd2')
+
+    def testDisambiguationByRank(self):
+        gs = loadedState('4k3/R7/8/8/8/8/8/R3K3 w - - 0 1')
+        self.assertEqual(gs.parseSAN('R1a4').getChessNotation(), 'a1a4')
+        self.assertEqual(gs.parseSAN('R7xa4').getChessNotation(), 'a7a4')
+        with self.assertRaises(ValueError):
+            gs.parseSAN('Ra4')
+
+    def testDisambiguationBySquare(self):
+        gs = loadedState('4k3/8/8/8/Q6Q/8/8/Q3K3 w - - 0 1')
+        self.assertEqual(gs.parseSAN('Qa4d1').getChessNotation(), 'a4d1')
+        with self.assertRaises(ValueError):
+            gs.parseSAN('Qad1')
+
+    def testPromotion(self):
+        gs = loadedState('1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1')
+        self.assertEqual(gs.parseSAN('a8=Q').getChessNotation(), 'a7a8q')
+        self.assertEqual(gs.parseSAN('a8N').getChessNotation(), 'a7a8n')
+        self.assertEqual(gs.parseSAN('axb8=R+').getChessNotation(), 'a7b8r')
+        with self.assertRaises(ValueError):
+            gs.parseSAN('a8=K')
+
+    def testCastling(self):
+        fen = 'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1'
+        for san, notation in (('O-O', 'e1g1'), ('0-0', 'e1g1'), ('O-O-O', 'e1c1'), ('0-0-0', 'e1c1')):
+            with self.subTest(san):
+                move = loadedState(fen).parseSAN(san)
+                self.assertTrue(move.isCastleMove)
+                self.assertEqual(move.getChessNotation(), notation)
+        with self.assertRaises(ValueError):
+            loadedState('r3k2r/8/8/8/8/8/8/R3K2R w kq - 0 1').parseSAN('O-O')
+
+    def testCheckAndMateSuffixes(self):
+        gs = loadedState(START_FEN)
+        self.assertEqual(playSAN(gs, 'e4 e5 Bc4 Nc6 Qh5 Nf6?? Qxf7#'), ['e2e4', 'e7e5', 'f1c4', 'b8c6', 'd1h5',
+                                                                        'g8f6', 'h5f7'])
+        self.assertTrue(gs.inCheck())
+        self.assertEqual(gs.getValidMoves(), [])
+        gs = loadedState('4k3/8/8/8/8/8/8/R3K3 w - - 0 1')
+        self.assertEqual(gs.parseSAN('Ra8+').getChessNotation(), 'a1a8')
+
+    def testIllegalMove(self):
+        gs = loadedState(START_FEN)
+        for san in ('e5', 'Nc4', 'O-O', 'Kx', 'z4'):
+            with self.subTest(san):
+                with self.assertRaises(ValueError):
+                    gs.parseSAN(san)
+
+
+'''
+The (row, col) of every piece of color ('w' or 'b') that attacks (row, col), worked out on gs.board one piece at a
+time without any of the engine's tables
+'''
+def bruteForceAttackers(gs, row, col, color):
+    steps = {'N': [(1, 2), (2, 1), (-1, 2), (-2, 1), (1, -2), (2, -1), (-1, -2), (-2, -1)],
+             'K': [(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc],
+             'p': [(1, -1), (1, 1)] if color == 'w' else [(-1, -1), (-1, 1)]} #from the attacked square back
+    rays = {'R': [(1, 0), (-1, 0), (0, 1), (0, -1)], 'B': [(1, 1), (1, -1), (-1, 1), (-1, -1)]}
+    rays['Q'] = rays['R'] + rays['B']
+    attackers = set()
+    for r in range(8):
+        for c in range(8):
+            piece = gs.board[r][c]
+            if piece[0] != color:
+                continue
+            kind = piece[1]
+            if kind == 'p':
+                if (r - row, c - col) in steps['p']:
+                    attackers.add((r, c))
+            elif kind in steps:
+                if (row - r, col - c) in steps[kind]:
+                    attackers.add((r, c))
+            else:
+                for dr, dc in rays[kind]:
+                    rr, cc = r + dr, c + dc
+                    while 0 <= rr < 8 and 0 <= cc < 8:
+                        if (rr, cc) == (row, col):
+                            attackers.add((r, c))
+                            break
+                        if gs.board[rr][cc] != '--':
+                            break
+                        rr, cc = rr + dr, cc + dc
+    return attackers
+
+
+class AttackersTest(unittest.TestCase):
+    def testAgainstBruteForce(self):
+        rng = random.Random(1)
+        positions = 0
+        for name, fen, counts in ChessPerft.POSITIONS:
+            gs = loadedState(fen)
+            for ply in range(40): #positions along a random game from each standard position
+                positions += 1
+                for row in range(8):
+                    for col in range(8):
+                        for color, code in (('w', ChessEngine.WHITE), ('b', ChessEngine.BLACK)):
+                            found = gs.getAttackers(row * 16 + col, code)
+                            self.assertEqual({(sq >> 4, sq & 7) for sq in found},
+                                             bruteForceAttackers(gs, row, col, color), (gs.getFEN(), row, col, color))
+                            self.assertEqual(bool(found), gs.isSquareAttacked(row * 16 + col, code))
+                moves = gs.getValidMoves()
+                if not moves:
+                    break
+                gs.makeMove(rng.choice(moves))
+        self.assertGreater(positions, 200)
+
+
+class StaticExchangeTest(unittest.TestCase):
+    def exchange(self, fen, san):
+        gs = loadedState(fen)
+        before = bytes(gs.squares)
+        score = gs.staticExchange(gs.parseSAN(san))
+        self.assertEqual(bytes(gs.squares), before) #the board is put back
+        return score
+
+    def testUndefendedAndDefended(self):
+        self.assertEqual(self.exchange('4k3/8/8/3n4/4P3/8/8/4K3 w - - 0 1', 'exd5'), 320)
+        self.assertEqual(self.exchange('4k3/8/4p3/3p4/8/8/8/3QK3 w - - 0 1', 'Qxd5'), 100 - 900)
+        self.assertEqual(self.exchange('4k3/8/4p3/3n4/4P3/8/8/4K3 w - - 0 1', 'exd5'), 320 - 100)
+
+    def testXRays(self):
+        #the second rook joins in once the first one has taken: RxN RxR RxR
+        self.assertEqual(self.exchange('3rk3/8/8/3n4/8/8/3R4/3RK3 w - - 0 1', 'Rxd5'), 320)
+        #one rook alone loses the exchange after RxN RxR
+        self.assertEqual(self.exchange('3rk3/8/8/3n4/8/8/3R4/4K3 w - - 0 1', 'Rxd5'), 320 - 500)
+        #rook for pawn and pawn
+        self.assertEqual(self.exchange('4k3/8/4p3/3p4/8/8/3R4/3RK3 w - - 0 1', 'Rxd5'), 200 - 500)
+
+    def testEnpassantAndPromotion(self):
+        self.assertEqual(self.exchange('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', 'exd6'), 100)
+        self.assertEqual(self.exchange('1r2k3/P7/8/8/8/8/8/4K3 w - - 0 1', 'a8=Q'), 800 - 900)
+        self.assertEqual(self.exchange('1r2k3/P7/8/8/8/8/8/4K3 w - - 0 1', 'axb8=Q+'), 500 + 800)
+
+
+class ReadPGNTest(unittest.TestCase):
+    def testMainLineOnly(self):
+        text = ('[Event "Test"]\n[FEN "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"]\n\n'
+                '1. O-O {castles} (1. O-O-O O-O) 1... O-O-O $1 2. Rfe1 Rde8 1-0\n')
+        games = list(ChessPGN.readPGN(io.StringIO(text)))
+        self.assertEqual(len(games), 1)
+        headers, sanMoves = games[0]
+        self.assertEqual(headers['Event'], 'Test')
+        self.assertEqual(sanMoves, ['O-O', 'O-O-O', 'Rfe1', 'Rde8'])
+        gs = loadedState(headers['FEN'])
+        self.assertEqual(playSAN(gs, ' '.join(sanMoves)), ['e1g1', 'e8c8', 'f1e1', 'd8e8'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# Tests that the batched NumPy evaluation agrees with ChessEval and the scalar mobility count. Skipped when numpy
+# isn't installed. Run from the source folder:
+#
+#   python -m pytest tests
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ChessEngine
+import ChessEval
+import ChessPerft
+
+try:
+    import numpy as np
+    import ChessEvalBatch
+except ImportError:
+    np = None
+
+
+'''
+FENs of the positions along a few seeded random games from each standard position
+'''
+def randomGameFENs(plies=60, games=3, seed=7):
+    rng = random.Random(seed)
+    fens = []
+    for name, fen, counts in ChessPerft.POSITIONS:
+        for game in range(games):
+            gs = ChessEngine.GameState()
+            gs.loadFEN(fen)
+            for ply in range(plies):
+                fens.append(gs.getFEN())
+                moves = gs.getValidMoves()
+                if not moves:
+                    break
+                gs.makeMove(rng.choice(moves))
+    return fens
+
+
+@unittest.skipIf(np is None, 'needs numpy')
+class BatchAgreesWithScalarTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fens = randomGameFENs()
+
+    def scalar(self, function):
+        gs = ChessEngine.GameState()
+        results = []
+        for fen in self.fens:
+            gs.loadFEN(fen)
+            results.append(function(gs))
+        return results
+
+    def testScores(self):
+        self.assertEqual(ChessEvalBatch.evaluateFENs(self.fens).tolist(), self.scalar(ChessEval.evaluate))
+        planes, whiteToMove = ChessEvalBatch.encodeFENs(self.fens)
+        self.assertEqual(ChessEvalBatch.evaluatePlanes(planes, whiteToMove).tolist(),
+                         self.scalar(ChessEval.evaluate))
+
+    def testMobility(self):
+        self.assertEqual(ChessEvalBatch.mobilityFENs(self.fens).tolist(),
+                         self.scalar(ChessEvalBatch.scalarMobility))
+
+    def testCompareWithScalar(self):
+        scores = ChessEvalBatch.evaluateFENs(self.fens)
+        mobility = ChessEvalBatch.mobilityFENs(self.fens)
+        self.assertEqual(ChessEvalBatch.compareWithScalar(self.fens, scores, mobility), [])
+        scores[0] += 1
+        self.assertEqual(len(ChessEvalBatch.compareWithScalar(self.fens, scores, mobility)), 1)
+
+    def testStatesEncodeLikeFENs(self):
+        states = []
+        for fen in self.fens[:50]:
+            gs = ChessEngine.GameState()
+            gs.loadFEN(fen)
+            states.append(gs)
+        fenPlanes, fenWhiteToMove = ChessEvalBatch.encodeFENs(self.fens[:50])
+        statePlanes, stateWhiteToMove = ChessEvalBatch.encodeStates(states)
+        self.assertTrue((fenPlanes == statePlanes).all())
+        self.assertTrue((fenWhiteToMove == stateWhiteToMove).all())
+
+
+@unittest.skipIf(np is None, 'needs numpy')
+class MobilityTest(unittest.TestCase):
+    def testKnownCounts(self):
+        fens = [ChessEngine.START_FEN, #two knight moves each
+                '4k3/8/8/8/3R4/8/8/4K3 w - - 0 1', #a rook in the middle of an empty board
+                '4k3/8/8/8/3R4/8/8/4K3 b - - 0 1', #the same, from black's side
+                '4k3/8/8/3p4/2pRp3/3P4/8/4K3 w - - 0 1', #boxed in, but it can take three pawns
+                'n3k3/8/8/8/8/8/8/4K2N w - - 0 1'] #knights in the corners
+        self.assertEqual(ChessEvalBatch.mobilityFENs(fens).tolist(), [0, 14, -14, 3, 0])
+
+    def testBitboardsDontWrapAround(self):
+        #pieces on the a and h files would reach the other side of the board if a shift wrapped
+        fens = ['4k3/8/8/N6N/8/8/8/4K3 w - - 0 1', '4k3/8/8/7B/B7/8/8/4K3 w - - 0 1', 'Q3k3/8/8/8/8/8/8/4K2R w - - 0 1']
+        gs = ChessEngine.GameState()
+        expected = []
+        for fen in fens:
+            gs.loadFEN(fen)
+            expected.append(ChessEvalBatch.scalarMobility(gs))
+        self.assertEqual(expected, [4 + 4, 7 + 7, 17 + 9])
+        self.assertEqual(ChessEvalBatch.mobilityFENs(fens).tolist(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()